@@ -1,121 +1,428 @@
-import asyncio, threading, time, struct, csv, os, math
+import asyncio, threading, time, csv, os, math, random, traceback
 from datetime import datetime
-from queue import Queue
-from bleak import BleakClient, BleakError, BleakScanner
+import numpy as np
 from gpiozero import InputDevice
-from states import blob_state, location_state, motor_info_state
+from states import blob_state, location_state
+from BLE.client.sample_log import BinarySampleLog, CSV_HEADER
+from BLE.client.rings import PacketRing, SampleRing, LatencyStats
+from BLE.client.packets import decode_batch, MAX_PAYLOAD
+from BLE.client.clock_sync import ClockModel, SequenceTracker, TickUnwrapper
+from location.angle_estimator import AngleEstimator
+from analysis.angle_bins import AngleBins
 
 # --- CONFIGURATION ---
+BLE_BACKEND = os.environ.get("BLE_BACKEND", "bleak")  # 'bleak' or 'fake' (fake_bleak.py)
+if BLE_BACKEND == "fake":
+    from BLE.client.fake_bleak import BleakClient, BleakError, BleakScanner
+else:
+    from bleak import BleakClient, BleakError, BleakScanner
+
 DEFAULT_NAME = "ESP32-Analog-100Hz"
 CHARACTERISTIC_UUID = "c0de1000-0000-4a6f-9e00-000000000001"
-DEVICE_ADDRESS = None  # Set to "XX:XX:XX:XX:XX:XX" to skip discovery
-PACK_FORMAT = "<10H"
-PACK = struct.Struct(PACK_FORMAT)
+# One entry per electrometer board, all served by the same asyncio loop and consumer
+# thread. label names the device's log (ble_samples.bin for the first device,
+# ble_samples_<label>.bin for the others); set address to skip discovery.
+DEVICES = [
+    {"label": "a", "name": DEFAULT_NAME, "address": None},
+]
+LOG_FORMAT = "binary"  # "binary" (ble_samples.bin, see sample_log.py) or "csv" (one text row per packet)
+CONSUMER_PERIOD = 0.02  # seconds between consumer batches
+STATS_PERIOD = 10.0     # seconds between [BLE] stats printouts
+# Reconnecting: straight to the last-seen address first, a scan only after
+# DIRECT_ATTEMPTS failures; between failures a jittered exponential backoff
+CONNECT_TIMEOUT = 5.0
+DIRECT_ATTEMPTS = 3
+BACKOFF_BASE = 0.25     # seconds, doubled per failed attempt
+BACKOFF_MAX = 8.0
+GAP_MIN_S = 0.25        # notification gaps at least this long go into ble_gaps.csv
+GAPS_HEADER = ["device", "start_s", "end_s", "duration_s", "packets_lost", "disconnected"]
+# a0/a1 binned by disk angle per revolution as they arrive (analysis/angle_bins.py);
+# saved as angle_bins.npz next to the log. 0 turns it off.
+ANGLE_BINS = 72
 
-# --- SHARED GLOBALS ---
-data_queue_a0 = Queue()
-data_queue_a1 = Queue()
 stop_event = threading.Event()
-csv_writer = None
-csv_file = None
 running = InputDevice(13)
-# if running.is_active:
-
-running_time = 0
-
-theoretical_angle = None
-
-# --- ASYNCHRONOUS BLE LOGIC ---
-async def find_device(name: str | None, address: str | None, timeout: float = 8.0):
-    if address:
-        return type('', (object,), {'address': address, 'name': '(address-specified)'})()
-    
-    print(f"[BLE] Scanning for device '{name}'...")
-    device = await BleakScanner.find_device_by_name(name, timeout=timeout)
-    
-    if not device:
-        print(f"[BLE] Device '{name}' not found. Please ensure it is advertising.")
-    else:
-        print(f"[BLE] Found device: {device.address} ({device.name})")
-    
-    return device
+# Disk angle from the commanded step rate, re-anchored on every index pulse
+angle_estimator = AngleEstimator()
 
-async def ble_receiver_task(csv_path: str | None):
-    global csv_writer, csv_file
 
-    if csv_path:
+class DeviceSession:
+    """
+    Everything that belongs to one board: its connection state machine (run()), the
+    raw notification ring its handler pushes to, the decode/clock state the consumer
+    keeps for it, its live-plot rings and its log.
+    """
+    def __init__(self, label, name=DEFAULT_NAME, address=None):
+        self.label = label
+        self.name = name
+        self.address = address
+        self.state = "idle"     # idle -> scanning -> connecting -> connected (-> waiting)
+        # Raw notifications, timestamped on the asyncio loop and unpacked by the consumer thread
+        self.packet_ring = PacketRing(capacity=4096, max_payload=MAX_PAYLOAD)
+        # Per-channel sample history for the live plot (bulk write here, bulk snapshot in the GUI)
+        self.ring_a0 = SampleRing(capacity=1 << 17)
+        self.ring_a1 = SampleRing(capacity=1 << 17)
+        self.handler_latency = LatencyStats()   # time spent inside the notification handler
+        self.queue_latency = LatencyStats()     # notification received -> processed by the consumer
+        self.counts = {"processed": 0, "bad": 0, "frames": 0, "connects": 0, "disconnects": 0,
+                       "gaps": 0, "gap_s": 0.0}
+        self.cached_address = address   # last address we connected to
+        self.disconnected_at = None     # time.time() the connection was lost
+        self.reconnect_latency = LatencyStats(alpha=0.2)
+        self.last_reconnect_s = None
+        self._last_time = None          # receipt time of the last processed packet
+        self._disconnects_seen = 0
+        # Device tick -> host clock fit and dropped-packet count (packets.py, clock_sync.py).
+        # clock_reset is set on every (re)connect; the consumer then keeps them if the
+        # device's tick carried on (same boot), else starts them over
+        self.tick_unwrapper = TickUnwrapper()
+        self.seq_tracker = SequenceTracker()
+        self.clock_model = ClockModel()
+        self.clock_reset = threading.Event()
+        self.sample_log = None
+        self.csv_file = None
+        self.csv_writer = None
+        self.angle_bins = AngleBins(ANGLE_BINS) if ANGLE_BINS else None
+        self.angle_bins_path = None
+
+    def __repr__(self):
+        return f"DeviceSession({self.label!r}, {self.name!r}, state={self.state!r})"
+
+    # --- Logging ---
+    def open_log(self, csv_path):
+        """csv_path is the session's ble_samples.csv; non-primary devices get a suffix."""
+        suffix = "" if self is sessions[0] else f"_{self.label}"
+        root, ext = os.path.splitext(csv_path)
+        csv_path = f"{root}{suffix}{ext}"
         os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
-        csv_file = open(csv_path, "w", newline="", buffering=1)
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow([
-            "iso_time", "epoch_s",
-            "a0_0", "a0_1", "a0_2", "a0_3", "a0_4",
-            "a1_0", "a1_1", "a1_2", "a1_3", "a1_4",
-            "angle_of_particles", "area_of_particles",
-            "approximate_angle_of_a0", "approximate_angle_of_a1"
-        ])
-        print(f"[BLE] Logging to {csv_path}")
-    
-    while not stop_event.is_set():
-        device = await find_device(DEFAULT_NAME, DEVICE_ADDRESS)
+        self.angle_bins_path = os.path.join(os.path.dirname(csv_path), f"angle_bins{suffix}.npz")
+        if LOG_FORMAT == "binary":
+            log_path = os.path.splitext(csv_path)[0] + ".bin"
+            self.sample_log = BinarySampleLog(log_path)
+            print(f"[BLE:{self.label}] Logging to {log_path} (convert with: python -m BLE.client.sample_log {log_path})")
+        else:
+            self.csv_file = open(csv_path, "w", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(CSV_HEADER)
+            print(f"[BLE:{self.label}] Logging to {csv_path}")
+
+    def close_log(self):
+        if self.angle_bins is not None and self.angle_bins_path and self.angle_bins.samples:
+            self.angle_bins.save(self.angle_bins_path)
+            print(f"[BLE:{self.label}] Angle bins saved to {self.angle_bins_path}")
+        if self.sample_log:
+            self.sample_log.close()
+            self.sample_log = None
+            print(f"[BLE:{self.label}] Sample log closed.")
+        if self.csv_file:
+            self.csv_file.close()
+            self.csv_file = self.csv_writer = None
+            print(f"[BLE:{self.label}] CSV closed.")
+
+    def log_rows(self, times, a0, a1, a0_angle, seq, t0, dt):
+        """Logs one row per frame; a0/a1 are (n, 5), the rest length n."""
+        if self.sample_log:
+            self.sample_log.append_batch(times, a0, a1, blob_state['angle'], blob_state['area'],
+                                         a0_angle, (a0_angle + 180) % 360, seq, t0, dt)
+        elif self.csv_writer:
+            angle, area = blob_state['angle'], blob_state['area']
+            self.csv_writer.writerows([
+                datetime.utcfromtimestamp(now).isoformat(),
+                f"{now:.6f}",
+                *a0_vals, *a1_vals,
+                angle, area,
+                ang, (ang + 180) % 360,
+                "" if sq < 0 else sq,
+                "" if math.isnan(st) else f"{st:.6f}",
+                "" if math.isnan(sdt) else sdt
+            ] for now, a0_vals, a1_vals, ang, sq, st, sdt in zip(times.tolist(), a0.tolist(), a1.tolist(),
+                                                                   a0_angle.tolist(), seq.tolist(),
+                                                                   t0.tolist(), dt.tolist()))
+            self.csv_file.flush()
+
+    # --- Consumer thread side ---
+    def sample_times(self, times, packets):
+        """
+        Host-clock time of each packet's first sample and the spacing of its samples, from
+        the device tick through the clock model. NaN for legacy packets without a tick.
+        """
+        t0 = np.full(len(times), np.nan)
+        dt = np.full(len(times), np.nan)
+        lost_before = np.zeros(len(times), dtype=np.int64)
+        timed = packets["seq"] >= 0
+        if self.clock_reset.is_set() and timed.any():
+            self.clock_reset.clear()
+            first = np.flatnonzero(timed)[0]
+            if not self._same_boot(int(packets["tick"][first]), float(times[first])):
+                self.tick_unwrapper.reset()
+                self.seq_tracker.reset()
+                self.clock_model.reset()
+        if timed.any():
+            lost = self.seq_tracker.update(packets["seq"][timed])
+            lost_before[timed] = lost
+            if lost.any():
+                print(f"[BLE:{self.label}] {int(lost.sum())} packet(s) lost "
+                      f"(seq {packets['seq'][timed][lost > 0].tolist()})")
+            gap_s = packets["gap_us"][timed] * 1e-6
+            device_s = self.tick_unwrapper.unwrap(packets["tick"][timed]) * 1e-6
+            # A packet is sent after its last sample, so that is what its receipt time follows
+            last_s = device_s + (packets["count"][timed] - 1) * gap_s
+            self.clock_model.update(last_s, times[timed])
+            t0[timed] = self.clock_model.to_host(device_s)
+            dt[timed] = gap_s * self.clock_model.skew
+        return t0, dt, lost_before
+
+    def _same_boot(self, tick, host_time, tolerance=1.0):
+        """Whether a packet after a reconnect continues the device clock we were following."""
+        last = self.tick_unwrapper.last
+        if last is None or not self.clock_model.ready:
+            return False
+        modulus = self.tick_unwrapper.modulus
+        device_s = (last + (tick - last % modulus) % modulus) * 1e-6
+        return abs(float(self.clock_model.to_host(device_s)) - host_time) < tolerance
+
+    def record_gaps(self, times, lost_before):
+        """Writes every notification gap of at least GAP_MIN_S to ble_gaps.csv."""
+        prev = np.concatenate(([self._last_time if self._last_time is not None else times[0]], times[:-1]))
+        self._last_time = float(times[-1])
+        gaps = np.flatnonzero(times - prev >= GAP_MIN_S)
+        if len(gaps) == 0:
+            return
+        disconnected = self.counts["disconnects"] != self._disconnects_seen
+        self._disconnects_seen = self.counts["disconnects"]
+        for i in gaps.tolist():
+            start, end = float(prev[i]), float(times[i])
+            self.counts["gaps"] += 1
+            self.counts["gap_s"] += end - start
+            print(f"[BLE:{self.label}] gap of {end - start:.2f}s, {int(lost_before[i])} packet(s) lost")
+            if gap_writer:
+                gap_writer.writerow([self.label, f"{start:.6f}", f"{end:.6f}", f"{end - start:.6f}",
+                                     int(lost_before[i]), int(disconnected)])
+        if gap_file:
+            gap_file.flush()
+
+    def process_packets(self, times, payloads, lengths):
+        """Decodes a batch of raw notifications, feeds the live plot and logs them."""
+        good, packets, frames = decode_batch(payloads, lengths)
+        if not good.all():
+            self.counts["bad"] += int((~good).sum())
+            print(f"[BLE:{self.label}] Bad packet length(s): {sorted(set(lengths[~good].tolist()))}")
+            times = times[good]
+        if len(times) == 0:
+            return
+        a0, a1 = frames["a0"], frames["a1"]
+
+        self.ring_a0.write(a0)
+        self.ring_a1.write(a1)
+        t0, dt, lost_before = self.sample_times(times, packets)
+        self.record_gaps(times, lost_before)
+
+        if running.is_active and location_state['flag']:
+            if self.sample_log or self.csv_writer or self.angle_bins is not None:
+                # One row per 5-sample frame, timed from the device clock where possible
+                p = frames["packet"]
+                frame_t0 = t0[p] + frames["first_sample"] * dt[p]
+                frame_t = np.where(np.isnan(frame_t0), times[p], frame_t0)
+                a0_angle = angle_estimator.angles(frame_t)
+                self.log_rows(times[p], a0, a1, a0_angle, packets["seq"][p], frame_t0, dt[p])
+                if self.angle_bins is not None:
+                    self.bin_samples(frame_t, np.nan_to_num(dt[p]), a0, a1)
+        self.counts["processed"] += len(times)
+        self.counts["frames"] += len(a0)
+
+    def bin_samples(self, frame_t, dt, a0, a1):
+        """Adds every sample of a batch to the angle bins, at its own time and angle."""
+        times = (frame_t[:, None] + np.arange(a0.shape[1]) * dt[:, None]).ravel()
+        # Samples from before the latest index pulse still belong to the previous revolution
+        revs = np.full(len(times), location_state['tracked_revs'], dtype=np.int64)
+        last_index = location_state['last_index_time']
+        if last_index is not None:
+            revs -= times < last_index
+        self.angle_bins.add(revs, angle_estimator.angles(times), a0.ravel(), a1.ravel())
+
+    def drain(self):
+        """Processes everything the handler pushed since the last call."""
+        times, payloads, lengths = self.packet_ring.drain()
+        if len(times):
+            self.process_packets(times, payloads, lengths)
+            self.queue_latency.add(time.time() - float(times[0]))
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "connects": self.counts["connects"],
+            "disconnects": self.counts["disconnects"],
+            "gaps": self.counts["gaps"],
+            "gap_s": self.counts["gap_s"],
+            "reconnect_ms": self.reconnect_latency.mean_ms,
+            "reconnect_max_ms": self.reconnect_latency.max_ms,
+            "processed": self.counts["processed"],
+            "frames": self.counts["frames"],
+            "bad": self.counts["bad"],
+            "lost": self.seq_tracker.lost,
+            "clock_skew_ppm": (self.clock_model.skew - 1.0) * 1e6,
+            "backlog": self.packet_ring.backlog,
+            "max_backlog": self.packet_ring.max_backlog,
+            "dropped": self.packet_ring.dropped,
+            "oversized": self.packet_ring.oversized,
+            "handler_ms": self.handler_latency.mean_ms,
+            "handler_max_ms": self.handler_latency.max_ms,
+            "queue_ms": self.queue_latency.mean_ms,
+            "queue_max_ms": self.queue_latency.max_ms,
+        }
+
+    # --- asyncio loop side ---
+    def notification_handler(self, _handle, data):
+        """Runs on the asyncio loop: timestamp and stash the raw payload, nothing else."""
+        t0 = time.perf_counter()
+        self.packet_ring.push(time.time(), data)
+        self.handler_latency.add(time.perf_counter() - t0)
+
+    async def find_device(self, timeout: float = 8.0):
+        if self.address:
+            return type('', (object,), {'address': self.address, 'name': '(address-specified)'})()
+
+        # One scan at a time: several scanners on one adapter get in each other's way
+        async with scan_lock:
+            print(f"[BLE:{self.label}] Scanning for device '{self.name}'...")
+            device = await BleakScanner.find_device_by_name(self.name, timeout=timeout)
+
         if not device:
-            if not stop_event.is_set():
-                print("[BLE] Retrying discovery in 5s...")
-                await asyncio.sleep(5.0)
-            continue
-            
-        try:
-            print(f"[BLE] Attempting to connect to {device.address}...")
-            async with BleakClient(device.address, timeout=10.0) as client:
-                print("[BLE] Connected. Subscribing to notifications...")
-                
-                def notification_handler(_handle, data):
-                    now = time.time()
-                    try:
-                        vals = PACK.unpack(data)
-                        a0_vals = vals[:5]
-                        a1_vals = vals[5:]
-                        
-                        for val in a0_vals:
-                            data_queue_a0.put(val)
-                        for val in a1_vals:
-                            data_queue_a1.put(val)
-                        if running.is_active and location_state['flag']:
-                            global running_time
-                            if running_time == 0:
-                                running_time = time.time()
-                            if csv_writer:
-                                elapsed = time.time() - running_time
-                                
-                                if elapsed > 0: # Avoid division by zero
-                                    steps = elapsed / (motor_info_state['delay'] * 2) 
-                                    a0_angle = math.floor(steps) * motor_info_state['angles_per_step']
-                                csv_writer.writerow([
-                                    datetime.utcfromtimestamp(now).isoformat(),
-                                    f"{now:.6f}",
-                                    *a0_vals, *a1_vals, 
-                                    blob_state['angle'], blob_state['area'],
-                                    a0_angle, a0_angle + 180
-                                ])
-                    except struct.error:
-                        print(f"[BLE] Bad packet length: {len(data)}")
-
-                await client.start_notify(CHARACTERISTIC_UUID, notification_handler)
-                
-                while client.is_connected and not stop_event.is_set():
-                    await asyncio.sleep(0.1)
-
-        except BleakError as e:
-            print(f"[BLE] Connection error: {e}. Retrying in 2s...")
-            if not stop_event.is_set():
-                await asyncio.sleep(2.0)
-        except Exception as e:
-            print(f"[BLE] Unexpected error: {e}")
+            print(f"[BLE:{self.label}] Device '{self.name}' not found. Please ensure it is advertising.")
+        else:
+            print(f"[BLE:{self.label}] Found device: {device.address} ({device.name})")
+
+        return device
+
+    async def _backoff(self, attempt):
+        """Jittered exponential backoff: between half and all of base * 2**attempt."""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        delay = random.uniform(delay / 2, delay)
+        self.state = "waiting"
+        end = time.monotonic() + delay
+        while not stop_event.is_set() and time.monotonic() < end:
+            await asyncio.sleep(min(0.1, end - time.monotonic()))
+
+    async def run(self):
+        """Connect / stream / reconnect until stop_event is set."""
+        attempt = 0
+        while not stop_event.is_set():
+            address = self.cached_address
+            if address is None or (attempt >= DIRECT_ATTEMPTS and not self.address):
+                self.state = "scanning"
+                device = await self.find_device()
+                if not device:
+                    await self._backoff(attempt)
+                    attempt += 1
+                    continue
+                address = self.cached_address = device.address
+
+            connected = False
+            try:
+                self.state = "connecting"
+                print(f"[BLE:{self.label}] Attempting to connect to {address}...")
+                async with BleakClient(address, timeout=CONNECT_TIMEOUT) as client:
+                    print(f"[BLE:{self.label}] Connected. Subscribing to notifications...")
+                    self.clock_reset.set()   # the device may have restarted its tick and seq
+                    # BlueZ exchanges the MTU on connect; the firmware sizes its packets to it
+                    print(f"[BLE:{self.label}] ATT MTU {client.mtu_size} ({client.mtu_size - 3}-byte notifications)")
+
+                    await client.start_notify(CHARACTERISTIC_UUID, self.notification_handler)
+                    connected = True
+                    self.state = "connected"
+                    self.counts["connects"] += 1
+                    attempt = 0
+                    if self.disconnected_at is not None:
+                        self.last_reconnect_s = time.time() - self.disconnected_at
+                        self.reconnect_latency.add(self.last_reconnect_s)
+                        self.disconnected_at = None
+                        print(f"[BLE:{self.label}] Reconnected in {self.last_reconnect_s:.2f}s")
+
+                    while client.is_connected and not stop_event.is_set():
+                        await asyncio.sleep(0.05)
+
+            except (BleakError, asyncio.TimeoutError, OSError) as e:
+                # Board powered down or out of range (BlueZ times out the connect): retry
+                print(f"[BLE:{self.label}] Connection error: {type(e).__name__} {e}")
+            except Exception as e:
+                # Anything else (a backend quirk, a bug) must not end this device's loop for
+                # the rest of the session: report it in full and retry after the backoff
+                print(f"[BLE:{self.label}] Unexpected error: {type(e).__name__} {e}")
+                traceback.print_exc()
+
+            if stop_event.is_set():
+                break
+            if connected:
+                # Lost the link: go straight back to the cached address
+                self.disconnected_at = time.time()
+                self.counts["disconnects"] += 1
+                print(f"[BLE:{self.label}] Disconnected; reconnecting to {address}")
+            else:
+                await self._backoff(attempt)
+                attempt += 1
+        self.state = "stopped"
+
+
+# --- SHARED GLOBALS ---
+sessions = [DeviceSession(**device) for device in DEVICES]
+# The live plot shows the first device
+ring_a0 = sessions[0].ring_a0
+ring_a1 = sessions[0].ring_a1
+angle_bins = sessions[0].angle_bins
+scan_lock = None    # asyncio.Lock, created on the receiver's loop
+# ble_gaps.csv: one row per notification gap of any device (written by the consumer thread)
+gap_file = None
+gap_writer = None
+
+
+def ble_stats():
+    return {s.label: s.stats() for s in sessions}
+
+def consumer_loop(stop_flag: threading.Event):
+    """
+    Drains every device's packet ring in batches off the asyncio loop thread, so a
+    slow disk write can never hold up BLE notification handling.
+    """
+    print("[BLE] Consumer thread started.")
+    last_stats = time.monotonic()
+    while True:
+        stopping = stop_flag.is_set()
+        for session in sessions:
+            session.drain()
+        if stopping:
             break
+        if time.monotonic() - last_stats >= STATS_PERIOD:
+            last_stats = time.monotonic()
+            print(f"[BLE] stats: {ble_stats()}")
+        stop_flag.wait(CONSUMER_PERIOD)
+    print("[BLE] Consumer thread finished.")
+
+async def ble_receiver_task(csv_path: str | None):
+    global scan_lock, gap_file, gap_writer
+    scan_lock = asyncio.Lock()
+
+    if csv_path:
+        for session in sessions:
+            session.open_log(csv_path)
+        gap_path = os.path.join(os.path.dirname(csv_path), "ble_gaps.csv")
+        gap_file = open(gap_path, "w", newline="")
+        gap_writer = csv.writer(gap_file)
+        gap_writer.writerow(GAPS_HEADER)
+
+    consumer_stop = threading.Event()
+    consumer = threading.Thread(target=consumer_loop, args=(consumer_stop,), daemon=True)
+    consumer.start()
+
+    # Every device runs its own state machine as a task on this one loop
+    await asyncio.gather(*(session.run() for session in sessions))
 
-    if csv_file:
-        csv_file.close()
-        print("[BLE] CSV closed.")
+    # The consumer does a final drain before exiting, then the logs can close
+    consumer_stop.set()
+    consumer.join()
+    for session in sessions:
+        session.close_log()
+    if gap_file:
+        gap_file.close()
     print("[BLE] Receiver task stopped.")
 
 def run_ble_in_thread(csv_path: str | None = None):
@@ -124,4 +431,4 @@ def run_ble_in_thread(csv_path: str | None = None):
     try:
         loop.run_until_complete(ble_receiver_task(csv_path))
     finally:
-        loop.close()
\ No newline at end of file
+        loop.close()
@@ -0,0 +1,122 @@
+# clock_sync.py — device tick -> host clock mapping and dropped-packet accounting
+#
+# Every notification is stamped with time.time() when Bleak hands it over, which adds the
+# connection-interval jitter (up to tens of ms) to the true sampling time. The firmware
+# also sends its own microsecond tick for the first sample of each packet, so
+#
+#   host_time = offset + skew * device_seconds
+#
+# is fitted online: skew by least squares over a window of recent packets, offset from
+# the lower envelope of the residuals (receipt can only be late, never early, so the
+# packets that arrived fastest define the line). Per-sample host timestamps are then
+# t0 + i * gap for each packet.
+import numpy as np
+
+TICK_BITS = 32
+SEQ_BITS = 16
+
+
+class TickUnwrapper:
+    """Turns a wrapping counter into a monotonically increasing int64."""
+    def __init__(self, bits=TICK_BITS):
+        self.modulus = 1 << bits
+        self.last = None        # last unwrapped value
+        self.resets = 0         # times the counter jumped backwards (device reboot)
+
+    def unwrap(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) == 0:
+            return values
+        prev = values[0] if self.last is None else self.last % self.modulus
+        base = values[0] if self.last is None else self.last
+        steps = np.diff(np.concatenate(([prev], values))) % self.modulus
+        # A step of more than half the range is a counter that restarted, not a wrap
+        restart = steps > self.modulus // 2
+        if restart.any():
+            self.resets += int(restart.sum())
+            steps[restart] = 0
+        out = base + np.cumsum(steps)
+        self.last = int(out[-1])
+        return out
+
+    def reset(self):
+        self.last = None
+
+
+class SequenceTracker:
+    """Counts packets missing from a wrapping per-packet sequence number."""
+    def __init__(self, bits=SEQ_BITS):
+        self._unwrap = TickUnwrapper(bits)
+        self.received = 0
+        self.lost = 0
+
+    def update(self, seq):
+        """seq: the batch's sequence numbers; returns how many packets went missing before each."""
+        if len(seq) == 0:
+            return np.zeros(0, dtype=np.int64)
+        first = self._unwrap.last is None
+        prev = self._unwrap.last
+        seqs = self._unwrap.unwrap(seq)
+        gaps = np.diff(np.concatenate(([seqs[0] - 1 if first else prev], seqs))) - 1
+        gaps = np.maximum(gaps, 0)
+        self.received += len(seq)
+        self.lost += int(gaps.sum())
+        return gaps
+
+    def reset(self):
+        """Call on (re)connect: the device may have restarted its counter."""
+        self._unwrap.reset()
+
+
+class ClockModel:
+    def __init__(self, window=2048, min_points=16):
+        """
+        window: recent packets the fit uses (2048 is ~20 s at 100 packets/s).
+        min_points: packets needed before the skew is fitted (1.0 until then).
+        """
+        self.window = window
+        self.min_points = min_points
+        self._dev = np.zeros(window)
+        self._host = np.zeros(window)
+        self.count = 0
+        self._dev0 = None       # reference point, keeps the fit well conditioned
+        self._host0 = None
+        self.skew = 1.0
+        self.offset = 0.0       # host - host0 at dev0, on the lower envelope
+
+    def update(self, device_s, host_s):
+        """Adds a batch of (device seconds, host receipt time) pairs and refits."""
+        device_s = np.asarray(device_s, dtype=np.float64)
+        host_s = np.asarray(host_s, dtype=np.float64)
+        if len(device_s) == 0:
+            return
+        if self._dev0 is None:
+            self._dev0, self._host0 = float(device_s[0]), float(host_s[0])
+        if len(device_s) > self.window:
+            device_s, host_s = device_s[-self.window:], host_s[-self.window:]
+        idx = (self.count + np.arange(len(device_s))) % self.window
+        self._dev[idx] = device_s - self._dev0
+        self._host[idx] = host_s - self._host0
+        self.count += len(device_s)
+
+        n = min(self.count, self.window)
+        x, y = self._dev[:n], self._host[:n]
+        if n >= self.min_points:
+            xm = x.mean()
+            var = np.dot(x - xm, x - xm)
+            if var > 0:
+                self.skew = float(np.dot(x - xm, y - y.mean()) / var)
+        self.offset = float(np.min(y - self.skew * x))
+
+    def to_host(self, device_s):
+        """Host clock time (epoch seconds) for device seconds; scalar or array."""
+        return self._host0 + self.offset + self.skew * (np.asarray(device_s, dtype=np.float64) - self._dev0)
+
+    @property
+    def ready(self):
+        return self._dev0 is not None
+
+    def reset(self):
+        self.count = 0
+        self._dev0 = self._host0 = None
+        self.skew, self.offset = 1.0, 0.0
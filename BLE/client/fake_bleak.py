@@ -0,0 +1,125 @@
+# fake_bleak.py — stand-in for the parts of bleak the receiver uses, for testing without
+# hardware (BLE_BACKEND=fake)
+#
+# Every name resolves to a fake board that streams version 2 packets (built with the
+# firmware's own BLE/server/packet.py) from two sine waves at FAKE_BLE_RATE Hz. Set
+# FAKE_BLE_DROP_S to make each connection drop after a random time with that mean,
+# FAKE_BLE_OUTAGE_S for how long a board then times out connects, and FAKE_BLE_SCAN_S
+# for how long discovery takes. A board keeps sampling (and counting packets) while no
+# one is connected, like the real firmware, so a reconnect resumes with a seq jump.
+import asyncio
+import math
+import os
+import random
+import time
+import zlib
+from BLE.server.packet import Packetizer, ENC_DELTA8
+
+RATE_HZ = int(os.environ.get("FAKE_BLE_RATE", "1000"))
+DROP_S = float(os.environ.get("FAKE_BLE_DROP_S", "0"))      # 0: never drop
+OUTAGE_S = float(os.environ.get("FAKE_BLE_OUTAGE_S", "0"))
+SCAN_S = float(os.environ.get("FAKE_BLE_SCAN_S", "0.5"))
+MTU = 247
+MAX_COUNT = 50
+
+
+class _Board:
+    """What outlives a connection: the board's clock, packet counter and outages."""
+    def __init__(self, address):
+        gap_us = 1000000 // RATE_HZ
+        self.packetizer = Packetizer(ENC_DELTA8, gap_us, MAX_COUNT, MTU - 3, payload=MTU - 3)
+        self.start = time.monotonic()
+        self.n = 0                  # samples taken so far
+        self.down_until = 0.0
+        # Each fake board keeps its own phase, so several of them can be told apart
+        self.phase = (zlib.crc32(address.encode()) % 1000) / 1000.0
+
+
+_boards = {}
+
+
+class BleakError(Exception):
+    pass
+
+
+class FakeDevice:
+    def __init__(self, address, name):
+        self.address = address
+        self.name = name
+
+
+def fake_address(name):
+    h = zlib.crc32(name.encode())
+    return ":".join(f"{b:02X}" for b in (0xFA, 0xCE, *h.to_bytes(4, "big")))
+
+
+class BleakScanner:
+    @staticmethod
+    async def find_device_by_name(name, timeout=10.0):
+        await asyncio.sleep(min(SCAN_S, timeout))
+        return FakeDevice(fake_address(name), name)
+
+
+class BleakClient:
+    def __init__(self, address, timeout=10.0):
+        self.address = address
+        self.timeout = timeout
+        self.mtu_size = MTU
+        self._connected = False
+        self._task = None
+        self._board = _boards.setdefault(address, _Board(address))
+
+    async def __aenter__(self):
+        if time.monotonic() < self._board.down_until:
+            # Like BlueZ when the board is off or out of range: the connect times out
+            await asyncio.sleep(min(self.timeout, self._board.down_until - time.monotonic()))
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(0.05)
+        self._connected = True
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    @property
+    def is_connected(self):
+        return self._connected
+
+    async def start_notify(self, _uuid, callback):
+        if not self._connected:
+            raise BleakError("Not connected")
+        self._task = asyncio.ensure_future(self._stream(callback))
+
+    async def disconnect(self):
+        self._connected = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _stream(self, callback):
+        board = self._board
+        packetizer = board.packetizer
+        count = packetizer.samples_per_packet
+        vals = [0] * (2 * count)
+        drop_at = time.monotonic() + random.expovariate(1.0 / DROP_S) if DROP_S > 0 else None
+        # Packets the board sent while nobody was listening
+        while board.start + (board.n + count) / RATE_HZ <= time.monotonic():
+            board.n += count
+            packetizer.pack(vals, count, int((board.start + board.n / RATE_HZ) * 1e6))
+        while self._connected:
+            for i in range(count):
+                t = (board.n + i) / RATE_HZ
+                vals[i] = int(2048 + 1500 * math.sin(2 * math.pi * (3.0 * t + board.phase)))
+                vals[count + i] = int(2048 + 1500 * math.sin(2 * math.pi * (7.0 * t + board.phase)))
+            first_us = int((board.start + board.n / RATE_HZ) * 1e6)
+            board.n += count
+            # The packet goes out once its last sample has been taken
+            await asyncio.sleep(max(0.0, board.start + board.n / RATE_HZ - time.monotonic()))
+            callback(0, bytearray(packetizer.pack(vals, count, first_us)))
+            if drop_at is not None and time.monotonic() >= drop_at:
+                self._connected = False
+                board.down_until = time.monotonic() + OUTAGE_S
@@ -0,0 +1,143 @@
+# packets.py — decoding of the ESP32 notification payloads, a whole batch at a time
+#
+#   version 0 (legacy, 20 bytes):  a0[5] a1[5]                       all u16 LE
+#   version 1 (30 bytes):          version u8 | n u8 | seq u16 | tick u32 | gap_us u16 |
+#                                  a0[5] a1[5]
+#   version 2 (12-byte header):    version u8 | encoding u8 | seq u16 | count u16 |
+#                                  tick u32 | gap_us u16 | a0[count] a1[count]
+#                                  raw u16, packed 12-bit or int8 deltas
+#                                  (see BLE/server/packet.py)
+#
+# tick is the device's microsecond counter at the first sample of the packet (wrapping
+# at 2**32), gap_us the spacing between samples, seq a per-packet counter (wrapping at
+# 2**16) used to spot dropped notifications. Legacy packets carry neither, so their
+# seq is -1 and tick/gap_us are 0.
+#
+# Samples come out in frames of N_SAMPLES per channel, the unit the rest of the
+# pipeline (sample log rows, CSV) works in; a version 2 packet holds count / 5 frames.
+import struct
+import numpy as np
+
+N_SAMPLES = 5
+LEGACY = struct.Struct("<10H")
+V1 = struct.Struct("<BBHIH10H")
+V1_DTYPE = np.dtype([
+    ("version", "u1"),
+    ("n", "u1"),
+    ("seq", "<u2"),
+    ("tick", "<u4"),
+    ("gap_us", "<u2"),
+    ("a0", "<u2", (N_SAMPLES,)),
+    ("a1", "<u2", (N_SAMPLES,)),
+])
+V2_HEADER = np.dtype([
+    ("version", "u1"),
+    ("encoding", "u1"),
+    ("seq", "<u2"),
+    ("count", "<u2"),
+    ("tick", "<u4"),
+    ("gap_us", "<u2"),
+])
+ENC_RAW16, ENC_PACKED12, ENC_DELTA8 = 0, 1, 2
+MAX_PAYLOAD = 244       # ATT MTU 247 - 3
+
+
+def body_size(encoding, count):
+    """Bytes of a version 2 body (as BLE/server/packet.py); -1 for an unknown encoding."""
+    count = np.asarray(count, dtype=np.int64)
+    return np.select([encoding == ENC_RAW16, encoding == ENC_PACKED12, encoding == ENC_DELTA8],
+                     [4 * count, 3 * count, 2 * (count + 1)], -1)
+
+
+def _decode_body(body, encoding, count):
+    """(m, body_size) uint8 -> (m, 2, count) int64 samples for one encoding/count."""
+    m = len(body)
+    if encoding == ENC_RAW16:
+        vals = np.ascontiguousarray(body).view("<u2")
+    elif encoding == ENC_PACKED12:
+        b = body.reshape(m, -1, 3).astype(np.uint16)
+        vals = np.empty((m, b.shape[1], 2), dtype=np.uint16)
+        vals[:, :, 0] = b[:, :, 0] | ((b[:, :, 1] & 0xF) << 8)
+        vals[:, :, 1] = (b[:, :, 1] >> 4) | (b[:, :, 2] << 4)
+    else:
+        per = body.reshape(m, 2, count + 1)
+        first = np.ascontiguousarray(per[:, :, :2]).view("<u2")      # (m, 2, 1)
+        deltas = per[:, :, 2:].view(np.int8).astype(np.int64)
+        vals = np.concatenate([first.astype(np.int64), first + np.cumsum(deltas, axis=2)], axis=2)
+    return vals.reshape(m, 2, count)
+
+
+def decode_batch(payloads, lengths):
+    """
+    Decodes a (n, max_payload) uint8 block of raw notifications (see PacketRing.drain).
+    Returns (good, packets, frames):
+      good     length-n mask of the notifications that decoded
+      packets  per good packet: seq (int32, -1 if unknown), tick (int64), gap_us,
+               count (samples per channel)
+      frames   per 5-sample frame, in arrival order: a0/a1 ((f, 5) uint16), packet
+               (index into packets), first_sample (offset of the frame in its packet)
+    """
+    n = len(lengths)
+    version = payloads[:, 0] if n else np.zeros(0, dtype=np.uint8)
+    legacy = lengths == LEGACY.size
+    v1 = (lengths == V1.size) & (version == 1)
+    v2 = (lengths >= V2_HEADER.itemsize) & (version == 2) & ~legacy
+    header = np.ascontiguousarray(payloads[:, :V2_HEADER.itemsize]).view(V2_HEADER)[:, 0]
+    if v2.any():
+        count = header["count"].astype(np.int64)
+        expected = V2_HEADER.itemsize + body_size(header["encoding"], count)
+        v2 &= (expected == lengths) & (count > 0) & (count % N_SAMPLES == 0)
+    good = legacy | v1 | v2
+    idx = np.flatnonzero(good)
+    m = len(idx)
+
+    packets = {
+        "seq": np.full(m, -1, dtype=np.int32),
+        "tick": np.zeros(m, dtype=np.int64),
+        "gap_us": np.zeros(m, dtype=np.int32),
+        "count": np.full(m, N_SAMPLES, dtype=np.int64),
+    }
+    is_v1, is_v2 = v1[idx], v2[idx]
+    if is_v1.any():
+        rec = np.ascontiguousarray(payloads[v1, :V1.size]).view(V1_DTYPE)[:, 0]
+        packets["seq"][is_v1] = rec["seq"]
+        packets["tick"][is_v1] = rec["tick"]
+        packets["gap_us"][is_v1] = rec["gap_us"]
+    if is_v2.any():
+        h = header[v2]
+        packets["seq"][is_v2] = h["seq"]
+        packets["tick"][is_v2] = h["tick"]
+        packets["gap_us"][is_v2] = h["gap_us"]
+        packets["count"][is_v2] = h["count"]
+
+    n_frames = packets["count"] // N_SAMPLES
+    start = np.concatenate(([0], np.cumsum(n_frames)[:-1])) if m else n_frames
+    total = int(n_frames.sum())
+    frames = {
+        "a0": np.empty((total, N_SAMPLES), dtype=np.uint16),
+        "a1": np.empty((total, N_SAMPLES), dtype=np.uint16),
+        "packet": np.repeat(np.arange(m), n_frames),
+    }
+    frames["first_sample"] = (np.arange(total) - start[frames["packet"]]) * N_SAMPLES
+
+    # Version 0/1: one frame each at a fixed place in the payload
+    for mask, offset in ((legacy[idx], 0), (is_v1, V1.size - LEGACY.size)):
+        if mask.any():
+            rows = idx[mask]
+            vals = np.ascontiguousarray(payloads[rows, offset:offset + LEGACY.size]).view("<u2")
+            frames["a0"][start[mask]] = vals[:, :N_SAMPLES]
+            frames["a1"][start[mask]] = vals[:, N_SAMPLES:]
+    # Version 2: decode every (encoding, count) group in one go
+    if is_v2.any():
+        enc_count = header["encoding"][idx].astype(np.int64) << 16 | packets["count"]
+        for key in np.unique(enc_count[is_v2]):
+            grp = np.flatnonzero(is_v2 & (enc_count == key))
+            encoding, count = int(key >> 16), int(key & 0xFFFF)
+            size = int(body_size(encoding, count))
+            body = payloads[idx[grp], V2_HEADER.itemsize:V2_HEADER.itemsize + size]
+            vals = _decode_body(body, encoding, count)          # (g, 2, count)
+            k = count // N_SAMPLES
+            dest = (start[grp][:, None] + np.arange(k)).ravel()
+            frames["a0"][dest] = vals[:, 0].reshape(-1, N_SAMPLES)
+            frames["a1"][dest] = vals[:, 1].reshape(-1, N_SAMPLES)
+    return good, packets, frames
@@ -0,0 +1,118 @@
+# rings.py — preallocated single-producer/single-consumer rings for the BLE path
+#
+# PacketRing: the Bleak notification handler (asyncio loop thread) only timestamps raw
+# payloads into preallocated slots; a consumer thread drains them in batches. Neither
+# side locks: the producer only advances `head`, the consumer only advances `tail`.
+#
+# SampleRing: per-channel sample history for the live plot, written in bulk by that
+# consumer thread and snapshotted in bulk by the GUI.
+import numpy as np
+
+
+class PacketRing:
+    def __init__(self, capacity=4096, max_payload=20):
+        self.capacity = capacity
+        self.max_payload = max_payload
+        self._payload = bytearray(capacity * max_payload)
+        self._view = memoryview(self._payload)
+        self._data = np.frombuffer(self._payload, dtype=np.uint8).reshape(capacity, max_payload)
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._lengths = np.zeros(capacity, dtype=np.int32)
+        self.head = 0       # next slot the producer writes (total pushed)
+        self.tail = 0       # next slot the consumer reads (total consumed)
+        self.dropped = 0    # packets lost because the ring was full
+        self.oversized = 0  # packets longer than max_payload
+        self.max_backlog = 0
+
+    def push(self, t, data):
+        """Producer: copy one payload in. Returns False if it had to be dropped."""
+        n = len(data)
+        if n > self.max_payload:
+            self.oversized += 1
+            return False
+        head = self.head
+        backlog = head - self.tail
+        if backlog >= self.capacity:
+            self.dropped += 1
+            return False
+        slot = head % self.capacity
+        off = slot * self.max_payload
+        self._view[off:off + n] = data
+        self._times[slot] = t
+        self._lengths[slot] = n
+        self.head = head + 1
+        if backlog + 1 > self.max_backlog:
+            self.max_backlog = backlog + 1
+        return True
+
+    def drain(self, max_items=None):
+        """
+        Consumer: take everything pushed so far (at most max_items).
+        Returns (times, payloads (n, max_payload) uint8, lengths), all copies.
+        """
+        tail, head = self.tail, self.head
+        n = head - tail if max_items is None else min(head - tail, max_items)
+        idx = (tail + np.arange(n)) % self.capacity
+        out = self._times[idx], self._data[idx], self._lengths[idx]
+        self.tail = tail + n
+        return out
+
+    @property
+    def backlog(self):
+        return self.head - self.tail
+
+
+class LatencyStats:
+    """Running EMA/max of a latency in milliseconds."""
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.mean_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000.0
+        self.mean_ms += self.alpha * (ms - self.mean_ms)
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+
+
+class SampleRing:
+    """
+    One channel of samples for the live plot. The BLE consumer writes whole batches,
+    the GUI takes a snapshot of the newest n samples into its own buffer; no
+    per-sample objects, no locks.
+    """
+    def __init__(self, capacity=1 << 16, dtype=np.uint16):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        self.head = 0       # total samples ever written
+
+    def write(self, values):
+        values = np.asarray(values).ravel()
+        n = len(values)
+        if n >= self.capacity:
+            values = values[-self.capacity:]
+        start = (self.head + n - len(values)) % self.capacity
+        first = min(len(values), self.capacity - start)
+        self._data[start:start + first] = values[:first]
+        self._data[:len(values) - first] = values[first:]
+        self.head += n
+
+    def snapshot(self, n, out=None):
+        """
+        Copies the newest min(n, available) samples, oldest first, into out (allocated if
+        None) and returns the filled view of it.
+        """
+        while True:
+            head = self.head
+            n_avail = min(n, head, self.capacity)
+            if out is None:
+                out = np.empty(n, dtype=self._data.dtype)
+            start = (head - n_avail) % self.capacity
+            first = min(n_avail, self.capacity - start)
+            out[:first] = self._data[start:start + first]
+            out[first:n_avail] = self._data[:n_avail - first]
+            # If the writer lapped the region we copied, it may be torn: take it again
+            if self.head - head <= self.capacity - n_avail:
+                return out[:n_avail]
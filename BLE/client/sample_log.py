@@ -0,0 +1,200 @@
+# sample_log.py — fixed-width binary log of BLE samples (replaces one CSV row per notification)
+#
+# Every 5-sample frame becomes one 60-byte record (a v2 notification of `count` samples
+# per channel gives count / 5 records), appended to a preallocated, memory-mapped file;
+# nothing is formatted on the receive path and the file is flushed on a timer, not per
+# row. The file grows in `grow_records` steps as needed.
+#
+#   header (64 bytes): magic | version | record size | record count
+#   records:           epoch_s f64 | a0 5 x u16 | a1 5 x u16 | angle_of_particles f32 |
+#                      area_of_particles f32 | approximate_angle_of_a0 f32 |
+#                      approximate_angle_of_a1 f32 | seq i32 | sample_t0_s f64 |
+#                      sample_dt_s f32
+# Missing values (e.g. no blob yet) are stored as NaN. seq is the packet's sequence
+# number (-1 for legacy packets without one), shared by all the records of a packet;
+# sample_t0_s is the host-clock time of the record's first sample from the device tick
+# (NaN for legacy packets), sample_dt_s the spacing of its samples.
+# Version 1 logs (without the last three fields) can still be read.
+#
+#   python -m BLE.client.sample_log ble_samples.bin [ble_samples.csv]
+# converts a log to the CSV layout ble_receiver_task used to write.
+import csv
+import os
+import struct
+import sys
+import time
+import numpy as np
+
+MAGIC = b"DSKBLE\0\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQ")
+HEADER_SIZE = 64
+RECORD_DTYPE_V1 = np.dtype([
+    ("epoch_s", "<f8"),
+    ("a0", "<u2", (5,)),
+    ("a1", "<u2", (5,)),
+    ("angle_of_particles", "<f4"),
+    ("area_of_particles", "<f4"),
+    ("approximate_angle_of_a0", "<f4"),
+    ("approximate_angle_of_a1", "<f4"),
+])
+RECORD_DTYPE = np.dtype(RECORD_DTYPE_V1.descr + [
+    ("seq", "<i4"),
+    ("sample_t0_s", "<f8"),
+    ("sample_dt_s", "<f4"),
+])
+RECORD_DTYPES = {1: RECORD_DTYPE_V1, 2: RECORD_DTYPE}
+CSV_HEADER = [
+    "iso_time", "epoch_s",
+    "a0_0", "a0_1", "a0_2", "a0_3", "a0_4",
+    "a1_0", "a1_1", "a1_2", "a1_3", "a1_4",
+    "angle_of_particles", "area_of_particles",
+    "approximate_angle_of_a0", "approximate_angle_of_a1",
+    "seq", "sample_t0_s", "sample_dt_s"
+]
+
+
+def _nan_if_none(v):
+    return np.nan if v is None else v
+
+
+class BinarySampleLog:
+    def __init__(self, path, grow_records=1 << 18, flush_interval=1.0):
+        self.path = path
+        self.grow_records = grow_records
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._capacity = 0
+        self._mm = None
+        self._last_flush = time.monotonic()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, 0).ljust(HEADER_SIZE, b"\0"))
+        self._grow()
+
+    def _grow(self):
+        if self._mm is not None:
+            self._mm.flush()
+            del self._mm
+        self._capacity += self.grow_records
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self._capacity * RECORD_DTYPE.itemsize)
+        self._mm = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r+", offset=HEADER_SIZE,
+                             shape=(self._capacity,))
+
+    def append(self, epoch, a0_vals, a1_vals, particle_angle, particle_area, a0_angle, a1_angle,
+               seq=-1, sample_t0=None, sample_dt=None):
+        if self.count >= self._capacity:
+            self._grow()
+        self._mm[self.count] = (epoch, a0_vals, a1_vals, _nan_if_none(particle_angle),
+                                _nan_if_none(particle_area), _nan_if_none(a0_angle),
+                                _nan_if_none(a1_angle), seq, _nan_if_none(sample_t0),
+                                _nan_if_none(sample_dt))
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+
+    def append_batch(self, epochs, a0, a1, particle_angle, particle_area, a0_angle, a1_angle,
+                     seq=-1, sample_t0=None, sample_dt=None):
+        """Appends n records at once; a0/a1 are (n, 5), the rest length-n arrays or scalars."""
+        n = len(epochs)
+        while self.count + n > self._capacity:
+            self._grow()
+        rows = self._mm[self.count:self.count + n]
+        rows["epoch_s"] = epochs
+        rows["a0"] = a0
+        rows["a1"] = a1
+        rows["angle_of_particles"] = _nan_if_none(particle_angle)
+        rows["area_of_particles"] = _nan_if_none(particle_area)
+        rows["approximate_angle_of_a0"] = _nan_if_none(a0_angle)
+        rows["approximate_angle_of_a1"] = _nan_if_none(a1_angle)
+        rows["seq"] = seq
+        rows["sample_t0_s"] = _nan_if_none(sample_t0)
+        rows["sample_dt_s"] = _nan_if_none(sample_dt)
+        self.count += n
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self):
+        self._mm.flush()
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER.size - 8)
+            f.write(struct.pack("<Q", self.count))
+
+    def close(self):
+        self.flush()
+        del self._mm
+        # Drop the unused preallocated tail
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+
+
+# --- Reading ---
+def read_sample_log(path, mmap=False):
+    """
+    The log as a NumPy structured array (fields as RECORD_DTYPE, or RECORD_DTYPE_V1 for
+    an old log; a0/a1 are (n, 5)). Works on a log that is still being written: it
+    returns the last flushed count.
+    """
+    with open(path, "rb") as f:
+        magic, version, record_size, count = HEADER.unpack(f.read(HEADER.size))
+    dtype = RECORD_DTYPES.get(version)
+    if magic != MAGIC or dtype is None or record_size != dtype.itemsize:
+        raise ValueError(f"{path} is not a BLE sample log (versions {sorted(RECORD_DTYPES)})")
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    data = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+    return data if mmap else np.array(data)
+
+
+def _iso_times(epochs):
+    iso = np.datetime_as_string((epochs * 1e6).round().astype("datetime64[us]"), unit="us")
+    # datetime.isoformat() leaves out an all-zero fraction; match it
+    return [s[:-7] if s.endswith(".000000") else s for s in iso.tolist()]
+
+
+def _csv_column(values):
+    # str() of a float32 is its shortest round-tripping form; NaN was None originally
+    return ["" if np.isnan(v) else str(v) for v in values]
+
+
+def iter_csv_rows(path, chunk=100_000):
+    """Yields a binary log's records as rows of the ble_samples.csv layout (lists of str)."""
+    data = read_sample_log(path, mmap=True)
+    for start in range(0, len(data), chunk):
+        block = np.array(data[start:start + chunk])
+        epochs = block["epoch_s"]
+        floats = [_csv_column(block[name]) for name in CSV_HEADER[12:16]]
+        if "seq" in block.dtype.names:
+            floats += [["" if s < 0 else str(s) for s in block["seq"].tolist()],
+                       ["" if np.isnan(t) else f"{t:.6f}" for t in block["sample_t0_s"].tolist()],
+                       _csv_column(block["sample_dt_s"])]
+        else:
+            floats += [[""] * len(block)] * 3
+        for iso, epoch, a0, a1, *rest in zip(_iso_times(epochs), epochs.tolist(),
+                                             block["a0"].tolist(), block["a1"].tolist(), *floats):
+            yield [iso, f"{epoch:.6f}", *map(str, a0), *map(str, a1), *rest]
+
+
+def to_csv(path, csv_path, chunk=100_000):
+    """Converts a binary log to the original ble_samples.csv layout."""
+    rows = 0
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for row in iter_csv_rows(path, chunk):
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("usage: python -m BLE.client.sample_log LOG.bin [OUT.csv]")
+        sys.exit(1)
+    src = sys.argv[1]
+    dst = sys.argv[2] if len(sys.argv) == 3 else os.path.splitext(src)[0] + ".csv"
+    print(f"[BLE] wrote {to_csv(src, dst)} rows to {dst}")
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# deploy.py — copy main.py to ESP32 and reset (no firmware flash)
+# deploy.py — copy the firmware scripts to ESP32 and reset (no firmware flash)
 
 # source micropython-tools/bin/activate
 
@@ -7,6 +7,8 @@ import os, sys, subprocess, glob, shutil
 
 PORT = None  # set to "/dev/ttyUSB0" if you want fixed port
 MAIN_PY = "main.py"
+# Modules main.py imports go first, main.py last
+FILES = ["packet.py", "sampler.py", MAIN_PY]
 
 def which_or_die(cmd, pip_hint=None):
     if shutil.which(cmd) is None:
@@ -29,11 +31,12 @@ def main():
     which_or_die("mpremote", "mpremote")
 
     base = os.path.dirname(os.path.abspath(__file__))
-    main_path = os.path.join(base, MAIN_PY)
+    paths = [os.path.join(base, name) for name in FILES]
 
-    if not os.path.isfile(main_path):
-        print(f"[!] Script not found: {main_path}")
-        sys.exit(1)
+    for path in paths:
+        if not os.path.isfile(path):
+            print(f"[!] Script not found: {path}")
+            sys.exit(1)
 
     port = PORT or autodetect_port()
     if not port:
@@ -41,8 +44,9 @@ def main():
         sys.exit(1)
 
     print(f"[i] Using port: {port}")
-    print(f"[i] Copying {MAIN_PY} -> /main.py")
-    run(["mpremote", "connect", port, "fs", "cp", main_path, ":/main.py"])
+    for name, path in zip(FILES, paths):
+        print(f"[i] Copying {name} -> /{name}")
+        run(["mpremote", "connect", port, "fs", "cp", path, f":/{name}"])
 
     print("[i] Resetting board…")
     run(["mpremote", "connect", port, "reset"])
@@ -1,6 +1,8 @@
 # main.py — ESP32 (HUZZAH32) BLE ADC streamer on A3/A4 + heartbeat (MicroPython)
-import time, struct, machine, bluetooth
+import time, machine, bluetooth
 from micropython import const
+import packet
+from sampler import Sampler
 
 # ===== Board =====
 LED_PIN = 13
@@ -13,6 +15,7 @@ PIN_A4 = 36
 # ===== BLE UUIDs (must match your Pi receiver) =====
 _IRQ_CENTRAL_CONNECT    = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
+_IRQ_MTU_EXCHANGED      = const(21)
 SVC_UUID  = bluetooth.UUID("c0de0001-0000-4a6f-9e00-000000000001")
 CHR_UUID  = bluetooth.UUID("c0de1000-0000-4a6f-9e00-000000000001")
 _PROP_READ   = const(0x02)
@@ -20,9 +23,15 @@ _PROP_NOTIFY = const(0x10)
 
 # ===== Stream timing =====
 NAME       = "ESP32-Analog-100Hz"
-N          = const(5)         # 5 samples per channel -> 10 u16 total
-GAP_US     = const(2000)      # 2 ms between samples -> 500 Hz
-PERIOD_US  = const(10000)     # 10 ms per packet -> ~100 Hz
+RATE_HZ    = const(1000)      # timer-driven sample rate per channel, 500..10000, with v2 packets
+LEGACY_RATE_HZ = const(500)   # until the MTU exchange: 20-byte legacy packets, 100 per second
+MAX_COUNT  = const(50)        # samples per channel per packet at most (50 ms at 1 kHz)
+
+# ===== Packet (version 2, see packet.py) =====
+# As many samples as fit the negotiated MTU, up to MAX_COUNT, in ENCODING
+ENCODING   = packet.ENC_DELTA8  # ENC_RAW16, ENC_PACKED12 or ENC_DELTA8
+MTU        = const(247)       # largest ATT MTU we accept; the central picks the actual one
+DEFAULT_MTU = const(23)
 
 def adv_payload(name: str) -> bytes:
     n = name.encode()
@@ -43,14 +52,22 @@ class App:
             # Some ports default to 12-bit; okay to ignore if not present
             pass
 
-        self._buf = bytearray(20)  # 10 x u16
+        # read_u16() is 0..65535 → scale to ~12-bit by >>4
+        adc3, adc4 = self.adc3, self.adc4
+        self.sampler = Sampler(lambda: adc3.read_u16() >> 4, lambda: adc4.read_u16() >> 4, MAX_COUNT)
+        self.packetizer = packet.Packetizer(ENCODING, 1000000 // RATE_HZ, MAX_COUNT, MTU - 3)
+        self._rate = LEGACY_RATE_HZ
+        self._set_payload(DEFAULT_MTU - 3)
         # --- BLE setup ---
         self.ble = bluetooth.BLE()
         self.ble.active(True)
+        self.ble.config(mtu=MTU)
         self.ble.irq(self._irq)
         ((self._chr_handle,),) = self.ble.gatts_register_services((
             (SVC_UUID, ((CHR_UUID, _PROP_READ | _PROP_NOTIFY),)),
         ))
+        # Characteristic values are 20 bytes unless told otherwise
+        self.ble.gatts_set_buffer(self._chr_handle, MTU - 3)
         self._conn = None
         self._advertise()
         print("Booted. Advertising as", NAME)
@@ -62,59 +79,72 @@ class App:
             pass
         self.ble.gap_advertise(100_000, adv_payload(NAME))
 
+    def _set_payload(self, size):
+        # Until an MTU exchange makes room for a version 2 packet, the legacy 20-byte
+        # packets (5 samples per channel, no header) are sent, at the old 500 Hz: at
+        # RATE_HZ they would need 200 notifications a second, more than many centrals
+        # take. run() switches the timer to the new rate.
+        count = self.packetizer.set_payload(size)
+        self.sampler.set_count(self.packetizer.samples_per_packet)
+        self._rate = RATE_HZ if count else LEGACY_RATE_HZ
+        print("Payload", size, "bytes ->", count or "legacy", "samples/channel per packet")
+
+    def _apply_rate(self):
+        sampler = self.sampler
+        if sampler.rate_hz == self._rate:
+            return
+        sampler.stop()
+        sampler.start(self._rate)
+        self.packetizer.gap_us = sampler.gap_us
+        print("Sampling at", self._rate, "Hz")
+
     def _irq(self, event, data):
         if event == _IRQ_CENTRAL_CONNECT:
             self._conn, _, _ = data
             print("Connected", self._conn)
         elif event == _IRQ_CENTRAL_DISCONNECT:
             self._conn = None
+            self._set_payload(DEFAULT_MTU - 3)
             print("Disconnected; restarting advertising")
             self._advertise()
+        elif event == _IRQ_MTU_EXCHANGED:
+            _, mtu = data
+            self._set_payload(mtu - 3)
 
     def run(self):
-        hb_div = 0
+        # The timer fills the sampler's buffers; this loop only sends the full ones
+        hb_next = time.ticks_ms()
+        sampler = self.sampler
         while True:
-            t0 = time.ticks_us()
+            self._apply_rate()
+            item = sampler.take()
+            if item is None:
+                machine.idle()
+                continue
             try:
-                # --- sample A3/A4: 5 samples each with 2 ms gap ---
-                a3 = [0]*N
-                a4 = [0]*N
-                for i in range(N):
-                    # read_u16() is 0..65535 → scale to ~12-bit by >>4
-                    a3[i] = (self.adc3.read_u16() >> 4)
-                    a4[i] = (self.adc4.read_u16() >> 4)
-                    if i < N - 1:
-                        target = time.ticks_add(time.ticks_us(), GAP_US)
-                        while time.ticks_diff(target, time.ticks_us()) > 0:
-                            pass
-
-                # Pack as 10 x u16 LE: A3[5], then A4[5]
-                vals = a3 + a4
-                struct.pack_into("<10H", self._buf, 0, *vals)
+                vals, count, first_us = item
+                data = self.packetizer.pack(vals, count, first_us)
+                sampler.release()
 
                 # Update GATT value and notify
-                self.ble.gatts_write(self._chr_handle, self._buf)
+                self.ble.gatts_write(self._chr_handle, data)
                 if self._conn is not None:
                     try:
-                        self.ble.gatts_notify(self._conn, self._chr_handle, self._buf)
+                        self.ble.gatts_notify(self._conn, self._chr_handle, data)
                     except OSError:
                         pass
 
-                # Heartbeat at ~2 Hz (toggle every ~0.5 s)
-                hb_div = (hb_div + 1) % 50
-                if hb_div == 0:
+                # Heartbeat at ~2 Hz
+                if time.ticks_diff(time.ticks_ms(), hb_next) >= 0:
+                    hb_next = time.ticks_add(hb_next, 500)
                     led.value(1 - led.value())
 
             except Exception as e:
+                sampler.release()
                 print("Loop error:", e)
                 time.sleep(0.1)
                 self._advertise()
 
-            # keep 10 ms cadence
-            dt = time.ticks_diff(time.ticks_us(), t0)
-            if dt < PERIOD_US:
-                time.sleep_us(PERIOD_US - dt)
-
 try:
     App().run()
 except Exception as e:
@@ -0,0 +1,148 @@
+# packet.py — version 2 notification encoder (MicroPython; also imports under CPython)
+#
+# One notification carries `count` samples per channel (a multiple of FRAME), as many
+# as fit in the negotiated ATT MTU:
+#
+#   header (12 bytes): version u8 (2) | encoding u8 | seq u16 | count u16 |
+#                      tick u32 (us at the first sample) | gap_us u16
+#   body:              A3[count] then A4[count], encoded as
+#     ENC_RAW16     u16 LE per sample                           2 bytes/sample
+#     ENC_PACKED12  two 12-bit samples in 3 bytes:              1.5 bytes/sample
+#                   b0 = v0 & 0xFF, b1 = v0 >> 8 | (v1 & 0xF) << 4, b2 = v1 >> 4
+#     ENC_DELTA8    per channel: first sample u16, then         ~1 byte/sample
+#                   count - 1 int8 differences; if a difference does not fit,
+#                   the packet is sent as ENC_PACKED12 instead
+#
+# Must match BLE/client/packets.py.
+#
+# Packetizer turns the sampler's full buffers into notification payloads: it keeps the
+# sequence number and the 32-bit tick, and the sample count that fits the current MTU.
+import struct
+import time
+
+try:
+    _ticks_diff = time.ticks_diff
+except AttributeError:      # CPython (simulation): ticks do not wrap
+    def _ticks_diff(a, b):
+        return a - b
+
+VERSION = 2
+ENC_RAW16 = 0
+ENC_PACKED12 = 1
+ENC_DELTA8 = 2
+HEADER_FMT = "<BBHHIH"
+HEADER_SIZE = 12
+FRAME = 5       # counts are multiples of this (the client logs 5-sample rows)
+LEGACY_FMT = "<10H"     # version 0: FRAME samples per channel, no header (20 bytes)
+DEFAULT_PAYLOAD = 20    # ATT MTU 23 - 3, before the central exchanges a larger MTU
+
+
+def body_size(encoding, count):
+    if encoding == ENC_RAW16:
+        return 4 * count
+    if encoding == ENC_PACKED12:
+        return 3 * count
+    return 2 * (count + 1)      # ENC_DELTA8
+
+
+def max_count(payload_size, encoding, limit=None):
+    """Largest multiple of FRAME samples per channel that fits in payload_size bytes."""
+    room = payload_size - HEADER_SIZE
+    # Budget delta packets for their packed-12 fallback
+    per = 4 if encoding == ENC_RAW16 else 3
+    count = room // per // FRAME * FRAME
+    if limit is not None and count > limit:
+        count = limit // FRAME * FRAME
+    return count
+
+
+def _pack12(buf, off, vals, n):
+    for i in range(0, n, 2):
+        v0 = vals[i]
+        v1 = vals[i + 1]
+        buf[off] = v0 & 0xFF
+        buf[off + 1] = (v0 >> 8) | ((v1 & 0xF) << 4)
+        buf[off + 2] = v1 >> 4
+        off += 3
+    return off
+
+
+def _delta8(buf, off, vals, start, count):
+    prev = vals[start]
+    struct.pack_into("<H", buf, off, prev)
+    off += 2
+    for i in range(start + 1, start + count):
+        v = vals[i]
+        d = v - prev
+        if d < -128 or d > 127:
+            return -1
+        buf[off] = d & 0xFF
+        prev = v
+        off += 1
+    return off
+
+
+def encode_into(buf, encoding, seq, tick, gap_us, vals, count):
+    """
+    Encodes one packet into buf. vals holds A3[count] followed by A4[count] (12-bit).
+    Returns (length, encoding actually used).
+    """
+    off = HEADER_SIZE
+    if encoding == ENC_DELTA8:
+        off = _delta8(buf, off, vals, 0, count)
+        if off >= 0:
+            off = _delta8(buf, off, vals, count, count)
+        if off < 0:
+            encoding = ENC_PACKED12
+            off = HEADER_SIZE
+    if encoding == ENC_PACKED12:
+        off = _pack12(buf, off, vals, 2 * count)
+    elif encoding == ENC_RAW16:
+        for i in range(2 * count):
+            struct.pack_into("<H", buf, off, vals[i])
+            off += 2
+    struct.pack_into(HEADER_FMT, buf, 0, VERSION, encoding, seq & 0xFFFF, count,
+                     tick & 0xFFFFFFFF, gap_us)
+    return off, encoding
+
+
+class Packetizer:
+    def __init__(self, encoding, gap_us, max_count, max_payload, payload=DEFAULT_PAYLOAD):
+        self.encoding = encoding
+        self.gap_us = gap_us
+        self.max_count = max_count
+        self.max_payload = max_payload
+        self._buf = bytearray(max_payload)
+        self._mv = memoryview(self._buf)
+        self.seq = 0
+        self._tick = 0              # 32-bit tick; ticks_us() wraps at 2**30 on ESP32
+        self._last_us = None
+        self.count = 0
+        self.set_payload(payload)
+
+    def set_payload(self, size):
+        """
+        Sizes packets for `size`-byte notifications. count stays 0 while no version 2
+        packet fits (before the MTU exchange); packets are legacy ones until then.
+        """
+        self.count = max_count(min(size, self.max_payload), self.encoding, self.max_count)
+        return self.count
+
+    @property
+    def samples_per_packet(self):
+        return self.count or FRAME
+
+    def pack(self, vals, count, first_us):
+        """One payload for `count` samples per channel taken from first_us on (ticks_us)."""
+        if self._last_us is not None:
+            self._tick = (self._tick + _ticks_diff(first_us, self._last_us)) & 0xFFFFFFFF
+        self._last_us = first_us
+        if self.count and count <= self.count:
+            n, _ = encode_into(self._buf, self.encoding, self.seq, self._tick, self.gap_us, vals, count)
+        else:
+            # Legacy packet, also for a buffer filled before the payload shrank (only its
+            # first FRAME samples per channel fit)
+            struct.pack_into(LEGACY_FMT, self._buf, 0, *(list(vals[:FRAME]) + list(vals[count:count + FRAME])))
+            n = 20
+        self.seq = (self.seq + 1) & 0xFFFF
+        return self._mv[:n]
@@ -0,0 +1,113 @@
+# sampler.py — timer-driven, double-buffered ADC sampler (MicroPython; runs under CPython
+# for BLE/server/simulate.py)
+#
+# A hardware timer calls sample() at `rate_hz`. Each call reads both channels into the
+# buffer being filled (A3[count] then A4[count], as packet.encode_into wants them) and,
+# once it holds `count` samples per channel, hands it over and starts filling the other
+# one. The send loop picks full buffers up with take()/release() at its own pace, so
+# BLE stalls no longer disturb the sample spacing. If the send loop still holds the
+# other buffer when a fill completes, that fill is dropped and counted in `overruns`
+# (the client sees it as a jump in the packet ticks).
+#
+# On the ESP32 timer callbacks are scheduled (soft) IRQs; sample() allocates nothing so
+# it stays cheap, but rates much above a few kHz leave little time for the send loop.
+import time
+from array import array
+
+try:
+    _ticks_us = time.ticks_us
+except AttributeError:      # CPython (simulation): monotonic microseconds
+    def _ticks_us():
+        return time.perf_counter_ns() // 1000
+
+MIN_RATE_HZ = 500
+MAX_RATE_HZ = 10000
+
+
+class Sampler:
+    def __init__(self, read_a, read_b, max_count, count=None, ticks_us=_ticks_us):
+        """
+        read_a/read_b: callables returning one 12-bit sample of each channel.
+        max_count: largest samples-per-channel per buffer (sizes the buffers).
+        """
+        self._read_a = read_a
+        self._read_b = read_b
+        self._ticks_us = ticks_us
+        self.max_count = max_count
+        self._bufs = (array("H", bytes(4 * max_count)), array("H", bytes(4 * max_count)))
+        self._ticks = [0, 0]            # ticks_us() of each buffer's first sample
+        self._counts = [0, 0]
+        self._fill = 0                  # buffer being filled
+        self._idx = 0
+        self._ready = -1                # buffer waiting for the send loop, -1: none
+        self._held = -1                 # buffer the send loop is working on
+        self._next_count = count or max_count
+        self._count = self._next_count
+        self.overruns = 0
+        self.samples = 0
+        self.rate_hz = 0
+        self._timer = None
+
+    def set_count(self, count):
+        """Samples per channel per buffer from the next fill on (e.g. after an MTU change)."""
+        self._next_count = min(count, self.max_count)
+
+    def sample(self, _timer=None):
+        """Timer IRQ handler: one sample of each channel."""
+        i = self._idx
+        buf = self._bufs[self._fill]
+        if i == 0:
+            self._ticks[self._fill] = self._ticks_us()
+            self._count = self._next_count
+        count = self._count
+        buf[i] = self._read_a()
+        buf[count + i] = self._read_b()
+        self.samples += 1
+        i += 1
+        if i < count:
+            self._idx = i
+            return
+        self._idx = 0
+        full = self._fill
+        other = 1 - full
+        if other == self._held or other == self._ready:
+            # The send loop has not given the other buffer back: refill this one
+            self.overruns += 1
+            return
+        self._counts[full] = count
+        self._ready = full
+        self._fill = other
+
+    def take(self):
+        """Send loop: (buffer, count, first-sample ticks_us) of a full buffer, or None."""
+        ready = self._ready
+        if ready < 0:
+            return None
+        self._held = ready
+        self._ready = -1
+        return self._bufs[ready], self._counts[ready], self._ticks[ready]
+
+    def release(self):
+        """Send loop: done with the buffer from take()."""
+        self._held = -1
+
+    def start(self, rate_hz, timer_id=0):
+        import machine
+        if not MIN_RATE_HZ <= rate_hz <= MAX_RATE_HZ:
+            raise ValueError("rate_hz must be between %d and %d" % (MIN_RATE_HZ, MAX_RATE_HZ))
+        self.rate_hz = rate_hz
+        # Samples from before a restart were taken at the old rate: don't hand them out
+        # as if they were at this one
+        self._idx = 0
+        self._ready = -1
+        self._timer = machine.Timer(timer_id)
+        self._timer.init(mode=machine.Timer.PERIODIC, freq=rate_hz, callback=self.sample)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    @property
+    def gap_us(self):
+        return 1000000 // self.rate_hz if self.rate_hz else 0
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# simulate.py — host-side simulation of the firmware's sampler -> packetizer -> client path
+#
+#   python -m BLE.server.simulate --rate 2000 --seconds 10 --encoding delta8 --mtu 247
+#
+# Runs the real Sampler (sampler.py) and Packetizer (packet.py) on a simulated clock: a
+# jittery timer calls Sampler.sample() at --rate, and a simulated send loop takes full
+# buffers, packs them and then stays busy for a random send time (connection interval,
+# plus occasional radio stalls). The payloads go through the client's decoder
+# (BLE/client/packets.py) and are checked against what the fake ADC produced: every
+# sample value, its reconstructed timestamp, dropped buffers and the radio throughput.
+import argparse
+import numpy as np
+from BLE.server.sampler import Sampler
+from BLE.server.packet import Packetizer, ENC_RAW16, ENC_PACKED12, ENC_DELTA8
+from BLE.client.packets import decode_batch, MAX_PAYLOAD, N_SAMPLES
+
+ENCODINGS = {"raw16": ENC_RAW16, "packed12": ENC_PACKED12, "delta8": ENC_DELTA8}
+
+
+class SimClock:
+    def __init__(self):
+        self.now_us = 0
+
+    def ticks_us(self):
+        return self.now_us
+
+
+def fake_adc(rng, freq_hz, noise, clock):
+    """A 12-bit sine at freq_hz plus noise; records (time, value) of every read."""
+    log = []
+
+    def read():
+        t = clock.now_us * 1e-6
+        v = int(np.clip(2048 + 1500 * np.sin(2 * np.pi * freq_hz * t) + rng.normal(0, noise), 0, 4095))
+        log.append((clock.now_us, v))
+        return v
+    return read, log
+
+
+def simulate(rate_hz=1000, seconds=5.0, encoding="delta8", mtu=247, max_count=50,
+             jitter_us=5.0, conn_interval_ms=7.5, stall_prob=0.01, stall_ms=60.0,
+             noise=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    clock = SimClock()
+    read_a, log_a = fake_adc(rng, 3.0, noise, clock)
+    read_b, _ = fake_adc(rng, 7.0, noise, clock)
+    gap_us = 1000000 // rate_hz
+    sampler = Sampler(read_a, read_b, max_count, ticks_us=clock.ticks_us)
+    packetizer = Packetizer(ENCODINGS[encoding], gap_us, max_count, MAX_PAYLOAD)
+    packetizer.set_payload(mtu - 3)
+    sampler.set_count(packetizer.samples_per_packet)
+
+    payloads = []
+    first_sample_us = []
+    busy_until = 0.0
+    holding = False
+    n_ticks = int(seconds * rate_hz)
+    timer_us = np.arange(n_ticks) * (1e6 / rate_hz) + rng.normal(0, jitter_us, n_ticks)
+    for t in timer_us:
+        # The send loop runs until this timer tick
+        while True:
+            if holding and busy_until <= t:
+                sampler.release()
+                holding = False
+            if holding:
+                break
+            clock.now_us = int(max(busy_until, clock.now_us))
+            item = sampler.take()
+            if item is None:
+                break
+            vals, count, first_us = item
+            payloads.append(bytes(packetizer.pack(vals, count, first_us)))
+            first_sample_us.append(first_us)
+            send_ms = conn_interval_ms * rng.uniform(0.5, 1.5)
+            if rng.random() < stall_prob:
+                send_ms += stall_ms
+            busy_until = max(busy_until, clock.now_us) + send_ms * 1000
+            holding = True
+        clock.now_us = int(t)
+        sampler.sample()
+
+    # --- Client side ---
+    lengths = np.array([len(p) for p in payloads], dtype=np.int32)
+    block = np.zeros((len(payloads), MAX_PAYLOAD), dtype=np.uint8)
+    for i, p in enumerate(payloads):
+        block[i, :len(p)] = np.frombuffer(p, dtype=np.uint8)
+    good, packets, frames = decode_batch(block, lengths)
+
+    # Rebuild every sample's time from the packet ticks, as the client does
+    p = frames["packet"]
+    offsets = frames["first_sample"][:, None] + np.arange(N_SAMPLES)
+    est_us = (first_sample_us[0] + (packets["tick"] - packets["tick"][0])[p, None]
+              + offsets * gap_us).ravel()
+    values = frames["a0"].ravel()
+
+    # Ground truth: the read nearest to each reconstructed time
+    read_t = np.array([t for t, _ in log_a], dtype=np.float64)
+    read_v = np.array([v for _, v in log_a])
+    idx = np.clip(np.searchsorted(read_t, est_us), 1, len(read_t) - 1)
+    idx -= (est_us - read_t[idx - 1]) < (read_t[idx] - est_us)
+    timing_err = est_us - read_t[idx]
+
+    bytes_sent = int(lengths.sum())
+    stats = {
+        "packets": len(payloads),
+        "bad_packets": int((~good).sum()),
+        "samples_read": sampler.samples,
+        "samples_sent": int(len(values)),
+        "overruns": sampler.overruns,
+        "samples_per_packet": int(packets["count"].max()) if len(payloads) else 0,
+        "bytes_per_sample": bytes_sent / max(1, 2 * len(values)),
+        "radio_bytes_per_s": bytes_sent / seconds,
+        "values_match": float(np.mean(read_v[idx] == values)) if len(values) else 0.0,
+        "timing_err_us_max": float(np.abs(timing_err).max()) if len(timing_err) else 0.0,
+        "timing_err_us_rms": float(np.sqrt(np.mean(timing_err ** 2))) if len(timing_err) else 0.0,
+    }
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the timer sampler and packetizer on the host.")
+    parser.add_argument("--rate", type=int, default=1000, help="samples per second per channel")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--encoding", choices=ENCODINGS, default="delta8")
+    parser.add_argument("--mtu", type=int, default=247)
+    parser.add_argument("--max-count", type=int, default=50, help="samples per channel per packet at most")
+    parser.add_argument("--jitter-us", type=float, default=5.0, help="timer IRQ jitter (std dev)")
+    parser.add_argument("--conn-interval-ms", type=float, default=7.5)
+    parser.add_argument("--stall-prob", type=float, default=0.01, help="chance a send stalls")
+    parser.add_argument("--stall-ms", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    stats = simulate(args.rate, args.seconds, args.encoding, args.mtu, args.max_count, args.jitter_us,
+                     args.conn_interval_ms, args.stall_prob, args.stall_ms, seed=args.seed)
+    for key, value in stats.items():
+        print(f"{key:>20}: {value:.3f}" if isinstance(value, float) else f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
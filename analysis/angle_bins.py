@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# angle_bins.py — charge versus disk angle: a0/a1 binned by angle for every revolution
+#
+#   python -m analysis.angle_bins "/media/ben/Extreme SSD/disk_experiment/2025-08-14_10_33" --bins 72
+#
+# AngleBins keeps, for each (revolution, angle bin) cell and each channel, the sample
+# count and the running mean and sum of squared deviations, so mean and variance are
+# always current without keeping the samples. Samples arrive in batches; each batch is
+# reduced per cell (bincount) and merged into the running values with the parallel
+# form of Welford's update (Chan et al.):
+#
+#   n = na + nb,  delta = mean_b - mean_a
+#   mean = mean_a + delta * nb / n,  M2 = M2_a + M2_b + delta**2 * na * nb / n
+#
+# The same object is fed live by the BLE consumer (ble_plotter.DeviceSession, from the
+# estimated angle and tracked_revs) and offline from a recorded session's sample log
+# and index pulses (from_session). mean[channel] is a (revs, bins) array, NaN where a
+# cell has no samples yet, that the GUI heatmap shows as is.
+import argparse
+import os
+import time
+import numpy as np
+
+ANGLE_BINS = 72         # 5 degree bins
+CHANNELS = ("a0", "a1")
+
+
+class AngleBins:
+    def __init__(self, bins=ANGLE_BINS, channels=CHANNELS, rev_capacity=256):
+        self.bins = bins
+        self.bin_width = 360.0 / bins
+        self.channels = tuple(channels)
+        self.count = np.zeros((rev_capacity, bins), dtype=np.int64)
+        self.mean = {c: np.full((rev_capacity, bins), np.nan) for c in self.channels}
+        self.m2 = {c: np.zeros((rev_capacity, bins)) for c in self.channels}
+        self.n_revs = 0         # highest revolution seen + 1
+        self.samples = 0
+
+    def _ensure(self, revs):
+        capacity = len(self.count)
+        if revs <= capacity:
+            return
+        while capacity < revs:
+            capacity *= 2
+        grow = capacity - len(self.count)
+        self.count = np.concatenate([self.count, np.zeros((grow, self.bins), dtype=np.int64)])
+        for c in self.channels:
+            self.mean[c] = np.concatenate([self.mean[c], np.full((grow, self.bins), np.nan)])
+            self.m2[c] = np.concatenate([self.m2[c], np.zeros((grow, self.bins))])
+
+    def bin_of(self, angles):
+        b = (np.asarray(angles, dtype=np.float64) % 360.0 / self.bin_width).astype(np.int64)
+        return np.minimum(b, self.bins - 1)
+
+    @property
+    def bin_centers(self):
+        return (np.arange(self.bins) + 0.5) * self.bin_width
+
+    def add(self, revs, angles, *values):
+        """
+        Adds a batch of samples: revs, angles (degrees) and one array per channel, all
+        the same length. Samples with a negative rev or a non-finite angle are skipped.
+        """
+        revs = np.asarray(revs, dtype=np.int64).ravel()
+        angles = np.asarray(angles, dtype=np.float64).ravel()
+        ok = (revs >= 0) & np.isfinite(angles)
+        if not ok.any():
+            return
+        revs = revs[ok]
+        self._ensure(int(revs.max()) + 1)
+        cells, inv = np.unique(revs * self.bins + self.bin_of(angles[ok]), return_inverse=True)
+        nb = np.bincount(inv).astype(np.float64)
+        count = self.count.reshape(-1)
+        na = count[cells].astype(np.float64)
+        n = na + nb
+        seen = na > 0
+        for c, x in zip(self.channels, values):
+            x = np.asarray(x, dtype=np.float64).ravel()[ok]
+            mean_b = np.bincount(inv, weights=x) / nb
+            m2_b = np.bincount(inv, weights=(x - mean_b[inv]) ** 2)
+            mean = self.mean[c].reshape(-1)
+            m2 = self.m2[c].reshape(-1)
+            mean_a = mean[cells]
+            delta = np.where(seen, mean_b - mean_a, 0.0)
+            mean[cells] = np.where(seen, mean_a + delta * nb / n, mean_b)
+            m2[cells] += m2_b + delta ** 2 * na * nb / n
+        count[cells] = n.astype(np.int64)
+        self.n_revs = max(self.n_revs, int(revs.max()) + 1)
+        self.samples += len(revs)
+
+    def mean_array(self, channel):
+        """(n_revs, bins) running means, NaN for empty cells. A view: no copy, no recomputation."""
+        return self.mean[channel][:self.n_revs]
+
+    def counts(self):
+        return self.count[:self.n_revs]
+
+    def variance(self, channel, ddof=1):
+        """(n_revs, bins) variance, NaN where a cell has ddof samples or fewer."""
+        n = self.counts()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > ddof, self.m2[channel][:self.n_revs] / (n - ddof), np.nan)
+
+    def std(self, channel, ddof=1):
+        return np.sqrt(self.variance(channel, ddof))
+
+    def profile(self, channel, revs=None, ddof=1):
+        """
+        (mean, std, count) per angle bin pooled over revolutions (all, or revs=(first, last)
+        inclusive): the same merge, across rows.
+        """
+        lo, hi = (0, self.n_revs) if revs is None else (revs[0], min(revs[1] + 1, self.n_revs))
+        n = self.count[lo:hi]
+        mean = np.nan_to_num(self.mean[channel][lo:hi])
+        total = n.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pooled = (n * mean).sum(axis=0) / total
+            m2 = (self.m2[channel][lo:hi] + n * (mean - pooled) ** 2).sum(axis=0)
+            std = np.sqrt(np.where(total > ddof, m2 / (total - ddof), np.nan))
+        return np.where(total > 0, pooled, np.nan), std, total
+
+    def save(self, path):
+        arrays = {"count": self.counts(), "bins": np.array(self.bins), "samples": np.array(self.samples),
+                  "channels": np.array(self.channels)}
+        for c in self.channels:
+            arrays[f"mean_{c}"] = self.mean_array(c)
+            arrays[f"m2_{c}"] = self.m2[c][:self.n_revs]
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            channels = tuple(data["channels"].tolist())
+            count = data["count"]
+            out = cls(int(data["bins"]), channels, rev_capacity=max(1, len(count)))
+            out.count[:len(count)] = count
+            for c in channels:
+                out.mean[c][:len(count)] = data[f"mean_{c}"]
+                out.m2[c][:len(count)] = data[f"m2_{c}"]
+            out.n_revs = len(count)
+            out.samples = int(data["samples"])
+        return out
+
+    @classmethod
+    def from_session(cls, session_dir, bins=ANGLE_BINS, log_path=None, chunk=200_000):
+        """Bins a recorded session: sample times from its log, revs/angles from its index pulses."""
+        from analysis.archive import log_blocks, log_origin
+        from analysis.session_index import find_sample_log, record_times, SAMPLES_PER_ROW
+        from location.angle_estimator import angles_at, load_index_pulses
+        out = cls(bins)
+        log_path = log_path or find_sample_log(session_dir)
+        if log_path is None:
+            return out
+        pulses = load_index_pulses(session_dir)
+        origin = log_origin(log_path)     # same origin as the archive
+        for block in log_blocks(log_path, chunk):
+            names = block.dtype.names
+            nan = np.full(len(block), np.nan)
+            t0, dt = record_times(block["epoch_s"], block["sample_t0_s"] if "sample_t0_s" in names else nan,
+                                  block["sample_dt_s"] if "sample_dt_s" in names else nan)
+            times = (t0[:, None] + np.arange(SAMPLES_PER_ROW) * dt[:, None]).ravel()
+            angles, revs = angles_at(times, pulses, origin=origin)
+            out.add(revs, angles, block["a0"].ravel(), block["a1"].ravel())
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bin a session's a0/a1 by disk angle for every revolution.")
+    parser.add_argument("session_dir")
+    parser.add_argument("--bins", type=int, default=ANGLE_BINS)
+    parser.add_argument("--out", default=None, help="output .npz (default: angle_bins.npz in the session)")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    result = AngleBins.from_session(args.session_dir, args.bins)
+    out = args.out or os.path.join(args.session_dir, "angle_bins.npz")
+    result.save(out)
+    print(f"[angle_bins] {result.samples} samples over {result.n_revs} revs x {result.bins} bins in "
+          f"{time.perf_counter() - t0:.1f}s -> {out}")
+    for c in result.channels:
+        mean, std, _ = result.profile(c)
+        peak = int(np.nanargmax(mean)) if np.isfinite(mean).any() else 0
+        print(f"  {c}: peak mean {mean[peak]:.1f} (std {std[peak]:.1f}) at {result.bin_centers[peak]:.1f} deg")
+
+
+if __name__ == "__main__":
+    main()
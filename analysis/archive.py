@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# archive.py — columnar (Parquet) archive of a finished session, partitioned by revolution
+#
+#   python -m analysis.archive "/media/ben/Extreme SSD/disk_experiment/2025-08-14_10_33"
+#   python -m analysis.archive SESSION --query a0 --angle 90 100 --revs 10 50
+#
+# Converts the session's BLE sample log and frame listing into two Parquet datasets
+# under <session>/archive/:
+#   samples/  one row per sample: rev, time, angle, a0, a1, log row and position,
+#             seq, blob_angle, blob_area (the tracker's values logged with the row)
+#             and frame (number of the nearest saved frame, -1 if none within
+#             session_index.MAX_FRAME_DT)
+#   frames/   one row per saved frame: rev, frame, epoch, angle, name
+# Revolution and disk angle come from the session's index pulses (index_pulses.csv,
+# location/angle_estimator.angles_at), so rev matches tracked_revs. Both datasets are
+# hive-partitioned on rev_group = rev // --revs-per-partition and written in time
+# order, so a query on rev and angle only opens the partitions it needs and skips
+# row groups by their statistics instead of parsing the whole CSV.
+#
+# The log is converted in blocks of --chunk rows and only the frame listing is held
+# whole (a frames-only SessionIndex, no per-row time index), so memory use grows with
+# the number of frames, not with the log. Needs pyarrow (pip install pyarrow); the rest
+# of the tree does not.
+import argparse
+import csv
+import os
+import shutil
+import time
+import numpy as np
+from analysis.session_index import SessionIndex, find_sample_log, record_times, SAMPLES_PER_ROW
+from location.angle_estimator import angles_at, load_index_pulses
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:     # optional: only this module needs it
+    pa = None
+
+ARCHIVE_DIR = "archive"
+REVS_PER_PARTITION = 10
+CHUNK_ROWS = 200_000    # log rows per block (x5 samples)
+ROW_GROUP = 1 << 16
+COMPRESSION = "zstd"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("analysis.archive needs pyarrow (pip install pyarrow)")
+
+
+def samples_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("rev", pa.int32()),
+        ("rev_group", pa.int32()),
+        ("time", pa.float64()),
+        ("angle", pa.float32()),
+        ("a0", pa.uint16()),
+        ("a1", pa.uint16()),
+        ("row", pa.int64()),
+        ("sample", pa.uint8()),
+        ("seq", pa.int32()),
+        ("blob_angle", pa.float32()),
+        ("blob_area", pa.float32()),
+        ("frame", pa.int32()),
+    ])
+
+
+def frames_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("rev", pa.int32()),
+        ("rev_group", pa.int32()),
+        ("frame", pa.int32()),
+        ("epoch", pa.float64()),
+        ("angle", pa.float32()),
+        ("name", pa.string()),
+    ])
+
+
+def _csv_blocks(path, chunk):
+    """A ble_samples.csv as blocks of sample_log.RECORD_DTYPE records."""
+    from BLE.client.sample_log import RECORD_DTYPE
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        col = {name: i for i, name in enumerate(next(reader, []))}
+
+        def value(row, name, default=np.nan):
+            i = col.get(name)
+            return float(row[i]) if i is not None and i < len(row) and row[i] else default
+
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) < chunk:
+                continue
+            yield _records(rows, value, RECORD_DTYPE)
+            rows = []
+        if rows:
+            yield _records(rows, value, RECORD_DTYPE)
+
+
+def _records(rows, value, dtype):
+    block = np.zeros(len(rows), dtype=dtype)
+    for i, row in enumerate(rows):
+        block["epoch_s"][i] = value(row, "epoch_s")
+        block["a0"][i] = [value(row, f"a0_{k}", 0) for k in range(SAMPLES_PER_ROW)]
+        block["a1"][i] = [value(row, f"a1_{k}", 0) for k in range(SAMPLES_PER_ROW)]
+        block["angle_of_particles"][i] = value(row, "angle_of_particles")
+        block["area_of_particles"][i] = value(row, "area_of_particles")
+        block["seq"][i] = value(row, "seq", -1)
+        block["sample_t0_s"][i] = value(row, "sample_t0_s")
+        block["sample_dt_s"][i] = value(row, "sample_dt_s")
+    return block
+
+
+def log_blocks(path, chunk=CHUNK_ROWS):
+    """The sample log (binary or CSV) in blocks of structured records."""
+    if path.endswith(".bin"):
+        from BLE.client.sample_log import read_sample_log
+        data = read_sample_log(path, mmap=True)
+        for start in range(0, len(data), chunk):
+            yield np.array(data[start:start + chunk])
+    else:
+        yield from _csv_blocks(path, chunk)
+
+
+def log_origin(log_path):
+    """Time of the log's first sample (reads only its first row); None for an empty or missing log.
+
+    Without index pulses, angles count from here (as the live estimator does).
+    """
+    if log_path is None:
+        return None
+    for block in log_blocks(log_path, 1):
+        names = block.dtype.names
+        t0, _ = record_times(block["epoch_s"], block["sample_t0_s"] if "sample_t0_s" in names else [np.nan],
+                             block["sample_dt_s"] if "sample_dt_s" in names else [np.nan])
+        return float(t0[0])
+    return None
+
+
+def _sample_batches(log_path, pulses, session_index, origin, revs_per_partition, chunk):
+    """RecordBatches of the samples table, one per log block."""
+    schema = samples_schema()
+    row0 = 0
+    for block in log_blocks(log_path, chunk):
+        n = len(block)
+        names = block.dtype.names
+        nan = np.full(n, np.nan)
+        t0, dt = record_times(block["epoch_s"], block["sample_t0_s"] if "sample_t0_s" in names else nan,
+                              block["sample_dt_s"] if "sample_dt_s" in names else nan)
+        pos = np.tile(np.arange(SAMPLES_PER_ROW, dtype=np.uint8), n)
+        times = np.repeat(t0, SAMPLES_PER_ROW) + pos * np.repeat(dt, SAMPLES_PER_ROW)
+        angles, revs = angles_at(times, pulses, origin=origin)
+        frame_pos = session_index.frames_for_times(times)
+        frames = np.where(frame_pos >= 0, session_index.frame_numbers[np.maximum(frame_pos, 0)], -1) \
+            if len(session_index) else np.full(len(times), -1)
+        seq = block["seq"] if "seq" in names else np.full(n, -1, dtype=np.int32)
+        columns = {
+            "rev": revs.astype(np.int32),
+            "rev_group": (revs // revs_per_partition).astype(np.int32),
+            "time": times,
+            "angle": angles.astype(np.float32),
+            "a0": block["a0"].reshape(-1),
+            "a1": block["a1"].reshape(-1),
+            "row": np.repeat(np.arange(row0, row0 + n, dtype=np.int64), SAMPLES_PER_ROW),
+            "sample": pos,
+            "seq": np.repeat(seq, SAMPLES_PER_ROW).astype(np.int32),
+            "blob_angle": np.repeat(block["angle_of_particles"], SAMPLES_PER_ROW).astype(np.float32),
+            "blob_area": np.repeat(block["area_of_particles"], SAMPLES_PER_ROW).astype(np.float32),
+            "frame": frames.astype(np.int32),
+        }
+        row0 += n
+        yield pa.RecordBatch.from_arrays([pa.array(columns[f.name], type=f.type) for f in schema],
+                                         schema=schema)
+
+
+def _frames_table(session_index, pulses, origin, revs_per_partition):
+    epochs = session_index.frame_epochs
+    angles, revs = angles_at(epochs, pulses, origin=origin)
+    schema = frames_schema()
+    columns = {
+        "rev": revs.astype(np.int32),
+        "rev_group": (revs // revs_per_partition).astype(np.int32),
+        "frame": session_index.frame_numbers.astype(np.int32),
+        "epoch": epochs,
+        "angle": angles.astype(np.float32),
+        "name": session_index.frame_names.tolist(),
+    }
+    return pa.Table.from_arrays([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+
+
+def _write(data, path, schema, compression):
+    shutil.rmtree(path, ignore_errors=True)
+    fmt = ds.ParquetFileFormat()
+    ds.write_dataset(data, path, schema=schema, format="parquet",
+                     partitioning=ds.partitioning(pa.schema([("rev_group", pa.int32())]), flavor="hive"),
+                     file_options=fmt.make_write_options(compression=compression),
+                     min_rows_per_group=ROW_GROUP // 4, max_rows_per_group=ROW_GROUP,
+                     existing_data_behavior="overwrite_or_ignore")
+
+
+def build_archive(session_dir, revs_per_partition=REVS_PER_PARTITION, compression=COMPRESSION,
+                  chunk=CHUNK_ROWS, log_path=None):
+    """Writes <session>/archive/{samples,frames}; returns (samples, frames) written."""
+    _require_pyarrow()
+    log_path = log_path or find_sample_log(session_dir)
+    session_index = SessionIndex.build(session_dir, records=False)
+    pulses = load_index_pulses(session_dir)
+    origin = log_origin(log_path)
+    root = os.path.join(session_dir, ARCHIVE_DIR)
+    os.makedirs(root, exist_ok=True)
+
+    samples = 0
+    if log_path is not None:
+        def counted(batches):
+            nonlocal samples
+            for batch in batches:
+                samples += batch.num_rows
+                yield batch
+        _write(counted(_sample_batches(log_path, pulses, session_index, origin, revs_per_partition, chunk)),
+               os.path.join(root, "samples"), samples_schema(), compression)
+    _write(_frames_table(session_index, pulses, origin, revs_per_partition),
+           os.path.join(root, "frames"), frames_schema(), compression)
+    return samples, len(session_index)
+
+
+def open_archive(session_dir, table="samples"):
+    """The archived table as a pyarrow Dataset (rev_group read back from the directory names)."""
+    _require_pyarrow()
+    # With the schema given, no file is opened until a scan reaches its partition
+    schema = samples_schema() if table == "samples" else frames_schema()
+    return ds.dataset(os.path.join(session_dir, ARCHIVE_DIR, table), schema=schema, format="parquet",
+                      partitioning=ds.partitioning(pa.schema([("rev_group", pa.int32())]), flavor="hive"))
+
+
+def angle_filter(lo, hi):
+    """angle in [lo, hi) degrees; wraps through 0 when lo > hi (e.g. 350 to 10)."""
+    field = ds.field("angle")
+    if lo <= hi:
+        return (field >= lo) & (field < hi)
+    return (field >= lo) | (field < hi)
+
+
+def query(session_dir, columns=("a0",), angle=None, revs=None, table="samples",
+          revs_per_partition=REVS_PER_PARTITION):
+    """
+    Rows of an archived table as a pyarrow Table, e.g. query(dir, ("a0",), (90, 100), (10, 50))
+    for a0 between 90° and 100° over revs 10–50 (inclusive). The filters are pushed down
+    to the Parquet scan: partitions outside the revs are never opened, row groups
+    whose statistics rule them out are skipped.
+    """
+    dataset = open_archive(session_dir, table)
+    condition = None
+    if revs is not None:
+        first, last = revs
+        condition = ((ds.field("rev_group") >= first // revs_per_partition)
+                     & (ds.field("rev_group") <= last // revs_per_partition)
+                     & (ds.field("rev") >= first) & (ds.field("rev") <= last))
+    if angle is not None:
+        condition = angle_filter(*angle) if condition is None else condition & angle_filter(*angle)
+    return dataset.to_table(columns=list(columns), filter=condition)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive a session as Parquet partitioned by revolution, or query it.")
+    parser.add_argument("session_dir")
+    parser.add_argument("--revs-per-partition", type=int, default=REVS_PER_PARTITION)
+    parser.add_argument("--compression", default=COMPRESSION, help="zstd, snappy, gzip, none")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="log rows converted at a time")
+    parser.add_argument("--query", nargs="+", default=None, metavar="COLUMN",
+                        help="query the existing archive for these columns instead of building it")
+    parser.add_argument("--table", choices=("samples", "frames"), default="samples")
+    parser.add_argument("--angle", type=float, nargs=2, default=None, metavar=("FROM", "TO"))
+    parser.add_argument("--revs", type=int, nargs=2, default=None, metavar=("FIRST", "LAST"))
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    if args.query:
+        result = query(args.session_dir, args.query, args.angle, args.revs, args.table, args.revs_per_partition)
+        print(f"[archive] {result.num_rows} rows in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        for name in args.query:
+            column = result.column(name)
+            if result.num_rows and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+                print(f"  {name}: mean {pc.mean(column).as_py()}, min {pc.min(column).as_py()}, "
+                      f"max {pc.max(column).as_py()}")
+        return
+    samples, frames = build_archive(args.session_dir, args.revs_per_partition, args.compression, args.chunk)
+    print(f"[archive] {samples} samples, {frames} frames in {time.perf_counter() - t0:.1f}s -> "
+          f"{os.path.join(args.session_dir, ARCHIVE_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# blob_batch.py — offline re-run of the blob tracker over a recorded session
+#
+#   python -m analysis.blob_batch "/media/ben/Extreme SSD/disk_experiment/2025-08-14_10_33" --threshold 140
+#
+# Re-runs threshold -> contour -> fitEllipse (the same code the live tracker uses, from
+# camera/blob_tracking.py) over every saved frame of a session, in batches spread over
+# all cores with a process pool, and writes a columnar table with one row per frame:
+#   frame, epoch, area, angle, angle_smoothed, center_x, center_y, major, minor, eccentricity
+# (NaN where no blob/ellipse was found). angle_smoothed applies the live tracker's angle
+# filter (camera/angle_smoothing.py) over the whole session. Frames are read from
+# images/*.jpg or, for sessions recorded with the 'video' save backend, from video/ via
+# its index.
+# The ROI comes from the session's roi.json unless --roi is given.
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from camera.blob_tracking import THRESHOLD, make_tracking_buffers, analyse_gray
+from camera.encoder_pool import parse_frame_filename
+from camera.angle_smoothing import FILTERS, smooth_angles
+
+COLUMNS = ("frame", "epoch", "area", "angle", "angle_smoothed", "center_x", "center_y",
+           "major", "minor", "eccentricity")
+# Filled per frame by the workers; frame/epoch come from the listing, angle_smoothed
+# is computed over the whole session afterwards.
+FRAME_COLUMNS = ("area", "angle", "center_x", "center_y", "major", "minor", "eccentricity")
+
+
+def list_session_frames(session_dir):
+    """
+    Returns (source, items, frames, epochs): source is 'video' or 'images', items are
+    what the workers load (index positions or file paths), in capture order.
+    """
+    video_dir = os.path.join(session_dir, "video")
+    if os.path.exists(os.path.join(video_dir, "index.bin")):
+        from camera.video_sink import read_index
+        index = read_index(video_dir)
+        order = np.argsort(index["frame"], kind="stable")
+        return "video", order.tolist(), index["frame"][order].astype(np.int64), index["epoch"][order]
+
+    parsed = []
+    for path in glob.glob(os.path.join(session_dir, "images", "frame_*.jpg")):
+        info = parse_frame_filename(os.path.basename(path))
+        if info is not None:
+            parsed.append((info[0], info[1], path))
+    parsed.sort()
+    frames = np.array([p[0] for p in parsed], dtype=np.int64)
+    epochs = np.array([p[1] for p in parsed], dtype=np.float64)
+    return "images", [p[2] for p in parsed], frames, epochs
+
+
+def load_roi(session_dir):
+    """(roi, frames_are_roi) from the session's roi.json, or (None, True) if there isn't one."""
+    path = os.path.join(session_dir, "roi.json")
+    if not os.path.exists(path):
+        return None, True
+    with open(path) as f:
+        info = json.load(f)
+    return tuple(info["roi"]), info.get("frames_are_roi", False)
+
+
+def _analyse_batch(source, session_dir, items, roi, threshold):
+    """Worker: analyses one batch of frames and returns its columns (without frame/epoch)."""
+    n = len(items)
+    out = {name: np.full(n, np.nan) for name in FRAME_COLUMNS}
+    reader = None
+    if source == "video":
+        from camera.video_sink import SegmentReader
+        reader = SegmentReader(os.path.join(session_dir, "video"))
+    bufs = None
+    for i, item in enumerate(items):
+        if reader is not None:
+            gray = reader.read_frame(item, cv2.IMREAD_GRAYSCALE)
+        else:
+            gray = cv2.imread(item, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            continue
+        if roi is not None:
+            x, y, w, h = roi
+            gray = gray[y:y + h, x:x + w]
+        if bufs is None or bufs["shape"] != gray.shape:
+            bufs = make_tracking_buffers(*gray.shape)
+        area, ellipse = analyse_gray(gray, bufs, threshold)
+        if area is not None:
+            out["area"][i] = area
+        if ellipse is not None:
+            (cx, cy), (d1, d2), angle = ellipse
+            major, minor = max(d1, d2), min(d1, d2)
+            out["angle"][i] = angle
+            out["center_x"][i], out["center_y"][i] = cx, cy
+            out["major"][i], out["minor"][i] = major, minor
+            out["eccentricity"][i] = np.sqrt(1.0 - (minor / major) ** 2)
+    if reader is not None:
+        reader.close()
+    return out
+
+
+def analyse_session(session_dir, threshold=THRESHOLD, roi=None, workers=None, batch_size=256,
+                    angle_filter="moving_average", filter_params=None):
+    """Runs the tracker over a whole session; returns {column: ndarray} in capture order."""
+    source, items, frames, epochs = list_session_frames(session_dir)
+    if roi is None:
+        roi, frames_are_roi = load_roi(session_dir)
+        if frames_are_roi:
+            roi = None
+    table = {"frame": frames, "epoch": epochs}
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_analyse_batch, [source] * len(batches), [session_dir] * len(batches),
+                                batches, [roi] * len(batches), [threshold] * len(batches)))
+    for name in FRAME_COLUMNS:
+        table[name] = np.concatenate([r[name] for r in results]) if results else np.empty(0)
+    table["angle_smoothed"] = smooth_angles(table["angle"], angle_filter, timestamps=epochs,
+                                            **(filter_params or {}))
+    return table
+
+
+def save_table(table, path):
+    """Writes the table as .npz (columnar) or, for a .csv path, as CSV."""
+    if path.endswith(".csv"):
+        data = np.column_stack([table[c] for c in COLUMNS])
+        np.savetxt(path, data, delimiter=",", header=",".join(COLUMNS), comments="",
+                   fmt=["%d", "%.6f"] + ["%.4f"] * (len(COLUMNS) - 2))
+    else:
+        np.savez_compressed(path, **table)
+
+
+def load_table(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run blob/ellipse tracking over a recorded session.")
+    parser.add_argument("session_dir")
+    parser.add_argument("--threshold", type=int, default=THRESHOLD)
+    parser.add_argument("--roi", type=int, nargs=4, metavar=("X", "Y", "W", "H"),
+                        help="ROI in saved-frame pixels (default: from roi.json)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--batch", type=int, default=256, help="frames per task")
+    parser.add_argument("--filter", choices=FILTERS, default="moving_average",
+                        help="angle filter for the angle_smoothed column")
+    parser.add_argument("--filter-param", action="append", default=[], metavar="NAME=VALUE",
+                        help="filter parameter, e.g. n=10, alpha=0.2, min_cutoff=1.0")
+    parser.add_argument("--out", default=None, help="output .npz or .csv (default: in the session)")
+    args = parser.parse_args()
+
+    filter_params = {}
+    for item in args.filter_param:
+        name, value = item.split("=", 1)
+        filter_params[name] = int(value) if value.isdigit() else float(value)
+
+    t0 = time.monotonic()
+    table = analyse_session(args.session_dir, args.threshold, args.roi and tuple(args.roi),
+                            args.workers, args.batch, args.filter, filter_params)
+    out = args.out or os.path.join(args.session_dir, f"blob_analysis_t{args.threshold}.npz")
+    save_table(table, out)
+    found = int(np.count_nonzero(~np.isnan(table["angle"])))
+    print(f"[Analysis] {len(table['frame'])} frames ({found} with an ellipse) in "
+          f"{time.monotonic() - t0:.1f}s -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# session_index.py — time-alignment index between a session's frames and BLE samples
+#
+#   python -m analysis.session_index "/media/ben/Extreme SSD/disk_experiment/2025-08-14_10_33" --frame 120 -n 10
+#
+# Frames only carry a wall-clock time in their names (frame_XXXX_<datetime>.jpg) or in
+# the video index, BLE samples in the sample log. This builds two sorted time arrays
+# once and keeps them in <session>/session_index.npz:
+#   frames   frame number, name and epoch of every saved frame, sorted by epoch
+#   records  one entry per log row (5 samples per channel): the host-clock time of its
+#            first sample (sample_t0_s, or the receipt time epoch_s for rows without
+#            one), the sample spacing and the row number, sorted by time
+# so "the N samples nearest to frame k" and "the frame at time t" are binary searches.
+# The index is rebuilt by open_index() when the frames or the log changed since.
+import argparse
+import csv
+import os
+import time
+import numpy as np
+from analysis.blob_batch import list_session_frames
+
+INDEX_FILE = "session_index.npz"
+SAMPLE_LOGS = ("ble_samples.bin", "ble_samples.csv")
+SAMPLES_PER_ROW = 5
+MAX_FRAME_DT = 1.0      # frame_for_time() matches no frame further away than this (s)
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [0, 0]
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _sources(session_dir, log_path):
+    """What the index was built from: frame listing (images/ or the video index) and the log."""
+    video_index = os.path.join(session_dir, "video", "index.bin")
+    frames = video_index if os.path.exists(video_index) else os.path.join(session_dir, "images")
+    return np.array(_stat(frames) + _stat(log_path or ""), dtype=np.int64)
+
+
+def find_sample_log(session_dir):
+    for name in SAMPLE_LOGS:
+        path = os.path.join(session_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _float(value):
+    return float(value) if value else np.nan
+
+
+def record_times(epochs, t0, dt):
+    """First-sample time and sample spacing of log rows; rows without a device time get their receipt time."""
+    timed = ~np.isnan(t0)
+    return np.where(timed, t0, epochs), np.where(timed, dt, 0.0).astype(np.float32)
+
+
+def read_record_times(log_path):
+    """(first-sample time, sample spacing) of every row of a sample log, in log order."""
+    if log_path is None:
+        return np.empty(0), np.empty(0, dtype=np.float32)
+    if log_path.endswith(".bin"):
+        from BLE.client.sample_log import read_sample_log
+        data = read_sample_log(log_path, mmap=True)
+        epochs = np.asarray(data["epoch_s"])
+        if "sample_t0_s" not in data.dtype.names:
+            return epochs.copy(), np.zeros(len(epochs), dtype=np.float32)
+        t0, dt = np.asarray(data["sample_t0_s"]), np.asarray(data["sample_dt_s"])
+    else:
+        t0, dt, epochs = [], [], []
+        with open(log_path, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            e_col = header.index("epoch_s")
+            t_col = header.index("sample_t0_s") if "sample_t0_s" in header else None
+            d_col = header.index("sample_dt_s") if "sample_dt_s" in header else None
+            for row in reader:
+                epochs.append(_float(row[e_col]))
+                t0.append(_float(row[t_col]) if t_col is not None and t_col < len(row) else np.nan)
+                dt.append(_float(row[d_col]) if d_col is not None and d_col < len(row) else np.nan)
+        epochs, t0, dt = np.array(epochs), np.array(t0), np.array(dt)
+    return record_times(epochs, t0, dt)
+
+
+class SessionIndex:
+    def __init__(self, frame_numbers, frame_names, frame_epochs, record_t0, record_dt, record_rows):
+        self.frame_numbers = frame_numbers      # sorted by epoch, like the two below
+        self.frame_names = frame_names          # '' for frames from a video recording
+        self.frame_epochs = frame_epochs
+        self.record_t0 = record_t0              # sorted
+        self.record_dt = record_dt
+        self.record_rows = record_rows          # row of each entry in the sample log
+        # frame number -> position, for nearest_samples(k)
+        self._by_number = np.argsort(frame_numbers, kind="stable")
+        self._numbers_sorted = frame_numbers[self._by_number]
+
+    @classmethod
+    def build(cls, session_dir, log_path=None, records=True):
+        """records=False leaves out the log (frame lookups only, without reading it)."""
+        source, items, numbers, epochs = list_session_frames(session_dir)
+        names = np.array([os.path.basename(p) for p in items] if source == "images" else [""] * len(items),
+                         dtype=str)
+        order = np.argsort(epochs, kind="stable")
+        t0, dt = read_record_times(log_path or find_sample_log(session_dir) if records else None)
+        rec_order = np.argsort(t0, kind="stable")
+        return cls(np.asarray(numbers, dtype=np.int64)[order], names[order],
+                   np.asarray(epochs, dtype=np.float64)[order],
+                   t0[rec_order], dt[rec_order], rec_order.astype(np.int64))
+
+    def save(self, path, sources):
+        np.savez(path, frame_numbers=self.frame_numbers, frame_names=self.frame_names,
+                 frame_epochs=self.frame_epochs, record_t0=self.record_t0, record_dt=self.record_dt,
+                 record_rows=self.record_rows, sources=sources)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["frame_numbers"], data["frame_names"], data["frame_epochs"],
+                       data["record_t0"], data["record_dt"], data["record_rows"]), data["sources"]
+
+    def __len__(self):
+        return len(self.frame_numbers)
+
+    @property
+    def samples(self):
+        return SAMPLES_PER_ROW * len(self.record_t0)
+
+    def frame_epoch(self, k):
+        """Epoch of frame number k (KeyError if there is no such frame)."""
+        i = np.searchsorted(self._numbers_sorted, k)
+        if i == len(self._numbers_sorted) or self._numbers_sorted[i] != k:
+            raise KeyError(f"no frame {k}")
+        return float(self.frame_epochs[self._by_number[i]])
+
+    def nearest_samples(self, k, n=SAMPLES_PER_ROW):
+        """
+        The n samples closest in time to frame number k, as (rows, positions, times)
+        sorted by time: log row, sample within the row (0-4) and its time.
+        """
+        return self.samples_near(self.frame_epoch(k), n)
+
+    def samples_near(self, t, n=SAMPLES_PER_ROW):
+        """The n samples closest in time to t; see nearest_samples()."""
+        i = np.searchsorted(self.record_t0, t)
+        # A row covers SAMPLES_PER_ROW consecutive samples, so the n nearest lie in this window
+        span = -(-n // SAMPLES_PER_ROW) + 1
+        lo, hi = max(0, i - span), min(len(self.record_t0), i + span)
+        pos = np.tile(np.arange(SAMPLES_PER_ROW), hi - lo)
+        rec = np.repeat(np.arange(lo, hi), SAMPLES_PER_ROW)
+        times = self.record_t0[rec] + pos * self.record_dt[rec]
+        pick = np.argsort(np.abs(times - t), kind="stable")[:n]
+        pick = pick[np.argsort(times[pick], kind="stable")]
+        return self.record_rows[rec[pick]], pos[pick], times[pick]
+
+    def frames_for_times(self, times, max_dt=MAX_FRAME_DT):
+        """Position (into the frame_* arrays) of the frame nearest each time, -1 where none is within max_dt."""
+        times = np.asarray(times, dtype=np.float64)
+        if len(self.frame_epochs) == 0:
+            return np.full(times.shape, -1, dtype=np.int64)
+        epochs = self.frame_epochs
+        i = np.searchsorted(epochs, times)
+        after = np.minimum(i, len(epochs) - 1)
+        before = np.maximum(i - 1, 0)
+        i = np.where(np.abs(times - epochs[before]) <= np.abs(epochs[after] - times), before, after)
+        far = ~(np.abs(self.frame_epochs[i] - times) <= max_dt)
+        return np.where(far, -1, i)
+
+    def frame_for_time(self, t, max_dt=MAX_FRAME_DT):
+        """Number of the frame nearest time t, or None if none is within max_dt seconds."""
+        i = int(self.frames_for_times([t], max_dt)[0])
+        return None if i < 0 else int(self.frame_numbers[i])
+
+
+def open_index(session_dir, log_path=None, rebuild=False):
+    """The session's index, from session_index.npz unless the frames or the log changed."""
+    path = os.path.join(session_dir, INDEX_FILE)
+    log_path = log_path or find_sample_log(session_dir)
+    sources = _sources(session_dir, log_path)
+    if not rebuild and os.path.exists(path):
+        try:
+            index, saved = SessionIndex.load(path)
+            if np.array_equal(saved, sources):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+    index = SessionIndex.build(session_dir, log_path)
+    index.save(path, sources)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a session's frame/sample time index and query it.")
+    parser.add_argument("session_dir")
+    parser.add_argument("--log", default=None, help="sample log (default: ble_samples.bin or .csv)")
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--frame", type=int, default=None, help="print the samples nearest this frame")
+    parser.add_argument("-n", type=int, default=SAMPLES_PER_ROW)
+    parser.add_argument("--time", type=float, default=None, help="print the frame nearest this epoch")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    index = open_index(args.session_dir, args.log, args.rebuild)
+    print(f"[index] {len(index)} frames, {index.samples} samples ({time.perf_counter() - t0:.2f}s)")
+    if args.frame is not None:
+        rows, pos, times = index.nearest_samples(args.frame, args.n)
+        for r, p, t in zip(rows.tolist(), pos.tolist(), times.tolist()):
+            print(f"  row {r} sample {p}  t={t:.6f}  ({t - index.frame_epoch(args.frame):+.4f}s)")
+    if args.time is not None:
+        print(f"  frame {index.frame_for_time(args.time)}")
+
+
+if __name__ == "__main__":
+    main()
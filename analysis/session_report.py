@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# session_report.py — paginated HTML report of a recorded session
+#
+#   python -m analysis.session_report "/media/ben/Extreme SSD/disk_experiment/2025-08-14_10_33" --index 3
+#
+# Streams the session's readings (readings.csv, ble_samples.csv or ble_samples.bin,
+# whichever is there first) row by row and writes them as static pages of
+# --rows-per-page rows each: session<i>.html is page 1, session<i>_p0002.html page 2,
+# and so on, each with its rows, the thumbnails of the frames they reference and links
+# to the other pages. A row's frame is its Frame column or, for the BLE logs, the frame
+# nearest the device time of its first sample (sample_t0_s, epoch_s for rows without
+# one) from the session's time index (analysis/session_index.py). Only one page of rows
+# is held at a time, so the build runs in the same memory whatever the length of the
+# session. Thumbnails come from the session's thumbnail cache (analysis/thumbnails.py):
+# missing or outdated ones are made on a process pool while later pages are written.
+import argparse
+import csv
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from analysis.session_index import open_index, record_times
+from analysis.thumbnails import THUMB_DIR, THUMB_WIDTH, ThumbnailCache
+
+SOURCES = ("readings.csv", "ble_samples.csv", "ble_samples.bin")
+FRAME_COLUMN = "Frame"
+ROWS_PER_PAGE = 500
+
+PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Session {index} Data — page {page} of {pages}</title>
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <!-- Bootstrap + Styling -->
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+    <style>
+    .image-scroll {{
+        height: 88vh;
+        overflow-y: auto;
+        border: 1px solid #ccc;
+        padding: 10px 10px;
+        background-color: white;
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+        position: sticky;
+        top: 0;
+        right: 0;
+    }}
+    .image-scroll img {{
+        width: {thumb_width}px;
+        max-width: 100%;
+        margin: 3px 0;
+        border-radius: 5px;
+    }}
+    .image-wrapper.highlight img {{
+        outline: 3px solid #0d6efd;
+    }}
+    .table-scroll {{
+        height: 88vh;
+        overflow: auto;
+    }}
+</style>
+</head>
+<body>
+<div class="container-fluid mt-4">
+    <h1 class="mb-4">Session {index} Data</h1>
+    {nav}
+    <div class="row">
+        <!-- Data Table -->
+        <div class="col-md-8 table-scroll">
+            <table class="table table-sm table-bordered table-hover align-middle text-center" id="data-table">
+                <thead class="table-dark">
+                    <tr>{header}</tr>
+                </thead>
+                <tbody>
+"""
+
+PAGE_IMAGES = """            </tbody>
+            </table>
+        </div>
+
+        <!-- Vertical Image Scroll -->
+        <div class="col-md-4">
+            <div class="image-scroll" id="image-list">
+"""
+
+PAGE_TAIL = """            </div>
+        </div>
+    </div>
+</div>
+
+<!-- JS -->
+<script>
+    const imageList = document.getElementById("image-list");
+    let highlighted = null;
+
+    document.querySelector("#data-table tbody").addEventListener("mouseover", event => {
+        const row = event.target.closest("tr");
+        if (!row) return;
+        const target = row.dataset.frame && document.querySelector(`.image-wrapper[data-frame='${row.dataset.frame}']`);
+        if (!target || target === highlighted) return;
+        if (highlighted) highlighted.classList.remove("highlight");
+        highlighted = target;
+        target.classList.add("highlight");
+        imageList.scrollTop = target.offsetTop - imageList.clientHeight / 2 + target.clientHeight / 2;
+    });
+</script>
+
+</body>
+</html>"""
+
+
+def page_filename(index, page):
+    return f"session{index}.html" if page == 1 else f"session{index}_p{page:04d}.html"
+
+
+def find_source(session_dir):
+    for name in SOURCES:
+        path = os.path.join(session_dir, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"no readings in {session_dir} (looked for {', '.join(SOURCES)})")
+
+
+def count_rows(path):
+    """Data rows in a readings file, without parsing it."""
+    if path.endswith(".bin"):
+        from BLE.client.sample_log import read_sample_log
+        return len(read_sample_log(path, mmap=True))
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    lines += last != b"\n"
+    return max(0, lines - 1)
+
+
+def iter_rows(path):
+    """(header, row iterator) of a readings file; rows are lists of str."""
+    if path.endswith(".bin"):
+        from BLE.client.sample_log import CSV_HEADER, iter_csv_rows
+        return list(CSV_HEADER), iter_csv_rows(path)
+    f = open(path, newline="")
+    reader = csv.reader(f)
+    header = [name.strip() for name in next(reader, [])]
+
+    def rows():
+        with f:
+            yield from reader
+    return header, rows()
+
+
+def _nav(index, page, pages):
+    if pages <= 1:
+        return ""
+    links = []
+    if page > 1:
+        links.append(f'<a class="btn btn-outline-secondary btn-sm" href="{page_filename(index, 1)}">&laquo; first</a>')
+        links.append(f'<a class="btn btn-outline-secondary btn-sm" href="{page_filename(index, page - 1)}">&lsaquo; prev</a>')
+    links.append(f'<span class="mx-2">page {page} of {pages}</span>')
+    if page < pages:
+        links.append(f'<a class="btn btn-outline-secondary btn-sm" href="{page_filename(index, page + 1)}">next &rsaquo;</a>')
+        links.append(f'<a class="btn btn-outline-secondary btn-sm" href="{page_filename(index, pages)}">last &raquo;</a>')
+    # Any other page by number; the names follow page_filename()
+    links.append(f'<input type="number" min="1" max="{pages}" value="{page}" class="ms-2" style="width: 6em" '
+                 f'onchange="const p = Math.min({pages}, Math.max(1, this.value | 0)); '
+                 f'location.href = p === 1 ? \'session{index}.html\' : '
+                 f'\'session{index}_p\' + String(p).padStart(4, \'0\') + \'.html\';">')
+    return f'<div class="mb-3">{" ".join(links)}</div>'
+
+
+def _write_page(f, index, page, pages, header, frame_col, rows, row_frames, first_row, cache):
+    """Writes one page; row_frames is the frame name of each row ('' for none)."""
+    columns = [i for i in range(len(header)) if i != frame_col]
+    f.write(PAGE_HEAD.format(index=index, page=page, pages=pages, thumb_width=cache.width,
+                             nav=_nav(index, page, pages),
+                             header="".join(f"<th>{html.escape(header[i])}</th>" for i in columns)))
+    for n, (row, name) in enumerate(zip(rows, row_frames)):
+        cells = "".join(f"<td>{html.escape(row[i]) if i < len(row) else ''}</td>" for i in columns)
+        frame_attr = f' data-frame="{html.escape(name)}"' if name else ""
+        f.write(f'<tr data-index="{first_row + n}"{frame_attr}>{cells}</tr>\n')
+    f.write(PAGE_IMAGES)
+    # Each frame once, in order of first use
+    frames = list(dict.fromkeys(name for name in row_frames if name))
+    for name in frames:
+        thumb = f"{THUMB_DIR}/{cache.thumb_name(name)}"
+        f.write(f'<div class="image-wrapper" data-frame="{html.escape(name)}"><a href="images/{html.escape(name)}">'
+                f'<img src="{html.escape(thumb)}" loading="lazy" alt="{html.escape(name)}"></a></div>\n')
+    f.write(PAGE_TAIL)
+    return frames
+
+
+def _row_frames(rows, frame_col, epoch_col, t0_col, session_index):
+    """
+    Frame name of each row: its Frame column, else the indexed frame nearest the row's
+    first sample (its sample_t0_s device time, or epoch_s for rows without one).
+    """
+    if frame_col is not None:
+        return [os.path.basename(row[frame_col].strip()) if frame_col < len(row) else "" for row in rows]
+    if epoch_col is None or session_index is None or len(rows) == 0:
+        return [""] * len(rows)
+
+    def column(col):
+        if col is None:
+            return np.full(len(rows), np.nan)
+        return np.array([float(row[col]) if col < len(row) and row[col] else np.nan for row in rows])
+    times, _ = record_times(column(epoch_col), column(t0_col), np.zeros(len(rows)))
+    pos = session_index.frames_for_times(times)
+    names = session_index.frame_names[np.maximum(pos, 0)] if len(session_index) else np.full(len(rows), "")
+    return np.where(pos >= 0, names, "").tolist()
+
+
+def build_report(session_dir, index=1, source=None, rows_per_page=ROWS_PER_PAGE,
+                 thumb_width=THUMB_WIDTH, workers=None):
+    """Writes the report pages into session_dir; returns (path of page 1, rows, pages)."""
+    path = find_source(session_dir) if source is None else os.path.join(session_dir, source)
+    total = count_rows(path)
+    pages = max(1, -(-total // rows_per_page))
+    header, rows = iter_rows(path)
+    frame_col = header.index(FRAME_COLUMN) if FRAME_COLUMN in header else None
+    epoch_col = header.index("epoch_s") if "epoch_s" in header else None
+    t0_col = header.index("sample_t0_s") if "sample_t0_s" in header else None
+    session_index = open_index(session_dir) if frame_col is None and epoch_col is not None else None
+    cache = ThumbnailCache(session_dir, thumb_width)
+
+    written = 0
+    pending = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for page in range(1, pages + 1):
+            page_rows = []
+            for row in rows:
+                page_rows.append(row)
+                if len(page_rows) == rows_per_page:
+                    break
+            with open(os.path.join(session_dir, page_filename(index, page)), "w") as f:
+                row_frames = _row_frames(page_rows, frame_col, epoch_col, t0_col, session_index)
+                frames = _write_page(f, index, page, pages, header, frame_col, page_rows, row_frames,
+                                     written, cache)
+            written += len(page_rows)
+            # At most two pages of thumbnails in flight: the pool works while we write on
+            cache.collect(pending)
+            pending = cache.submit(pool, frames)
+        cache.collect(pending)
+    cache.save()
+    return os.path.join(session_dir, page_filename(index, 1)), written, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the paginated HTML report of a session.")
+    parser.add_argument("session_dir")
+    parser.add_argument("--index", type=int, default=1, help="session number for the page names")
+    parser.add_argument("--source", default=None, help=f"readings file (default: first of {', '.join(SOURCES)})")
+    parser.add_argument("--rows-per-page", type=int, default=ROWS_PER_PAGE)
+    parser.add_argument("--thumb-width", type=int, default=THUMB_WIDTH)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    first, rows, pages = build_report(args.session_dir, args.index, args.source, args.rows_per_page,
+                                      args.thumb_width, args.workers)
+    print(f"[report] {rows} rows on {pages} page(s) in {time.perf_counter() - t0:.1f}s: {first}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# thumbnails.py — incremental thumbnail and contact-sheet cache for a session's frames
+#
+#   python -m analysis.thumbnails "/media/ben/Extreme SSD/disk_experiment/2025-08-14_10_33" --width 160 --format webp
+#
+# Every images/frame_*.jpg gets a small WebP (or JPEG) copy in <session>/thumbs/, and
+# the thumbnails are tiled into contact sheets (thumbs/sheet_0001.webp, ...) of
+# --sheet COLSxROWS frames in capture order. Both are built on a process pool. JPEGs
+# are decoded at reduced size (PIL's draft mode: libjpeg scales by 1/2, 1/4 or 1/8 in
+# the DCT domain) so a 160 px thumbnail never decodes the full frame.
+#
+# thumbs/manifest.json records the mtime and size of every frame a thumbnail was made
+# from, and which frames each contact sheet holds; a re-run only processes frames that
+# are new or changed (and the sheets they belong to), and drops thumbnails of frames
+# that are gone. Changing the width, format or quality rebuilds everything.
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, features
+from camera.encoder_pool import parse_frame_filename
+
+THUMB_DIR = "thumbs"
+MANIFEST = "manifest.json"
+THUMB_WIDTH = 160
+THUMB_QUALITY = 80
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+DEFAULT_FORMAT = "webp" if features.check("webp") else "jpg"
+SHEET_GRID = (8, 8)     # contact sheet columns x rows
+BATCH = 32
+
+
+def _save(img, dst, fmt, quality):
+    # Written under a temporary name so an interrupted run leaves no half file
+    tmp = dst + ".tmp"
+    img.save(tmp, format=FORMATS[fmt], quality=quality)
+    os.replace(tmp, dst)
+
+
+def _thumbnail_batch(items, width, fmt, quality):
+    """Worker: items are (source, destination, entry). Returns the entries written."""
+    done = []
+    for src, dst, entry in items:
+        try:
+            with Image.open(src) as im:
+                height = max(1, round(im.height * width / im.width))
+                # Reduced-size decode: libjpeg picks the largest 1/n scale still >= the size
+                im.draft("RGB", (width, height))
+                im = im.convert("RGB")
+                if im.width != width:
+                    im = im.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                _save(im, dst, fmt, quality)
+        except OSError:
+            continue
+        done.append(entry)
+    return done
+
+
+def _sheet_worker(thumb_dir, sheet, names, thumbs, grid, fmt, quality):
+    """Worker: tiles the thumbnails of one contact sheet, labelled with their frame numbers."""
+    cols, rows = grid
+    tiles = []
+    for name, thumb in zip(names, thumbs):
+        try:
+            tiles.append((name, Image.open(os.path.join(thumb_dir, thumb)).convert("RGB")))
+        except OSError:
+            tiles.append((name, None))
+    size = next((t.size for _, t in tiles if t is not None), (THUMB_WIDTH, THUMB_WIDTH * 3 // 4))
+    sheet_img = Image.new("RGB", (cols * size[0], rows * size[1]), "white")
+    draw = ImageDraw.Draw(sheet_img)
+    for k, (name, tile) in enumerate(tiles):
+        x, y = (k % cols) * size[0], (k // cols) * size[1]
+        if tile is not None:
+            sheet_img.paste(tile, (x, y))
+        info = parse_frame_filename(name)
+        draw.text((x + 3, y + 2), str(info[0]) if info else name, fill="yellow")
+    _save(sheet_img, os.path.join(thumb_dir, sheet), fmt, quality)
+    return sheet
+
+
+def frame_order(name):
+    """Sort key: capture index from the frame's name (names alone sort wrong past 9999)."""
+    info = parse_frame_filename(name)
+    return (0, info[0], name) if info else (1, 0, name)
+
+
+class ThumbnailCache:
+    def __init__(self, session_dir, width=THUMB_WIDTH, fmt=DEFAULT_FORMAT, quality=THUMB_QUALITY,
+                 sheet_grid=SHEET_GRID):
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {sorted(FORMATS)}")
+        self.session_dir = session_dir
+        self.image_dir = os.path.join(session_dir, "images")
+        self.thumb_dir = os.path.join(session_dir, THUMB_DIR)
+        self.width = width
+        self.fmt = fmt
+        self.quality = quality
+        self.sheet_grid = tuple(sheet_grid)
+        self.params = {"width": width, "format": fmt, "quality": quality}
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        self.frames = {}    # frame name -> [mtime_ns, size] it was made from
+        self.sheets = {}    # sheet name -> signature of its frames
+        self._load()
+
+    def _load(self):
+        path = os.path.join(self.thumb_dir, MANIFEST)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("params") != self.params:
+            return      # other size/format: everything is rebuilt
+        self.frames = manifest.get("frames", {})
+        if manifest.get("sheet_grid") == list(self.sheet_grid):
+            self.sheets = manifest.get("sheets", {})
+
+    def save(self):
+        path = os.path.join(self.thumb_dir, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"params": self.params, "sheet_grid": list(self.sheet_grid),
+                       "frames": self.frames, "sheets": self.sheets}, f)
+        os.replace(path + ".tmp", path)
+
+    def thumb_name(self, frame_name):
+        return os.path.splitext(os.path.basename(frame_name))[0] + "." + self.fmt
+
+    def list_frames(self):
+        """{name: [mtime_ns, size]} of every frame_*.jpg in images/, from one directory scan."""
+        frames = {}
+        if os.path.isdir(self.image_dir):
+            with os.scandir(self.image_dir) as it:
+                for entry in it:
+                    if entry.name.startswith("frame_") and entry.name.endswith(".jpg"):
+                        st = entry.stat()
+                        frames[entry.name] = [st.st_mtime_ns, st.st_size]
+        return frames
+
+    def stale(self, names, current=None):
+        """(source, destination, entry) of the frames among names whose thumbnail is missing or old."""
+        items = []
+        for name in names:
+            if current is not None:
+                stat = current.get(name)
+            else:
+                try:
+                    st = os.stat(os.path.join(self.image_dir, name))
+                    stat = [st.st_mtime_ns, st.st_size]
+                except OSError:
+                    stat = None
+            if stat is None or self.frames.get(name) == stat:
+                continue
+            items.append((os.path.join(self.image_dir, name),
+                          os.path.join(self.thumb_dir, self.thumb_name(name)), (name, stat)))
+        return items
+
+    def submit(self, pool, names, current=None, batch=BATCH):
+        """Queues the stale thumbnails among names on a process pool; returns the futures."""
+        items = self.stale(names, current)
+        return [pool.submit(_thumbnail_batch, items[i:i + batch], self.width, self.fmt, self.quality)
+                for i in range(0, len(items), batch)]
+
+    def collect(self, futures):
+        """Waits for submit()'s futures and records what they made; returns how many."""
+        made = 0
+        for future in futures:
+            for name, stat in future.result():
+                self.frames[name] = stat
+                made += 1
+        return made
+
+    def prune(self, current):
+        """Forgets (and deletes the thumbnails of) frames no longer in images/."""
+        for name in [n for n in self.frames if n not in current]:
+            del self.frames[name]
+            try:
+                os.remove(os.path.join(self.thumb_dir, self.thumb_name(name)))
+            except OSError:
+                pass
+
+    def update_sheets(self, pool, names):
+        """Rebuilds the contact sheets whose frames changed; names in capture order."""
+        per_sheet = self.sheet_grid[0] * self.sheet_grid[1]
+        names = [n for n in names if n in self.frames]
+        futures = {}
+        wanted = set()
+        for k in range(0, len(names), per_sheet):
+            members = names[k:k + per_sheet]
+            sheet = f"sheet_{k // per_sheet + 1:04d}.{self.fmt}"
+            wanted.add(sheet)
+            signature = hashlib.sha1(json.dumps([[n, self.frames[n]] for n in members]).encode()).hexdigest()
+            if self.sheets.get(sheet) == signature and os.path.exists(os.path.join(self.thumb_dir, sheet)):
+                continue
+            futures[pool.submit(_sheet_worker, self.thumb_dir, sheet, members,
+                                [self.thumb_name(n) for n in members], self.sheet_grid,
+                                self.fmt, self.quality)] = (sheet, signature)
+        for future, (sheet, signature) in futures.items():
+            future.result()
+            self.sheets[sheet] = signature
+        for sheet in [s for s in self.sheets if s not in wanted]:
+            del self.sheets[sheet]
+            try:
+                os.remove(os.path.join(self.thumb_dir, sheet))
+            except OSError:
+                pass
+        return len(futures)
+
+    def update(self, pool=None, workers=None):
+        """The whole stage: new/changed thumbnails, then their sheets. Returns (thumbnails, sheets) made."""
+        if pool is None:
+            with ProcessPoolExecutor(max_workers=workers) as own_pool:
+                return self.update(own_pool)
+        current = self.list_frames()
+        self.prune(current)
+        names = sorted(current, key=frame_order)
+        made = self.collect(self.submit(pool, names, current))
+        sheets = self.update_sheets(pool, names)
+        self.save()
+        return made, sheets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh a session's thumbnails and contact sheets.")
+    parser.add_argument("session_dir")
+    parser.add_argument("--width", type=int, default=THUMB_WIDTH)
+    parser.add_argument("--format", choices=FORMATS, default=DEFAULT_FORMAT)
+    parser.add_argument("--quality", type=int, default=THUMB_QUALITY)
+    parser.add_argument("--sheet", default="x".join(map(str, SHEET_GRID)), help="contact sheet COLSxROWS")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    grid = tuple(int(v) for v in args.sheet.lower().split("x"))
+    t0 = time.perf_counter()
+    cache = ThumbnailCache(args.session_dir, args.width, args.format, args.quality, grid)
+    made, sheets = cache.update(workers=args.workers)
+    print(f"[thumbnails] {made} thumbnail(s), {sheets} contact sheet(s) written in "
+          f"{time.perf_counter() - t0:.1f}s ({len(cache.frames)} frames cached)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# angle_smoothing.py — smoothing of ellipse orientation angles with 0/180° wraparound
+#
+# cv2.fitEllipse reports the orientation in [0, 180): 179° and 1° are 2° apart, but their
+# arithmetic mean is 90°. Every filter here works on the doubled angle (period 360°),
+# i.e. on the unit vector (cos 2θ, sin 2θ), and maps the result back to [0, 180).
+#
+#   'moving_average'  circular mean over the last n readings, O(1) per update from
+#                     running sums over a fixed ring buffer
+#   'ema'             exponential moving average of the unit vector
+#   'one_euro'        one-euro filter (Casiez et al.): little smoothing when the angle
+#                     moves fast, strong smoothing when it is still
+#
+# make_angle_filter() builds the live (one reading at a time) filters; smooth_angles()
+# applies the same filter to a whole array for offline reprocessing.
+import math
+import numpy as np
+
+FILTERS = ("moving_average", "ema", "one_euro")
+
+
+def _to_angle(s, c):
+    angle = (math.degrees(math.atan2(s, c)) / 2.0) % 180.0
+    return 0.0 if angle >= 180.0 else angle     # -1e-15 % 180 rounds to 180.0
+
+
+def _to_angles(s, c):
+    angles = np.degrees(np.arctan2(s, c)) / 2.0 % 180.0
+    angles[angles >= 180.0] = 0.0
+    return angles
+
+
+class CircularMovingAverage:
+    def __init__(self, n=10, resum_every=10000):
+        self.n = n
+        self._sin = [0.0] * n
+        self._cos = [0.0] * n
+        self._sum_sin = 0.0
+        self._sum_cos = 0.0
+        self._count = 0
+        self._pos = 0
+        self._resum_every = resum_every
+
+    def update(self, angle, t=None):
+        r = math.radians(2.0 * angle)
+        s, c = math.sin(r), math.cos(r)
+        pos = self._pos
+        self._sum_sin += s - self._sin[pos]
+        self._sum_cos += c - self._cos[pos]
+        self._sin[pos] = s
+        self._cos[pos] = c
+        self._pos = (pos + 1) % self.n
+        self._count += 1
+        # Re-derive the running sums now and then so rounding error can't accumulate
+        if self._count % self._resum_every == 0:
+            self._sum_sin = math.fsum(self._sin)
+            self._sum_cos = math.fsum(self._cos)
+        return _to_angle(self._sum_sin, self._sum_cos)
+
+
+class CircularEMA:
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._s = None
+        self._c = None
+
+    def update(self, angle, t=None):
+        r = math.radians(2.0 * angle)
+        s, c = math.sin(r), math.cos(r)
+        if self._s is None:
+            self._s, self._c = s, c
+        else:
+            self._s += self.alpha * (s - self._s)
+            self._c += self.alpha * (c - self._c)
+        return _to_angle(self._s, self._c)
+
+
+def _smoothing_factor(dt, cutoff):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroAngle:
+    """
+    One-euro filter on the unwrapped angle. `rate` (Hz) is used when update() is not
+    given timestamps. min_cutoff (Hz) sets smoothing at rest, beta how quickly it
+    relaxes as the angle moves (per °/s).
+    """
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0, rate=60.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.rate = rate
+        self._x = None          # filtered, unwrapped angle
+        self._dx = 0.0
+        self._raw = None        # last raw, unwrapped angle
+        self._t = None
+
+    def update(self, angle, t=None):
+        if self._raw is None:
+            self._raw = self._x = float(angle)
+            self._t = t
+            return float(angle) % 180.0
+        # Unwrap: take the step to the new reading the short way round (period 180°)
+        step = (angle - self._raw + 90.0) % 180.0 - 90.0
+        raw = self._raw + step
+        dt = (t - self._t) if (t is not None and self._t is not None and t > self._t) else 1.0 / self.rate
+        a_d = _smoothing_factor(dt, self.d_cutoff)
+        self._dx += a_d * ((raw - self._raw) / dt - self._dx)
+        cutoff = self.min_cutoff + self.beta * abs(self._dx)
+        self._x += _smoothing_factor(dt, cutoff) * (raw - self._x)
+        self._raw, self._t = raw, t
+        angle = self._x % 180.0
+        return 0.0 if angle >= 180.0 else angle
+
+
+def make_angle_filter(kind="moving_average", **params):
+    """Live filter with an update(angle, t=None) -> smoothed angle method."""
+    if kind == "moving_average":
+        return CircularMovingAverage(**params)
+    if kind == "ema":
+        return CircularEMA(**params)
+    if kind == "one_euro":
+        return OneEuroAngle(**params)
+    raise ValueError(f"Unknown angle filter '{kind}', expected one of {FILTERS}")
+
+
+# --- Vectorized (offline) variants ---
+def _ema_columns(x, alpha):
+    """EMA down axis 0 of x without a Python loop per sample, in numerically safe chunks."""
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return x.copy()
+    # Within a chunk: y_k = decay^(k+1) * prev + alpha * decay^k * sum_{j<=k} x_j / decay^j.
+    # Keep decay**chunk far from float64 underflow so the division stays exact enough.
+    chunk = max(1, min(4096, int(-150 / math.log10(decay)))) if decay < 1 else len(x)
+    out = np.empty_like(x)
+    prev = x[0]                 # makes y_0 = x_0, as the live filter starts
+    for start in range(0, len(x), chunk):
+        block = x[start:start + chunk]
+        powers = decay ** np.arange(len(block))[:, None]
+        y = decay * powers * prev + alpha * powers * np.cumsum(block / powers, axis=0)
+        out[start:start + len(block)] = y
+        prev = y[-1]
+    return out
+
+
+def smooth_angles(angles, kind="moving_average", timestamps=None, **params):
+    """
+    Applies the same filter as make_angle_filter(kind, **params) to a whole array.
+    NaN readings (frames without an ellipse) are skipped, as the live tracker skips
+    them, and stay NaN in the output.
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    out = np.full(angles.shape, np.nan)
+    valid = ~np.isnan(angles)
+    a = angles[valid]
+    if a.size == 0:
+        return out
+    r = np.radians(2.0 * a)
+    sc = np.column_stack([np.sin(r), np.cos(r)])
+
+    if kind == "moving_average":
+        n = params.get("n", 10)
+        csum = np.cumsum(np.vstack([np.zeros((1, 2)), sc]), axis=0)
+        idx = np.arange(1, len(a) + 1)
+        window = csum[idx] - csum[np.maximum(idx - n, 0)]
+        res = _to_angles(window[:, 0], window[:, 1])
+    elif kind == "ema":
+        filtered = _ema_columns(sc, params.get("alpha", 0.2))
+        res = _to_angles(filtered[:, 0], filtered[:, 1])
+    elif kind == "one_euro":
+        # The adaptive cutoff depends on the previous output, so this one is inherently
+        # sequential; it runs the live filter over the array.
+        f = OneEuroAngle(**params)
+        ts = None if timestamps is None else np.asarray(timestamps, dtype=np.float64)[valid]
+        res = np.array([f.update(v, None if ts is None else ts[i]) for i, v in enumerate(a)])
+    else:
+        raise ValueError(f"Unknown angle filter '{kind}', expected one of {FILTERS}")
+    out[valid] = res
+    return out
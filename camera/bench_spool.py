@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# bench_spool.py — raw memory-mapped spooling vs inline cv2.imwrite for recorded frames
+#
+#   python -m camera.bench_spool --dir "/media/ben/Extreme SSD/bench" --frames 600
+#
+# Run it against the SSD the experiment records to; numbers from a tmpfs or the SD
+# card say nothing about the real setup.
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+from camera.encoder_pool import frame_filename, jpeg_params
+from camera.spool import FrameSpool, compress_spool
+
+
+def synthetic_frames(n, shape, seed=0):
+    """A few distinct camera-like frames (gradient + noise + blob), cycled."""
+    rng = np.random.default_rng(seed)
+    h, w, _ = shape
+    base = np.linspace(0, 120, w, dtype=np.float32)[None, :, None].repeat(h, 0).repeat(3, 2)
+    frames = []
+    for i in range(min(n, 8)):
+        frame = (base + rng.normal(0, 8, shape)).clip(0, 255).astype(np.uint8)
+        cv2.ellipse(frame, ((w // 2, h // 2), (w // 5, w // 9), i * 20), (230, 230, 230), -1)
+        frames.append(frame)
+    return frames
+
+
+def bench_imwrite(frames, n, out_dir, params):
+    t0 = time.perf_counter()
+    for i in range(n):
+        bgr = cv2.cvtColor(frames[i % len(frames)], cv2.COLOR_RGB2BGR)
+        cv2.imwrite(frame_filename(out_dir, i, time.time()), bgr, params)
+    return time.perf_counter() - t0
+
+
+def bench_spool(frames, n, out_dir):
+    spool = FrameSpool(os.path.join(out_dir, "spool_0000.raw"), frames[0].shape, n)
+    t0 = time.perf_counter()
+    for i in range(n):
+        spool.append(i, time.time(), frames[i % len(frames)])
+    hot = time.perf_counter() - t0
+    spool.close()
+    return hot, time.perf_counter() - t0, spool.path
+
+
+def report(name, seconds, n):
+    print(f"{name:<34} {seconds:8.2f} s  {n / seconds:8.1f} fps  {seconds / n * 1000:7.2f} ms/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dir", default=None, help="directory on the target disk (default: a temp dir)")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--quality", type=int, default=90)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_spool_", dir=args.dir)
+    shape = (args.height, args.width, 3)
+    frames = synthetic_frames(args.frames, shape)
+    params = jpeg_params(args.quality)
+    n = args.frames
+    print(f"{n} frames of {args.width}x{args.height} RGB in {root}")
+    try:
+        jpg_dir = os.path.join(root, "imwrite")
+        os.makedirs(jpg_dir)
+        report("inline cv2.imwrite", bench_imwrite(frames, n, jpg_dir, params), n)
+
+        hot, with_flush, path = bench_spool(frames, n, root)
+        report("spool (hot path, page cache)", hot, n)
+        report("spool (incl. flush to disk)", with_flush, n)
+
+        t0 = time.perf_counter()
+        compress_spool(path, "jpeg", os.path.join(root, "from_spool"), args.quality)
+        report("deferred compression (post-run)", time.perf_counter() - t0, n)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
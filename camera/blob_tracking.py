@@ -0,0 +1,103 @@
+# blob_tracking.py — allocation-free blob/ellipse analysis for the ROI tracker
+import time
+import cv2
+import numpy as np
+
+THRESHOLD = 125
+THRESHOLD_MAXVAL = 75
+STAGES = ("capture", "gray", "threshold", "contours", "fit", "total")
+
+
+def build_circular_mask(h, w):
+    """Builds the centred circular mask used by apply_circular_mask, once per ROI size."""
+    mask = np.zeros((h, w), dtype=np.uint8)
+    center = (w // 2, h // 2)
+    radius = min(center[0], center[1], w - center[0], h - center[1])
+    cv2.circle(mask, center, radius, 255, -1)
+    return mask
+
+
+def make_tracking_buffers(h, w):
+    """
+    Preallocates everything the per-frame analysis writes into for an h x w ROI.
+    Rebuild only when the ROI changes.
+    """
+    return {
+        "shape": (h, w),
+        "mask": build_circular_mask(h, w),
+        "gray": np.empty((h, w), dtype=np.uint8),
+        "binary": np.empty((h, w), dtype=np.uint8),
+    }
+
+
+def analyse_gray(gray, bufs, threshold=THRESHOLD, timings=None):
+    """
+    Threshold -> mask -> contours -> fitEllipse on a grayscale ROI, writing only
+    into the preallocated buffers. Returns (area, ellipse); either may be None.
+    """
+    t0 = time.perf_counter()
+    binary = bufs["binary"]
+    # Thresholding before masking gives the same result as masking first
+    # (masked pixels are 0, which never passes the threshold) and saves a copy.
+    cv2.threshold(gray, threshold, THRESHOLD_MAXVAL, cv2.THRESH_BINARY, dst=binary)
+    cv2.bitwise_and(binary, bufs["mask"], dst=binary)
+    t1 = time.perf_counter()
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    t2 = time.perf_counter()
+
+    area, ellipse = None, None
+    if contours:
+        largest_contour = max(contours, key=cv2.contourArea)
+        area = cv2.contourArea(largest_contour)
+        if len(largest_contour) >= 5:
+            fitted = cv2.fitEllipse(largest_contour)
+            if fitted[1][0] > 0 and fitted[1][1] > 0:
+                ellipse = fitted
+    t3 = time.perf_counter()
+
+    if timings is not None:
+        record_timing(timings, "threshold", t1 - t0)
+        record_timing(timings, "contours", t2 - t1)
+        record_timing(timings, "fit", t3 - t2)
+    return area, ellipse
+
+
+def analyse_rgb(roi_rgb, bufs, threshold=THRESHOLD, timings=None):
+    """Converts an RGB ROI into the preallocated gray buffer, then runs analyse_gray."""
+    t0 = time.perf_counter()
+    cv2.cvtColor(roi_rgb, cv2.COLOR_RGB2GRAY, dst=bufs["gray"])
+    if timings is not None:
+        record_timing(timings, "gray", time.perf_counter() - t0)
+    return analyse_gray(bufs["gray"], bufs, threshold, timings)
+
+
+# --- Per-stage timing (exponential moving average, milliseconds) ---
+def new_timings():
+    return {stage: 0.0 for stage in STAGES}
+
+
+def record_timing(timings, stage, seconds, alpha=0.05):
+    timings[stage] += alpha * (seconds * 1000.0 - timings[stage])
+
+
+def format_timings(timings):
+    return " ".join(f"{stage}={timings[stage]:.2f}ms" for stage in STAGES)
+
+
+def scale_ellipse(ellipse, sx, sy):
+    """
+    An ellipse ((cx, cy), (w, h), angle) fitted on a frame resized by 1/sx, 1/sy, in the
+    original frame's pixels. Unequal scales change the angle as well as the axes, so the
+    axes are recomputed from the scaled axis vectors (SVD).
+    """
+    (cx, cy), (w, h), angle = ellipse
+    if sx == sy:
+        return (cx * sx, cy * sy), (w * sx, h * sy), angle
+    t = np.radians(angle)
+    axes = np.array([[w / 2 * np.cos(t), -h / 2 * np.sin(t)],
+                     [w / 2 * np.sin(t), h / 2 * np.cos(t)]]) * [[sx], [sy]]
+    u, s, _ = np.linalg.svd(axes)
+    # Keep OpenCV's labelling: "width" is the axis closest to the scaled width axis
+    k = int(np.argmax(np.abs(u.T @ axes[:, 0])))
+    angle = float(np.degrees(np.arctan2(u[1, k], u[0, k])) % 180.0)
+    return (cx * sx, cy * sy), (float(2 * s[k]), float(2 * s[1 - k])), angle
@@ -1,14 +1,23 @@
 import cv2
 import numpy as np
-from picamera2 import Picamera2
-from PIL import Image
 import time
 import os
 import threading
 import queue
-from datetime import datetime
-from states import file_state, blob_state, location_state
-from gui.gui_module import video_queue
+import json
+from states import file_state, blob_state, location_state, camera_state
+from gui.gui_module import set_preview_source
+from camera.blob_tracking import (make_tracking_buffers, analyse_rgb, analyse_gray, scale_ellipse,
+                                  new_timings, record_timing, format_timings)
+from camera.frame_ring import FrameRing
+from camera.angle_smoothing import make_angle_filter
+from camera.encoder_pool import EncoderPool, frame_filename
+from camera.video_sink import SegmentedMjpegSink
+from camera.spool import SpoolSink
+if camera_state['backend'] == 'fake':
+    from camera.fake_picamera2 import Picamera2, MappedArray
+else:
+    from picamera2 import Picamera2, MappedArray
 from gpiozero import InputDevice
 running_signal = InputDevice(16)
 
@@ -16,22 +25,19 @@ running_signal = InputDevice(16)
 
 
 # --- Global Shared State & Threading Primitives ---
-# This dictionary will hold data shared between threads
-shared_data = {
-    "original_frame": None,
-    "raw_roi_frame": None,      # Raw ROI for drawing in the consumer thread
-    "contour_to_draw": None,    # Data needed for visualization
-    "ellipse_to_draw": None,    # ...
-    "center_to_draw": None,     # ...
-}
-# A queue to hold frames that need to be saved to disk
-save_queue = queue.Queue()
-# A lock to ensure thread-safe access to shared_data
-data_lock = threading.Lock()
+# Frames travel from the tracking thread to its consumers through a FrameRing
+# (created in start_camera_loop once the stream sizes are known). Each consumer
+# (preview, recorder, ...) has its own reader and dropped-frame counters.
+frame_ring = None
+# Where recorded frames go (EncoderPool, SegmentedMjpegSink, SpoolSink or QueueSink),
+# created in start_camera_loop
+save_sink = None
+# A bounded queue of frames to be saved by save_worker (the 'thread' save backend)
+save_queue = queue.Queue(maxsize=camera_state['save_queue_max'])
 # An event to signal all threads to stop gracefully
 stop_event = threading.Event()
-# An event to synchronize the producer (tracking) and consumer (recording) threads
-frame_ready_event = threading.Event()
+# Rolling per-stage timings (ms) of the tracking loop
+tracking_timings = new_timings()
 
 
 # --- Directory Setup ---
@@ -55,23 +61,65 @@ def apply_circular_mask(gray_img):
     masked = cv2.bitwise_and(gray_img, gray_img, mask=mask)
     return masked, mask
 
-def smooth_angle(new_angle, history, N=10):
-    """Smooths an angle value over the last N readings."""
-    history.append(new_angle)
-    if len(history) > N:
-        history.pop(0)
-    return sum(history) / len(history)
+def new_angle_filter():
+    """The configured wraparound-aware smoother for ellipse angles (camera_state['angle_filter'])."""
+    return make_angle_filter(camera_state['angle_filter'], **camera_state['angle_filter_params'])
+
+
+def camera_stats():
+    """Tracking timings plus per-consumer ring counters (read/dropped/torn/behind)."""
+    return {"timings": dict(tracking_timings),
+            "ring": frame_ring.stats() if frame_ring is not None else None,
+            "save": save_sink.stats() if save_sink is not None else None}
+
+
+def _finish_frame(ring, seq, slot, present, record, area, ellipse, angle_filter,
+                  scale=(1.0, 1.0)):
+    """
+    Updates blob_state and publishes the slot the tracking loop just filled. scale is
+    the (x, y) size of a tracked pixel in ROI pixels, for trackers on a resized frame.
+    """
+    now = time.time()
+    if ellipse is not None and scale != (1.0, 1.0):
+        ellipse = scale_ellipse(ellipse, *scale)
+    if area is not None:
+        blob_state['area'] = area * scale[0] * scale[1]
+    if ellipse is not None:
+        blob_state['angle'] = angle_filter.update(ellipse[2], now)
+    ring.publish(seq, slot, present, {
+        "time": now,
+        "record": record,
+        "area": blob_state['area'],
+        "angle": blob_state['angle'],
+    })
+
+
+def _report(frames):
+    every = camera_state['timing_report_every']
+    if every and frames % every == 0:
+        print(f"[Camera] tracking timings: {format_timings(tracking_timings)}")
+        for name, s in frame_ring.stats()["readers"].items():
+            print(f"[Camera] ring reader '{name}': read={s['read']} dropped={s['dropped']} "
+                  f"torn={s['torn']} behind={s['behind']}")
+        if save_sink is not None:
+            print(f"[Camera] save: {save_sink.stats()}")
 
 
 # --- Thread 1: Lean Ellipse Tracking (60Hz) ---
-def ellipse_tracking_loop(picam2, roi, stop_event_flag, frame_event):
+def ellipse_tracking_loop(picam2, roi, stop_event_flag, ring, save_gate=None, lores=None):
     """
     Captures frames and calculates ellipse data. Does NO drawing.
     This is the lean "producer" thread.
     """
+    if lores is not None:
+        return lores_tracking_loop(picam2, lores, stop_event_flag, ring, save_gate)
+    if camera_state['tracking_mode'] == 'fast':
+        return fast_tracking_loop(picam2, roi, stop_event_flag, ring, save_gate)
+
     x, y, w, h = roi
-    angle_history = []
-    
+    angle_filter = new_angle_filter()
+    frames = 0
+
     print("Ellipse tracking thread started.")
     while not stop_event_flag.is_set():
         loop_start_time = time.time()
@@ -85,106 +133,266 @@ def ellipse_tracking_loop(picam2, roi, stop_event_flag, frame_event):
         _, binary = cv2.threshold(masked_gray, 125, 75, cv2.THRESH_BINARY)
         contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-        # Drawing data is kept as None so the GUI thread doesn't draw it
-        contour_to_draw, ellipse_to_draw, center_to_draw = None, None, None
-
+        area, ellipse = None, None
         if contours:
             largest_contour = max(contours, key=cv2.contourArea)
-            # contour_to_draw = largest_contour # This remains commented out
-            
-            blob_state['area'] = cv2.contourArea(largest_contour)
-            
+            area = cv2.contourArea(largest_contour)
+
             # --- Center calculation (using moments) is now commented out ---
             # M = cv2.moments(largest_contour)
             # if M["m00"] != 0:
             #     cx = int(M["m10"] / M["m00"])
             #     cy = int(M["m01"] / M["m00"])
             #     blob_state['center'] = [cx, cy]
-            #     # center_to_draw = (cx, cy) # This remains commented out
             # --- End of center calculation block ---
 
             if len(largest_contour) >= 5:
-                ellipse = cv2.fitEllipse(largest_contour)
-                if ellipse[1][0] > 0 and ellipse[1][1] > 0:
-                    smoothed_angle = smooth_angle(ellipse[2], angle_history)
-                    # ANGLE CALCULATION IS NOW ACTIVE
-                    blob_state['angle'] = smoothed_angle
-                    # ellipse_to_draw = ellipse # This remains commented out
-        
+                fitted = cv2.fitEllipse(largest_contour)
+                if fitted[1][0] > 0 and fitted[1][1] > 0:
+                    ellipse = fitted
+
         # --- End of processing block ---
 
-        with data_lock:
-            shared_data["original_frame"] = full_frame
-            shared_data["raw_roi_frame"] = roi_frame
-            shared_data["contour_to_draw"] = contour_to_draw
-            shared_data["ellipse_to_draw"] = ellipse_to_draw
-            shared_data["center_to_draw"] = center_to_draw
-        
-        frame_event.set()
+        seq, slot = ring.begin()
+        np.copyto(ring.buffer(slot, "full"), full_frame)
+        np.copyto(ring.buffer(slot, "roi"), roi_frame)
+        record = save_gate is None or save_gate()
+        _finish_frame(ring, seq, slot, ("full", "roi"), record, area, ellipse, angle_filter)
+        frames += 1
+        _report(frames)
 
         elapsed_time = time.time() - loop_start_time
         sleep_duration = max(0, (1/60) - elapsed_time)
         time.sleep(sleep_duration)
-    
+
     print("Ellipse tracking thread finished.")
 
 
-# --- Thread 2: GUI Updates, Drawing & Save Dispatch ---
-def recording_gui_loop(save_path, running_pin, stop_event_flag, frame_event):
+def fast_tracking_loop(picam2, roi, stop_event_flag, ring, save_gate=None):
     """
-    Waits for new data, performs drawing operations for the GUI,
-    and dispatches the original frame to the save queue.
+    Same outputs as the legacy loop, without per-frame allocations:
+    - the ROI is analysed in place inside the camera buffer (MappedArray), so
+      only the ROI is read; the full frame is copied into the ring only when
+      save_gate() says it is going to be saved
+    - the circular mask is built once per ROI and all OpenCV calls write into
+      preallocated buffers via dst=
+    Per-stage timings are kept in tracking_timings and printed periodically.
     """
-    frame_counter = -1
-    print("Recording/GUI thread started.")
+    x, y, w, h = roi
+    bufs = make_tracking_buffers(h, w)
+    angle_filter = new_angle_filter()
+    frames = 0
+
+    print("Ellipse tracking thread started (fast mode).")
+    while not stop_event_flag.is_set():
+        loop_start_time = time.time()
+        t0 = time.perf_counter()
+
+        request = picam2.capture_request()
+        try:
+            record_timing(tracking_timings, "capture", time.perf_counter() - t0)
+            with MappedArray(request, "main") as mapped:
+                roi_view = mapped.array[y:y + h, x:x + w]
+                area, ellipse = analyse_rgb(roi_view, bufs, camera_state['threshold'],
+                                            tracking_timings)
+                seq, slot = ring.begin()
+                np.copyto(ring.buffer(slot, "roi"), roi_view)
+                present = ("roi",)
+                record = save_gate is None or save_gate()
+                if record:
+                    np.copyto(ring.buffer(slot, "full"), mapped.array)
+                    present = ("full", "roi")
+        finally:
+            request.release()
+
+        _finish_frame(ring, seq, slot, present, record, area, ellipse, angle_filter)
+
+        record_timing(tracking_timings, "total", time.perf_counter() - t0)
+        frames += 1
+        _report(frames)
+
+        elapsed_time = time.time() - loop_start_time
+        sleep_duration = max(0, (1/60) - elapsed_time)
+        time.sleep(sleep_duration)
+
+    print("Ellipse tracking thread finished.")
+
+
+def lores_tracking_loop(picam2, lores, stop_event_flag, ring, save_gate=None):
+    """
+    Hardware-ROI variant of fast_tracking_loop. The sensor crop (ScalerCrop) already
+    equals the ROI, so the whole lores YUV420 frame is the ROI and its Y plane is used
+    directly as the grayscale image (no cvtColor). The full-resolution main stream is
+    only copied out for frames save_gate() lets through.
+    """
+    lw, lh = lores["size"]
+    bufs = make_tracking_buffers(lh, lw)
+    angle_filter = new_angle_filter()
+    frames = 0
 
+    print(f"Ellipse tracking thread started (lores {lw}x{lh}).")
     while not stop_event_flag.is_set():
-        frame_event.wait() 
-        if stop_event_flag.is_set(): break
-
-        with data_lock:
-            is_recording = running_pin.is_active
-            frame_to_save = shared_data.get("original_frame")
-            raw_roi_frame = shared_data.get("raw_roi_frame")
-            contour = shared_data.get("contour_to_draw")
-            ellipse = shared_data.get("ellipse_to_draw")
-            center = shared_data.get("center_to_draw")
-            frame_event.clear()
-
-        # --- Perform Drawing Here, Offloading from Tracking Thread ---
-        if raw_roi_frame is not None:
-            # Convert to BGR for OpenCV drawing functions
-            roi_bgr = cv2.cvtColor(raw_roi_frame, cv2.COLOR_RGB2BGR)
-            
-            # NOTE: Drawing is skipped automatically when contour, ellipse, etc. are None
-            if contour is not None:
-                cv2.drawContours(roi_bgr, [contour], -1, (0, 0, 255), 2)
-            if ellipse is not None:
-                cv2.ellipse(roi_bgr, ellipse, (255, 0, 255), 2)
-            if center is not None:
-                cv2.circle(roi_bgr, center, 5, (255, 255, 255), -1)
-
-            # Convert back to RGB for PIL and send to GUI
-            pil_img = Image.fromarray(cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2RGB))
-            try:
-                while not video_queue.empty():
-                    video_queue.get_nowait()
-                video_queue.put_nowait(pil_img)
-            except (queue.Full, queue.Empty):
-                pass
-
-        # --- Dispatch Original, Un-drawn Frame for Saving ---
-        if is_recording and frame_to_save is not None and location_state['flag']:
-            frame_counter += 1
-            now = datetime.now()
-            formatted_time = now.strftime("%Y-%m-%d_%H-%M-%S") + f"_{now.microsecond // 1000:03d}"
-            img_name = f"frame_{frame_counter:04d}_{formatted_time}.jpg"
-            filename = os.path.join(save_path, img_name)
-            
-            frame_bgr = cv2.cvtColor(frame_to_save, cv2.COLOR_RGB2BGR)
-            save_queue.put((filename, frame_bgr))
-        
-    print("Recording/GUI thread finished.")
+        loop_start_time = time.time()
+        t0 = time.perf_counter()
+
+        request = picam2.capture_request()
+        try:
+            record_timing(tracking_timings, "capture", time.perf_counter() - t0)
+            seq, slot = ring.begin()
+            with MappedArray(request, "lores") as mapped:
+                y_plane = mapped.array[:lh, :lw]
+                area, ellipse = analyse_gray(y_plane, bufs, camera_state['threshold'],
+                                             tracking_timings)
+                np.copyto(ring.buffer(slot, "roi"), y_plane)
+            present = ("roi",)
+            record = save_gate is None or save_gate()
+            if record:
+                with MappedArray(request, "main") as mapped:
+                    np.copyto(ring.buffer(slot, "full"), mapped.array)
+                present = ("full", "roi")
+        finally:
+            request.release()
+
+        # Area and angle are reported in main-stream ROI pixels, as the other tracking modes do
+        _finish_frame(ring, seq, slot, present, record, area, ellipse, angle_filter,
+                      lores["scale"])
+
+        record_timing(tracking_timings, "total", time.perf_counter() - t0)
+        frames += 1
+        _report(frames)
+
+        elapsed_time = time.time() - loop_start_time
+        sleep_duration = max(0, (1/60) - elapsed_time)
+        time.sleep(sleep_duration)
+
+    print("Ellipse tracking thread finished.")
+
+
+def _even(v):
+    return max(2, int(v) - int(v) % 2)
+
+
+def configure_hardware_roi(picam2, roi, main_size=(1280, 720)):
+    """
+    Reconfigures the camera so the sensor crop (ScalerCrop) is the selected ROI.
+    Both streams then only carry the ROI: main is scaled to fit within main_size and a
+    small YUV420 lores stream (longest side camera_state['lores_max_side']) is added
+    for tracking. Both are sized to the ROI's aspect ratio, but align_configuration()
+    may round the lores size so that it no longer matches exactly; the x and y scales
+    back to ROI pixels are returned separately so the tracker can correct area and
+    angle. Returns the lores description used by lores_tracking_loop.
+    """
+    x, y, w, h = roi
+    # ScalerCrop is in sensor pixel coordinates; map the ROI (selected on the
+    # main stream) through the crop that produced that main stream.
+    cx, cy, cw, ch = picam2.capture_metadata()["ScalerCrop"]
+    sx, sy = cw / main_size[0], ch / main_size[1]
+    crop = (int(cx + x * sx), int(cy + y * sy), int(w * sx), int(h * sy))
+
+    fit = min(main_size[0] / w, main_size[1] / h)
+    main = (_even(w * fit), _even(h * fit))
+    shrink = min(1.0, camera_state['lores_max_side'] / max(w, h))
+    lores_size = (_even(w * shrink), _even(h * shrink))
+
+    picam2.stop()
+    config = picam2.create_video_configuration(
+        main={"size": main, "format": "RGB888"},
+        lores={"size": lores_size, "format": "YUV420"},
+        controls={"FrameRate": 60, "AnalogueGain": 8.0, "ExposureTime": 10000,
+                  "ScalerCrop": crop}
+    )
+    picam2.align_configuration(config)
+    picam2.configure(config)
+    picam2.start()
+    picam2.set_controls({"ScalerCrop": crop})
+
+    lores_size = tuple(config["lores"]["size"])
+    main = tuple(config["main"]["size"])
+    print(f"[Camera] hardware ROI: ScalerCrop={crop} main={main} lores={lores_size}")
+    return {"size": lores_size, "main_size": main,
+            "scale": (w / lores_size[0], h / lores_size[1])}
+
+
+# --- Thread 2: Save Dispatch ---
+def recording_loop(sink, reader, stop_event_flag, gaps_path):
+    """
+    Reads every frame in order and dispatches the original, un-drawn frames the
+    tracker marked for recording to the save sink. Sequence gaps (frames the
+    ring overwrote before they could be read) are logged to frame_gaps.csv so
+    saved data can be checked for holes.
+    """
+    frame_counter = -1
+    last_seq = None
+    print("Recording thread started.")
+
+    with open(gaps_path, "a", buffering=1) as gaps_file:
+        if gaps_file.tell() == 0:
+            gaps_file.write("epoch_s,last_seq,next_seq,missing,recording\n")
+
+        while not stop_event_flag.is_set():
+            if not reader.wait(timeout=0.5):
+                continue
+            item = reader.read_next()
+            if item is None:
+                continue
+            seq, meta, arrays = item
+
+            if last_seq is not None and seq != last_seq + 1:
+                missing = seq - last_seq - 1
+                gaps_file.write(f"{meta['time']:.6f},{last_seq},{seq},{missing},{int(meta['record'])}\n")
+                print(f"[Camera] recorder missed {missing} frame(s) before seq {seq}")
+            last_seq = seq
+
+            # --- Dispatch Original, Un-drawn Frame for Saving ---
+            frame_to_save = arrays.get("full")
+            if meta["record"] and frame_to_save is not None and location_state['flag']:
+                frame_counter += 1
+                sink.submit(frame_counter, meta["time"], frame_to_save)
+
+    print("Recording thread finished.")
+
+
+class QueueSink:
+    """Original save path: convert here, then cv2.imwrite in the single save_worker thread."""
+    def __init__(self, save_dir):
+        self.save_dir = save_dir
+
+    def submit(self, index, epoch, frame_rgb):
+        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+        save_queue.put((frame_filename(self.save_dir, index, epoch), frame_bgr))
+        return True
+
+    def stats(self):
+        return {"queue_depth": save_queue.qsize()}
+
+    def close(self):
+        save_queue.join()
+
+
+def make_save_sink(save_dir, frame_shape, roi=None):
+    if camera_state['save_backend'] == 'spool':
+        video = camera_state['spool_target'] == 'video'
+        return SpoolSink(os.path.join(file_state['CURRENT_DIR'], "spool"), frame_shape,
+                         is_running=lambda: running_signal.is_active,
+                         save_dir=os.path.join(file_state['CURRENT_DIR'], "video") if video else save_dir,
+                         target=camera_state['spool_target'],
+                         capacity=camera_state['spool_capacity'],
+                         roi=roi if camera_state['spool_roi_only'] else None,
+                         quality=camera_state['jpeg_quality'],
+                         subsampling=camera_state['jpeg_subsampling'])
+    if camera_state['save_backend'] == 'video':
+        return SegmentedMjpegSink(os.path.join(file_state['CURRENT_DIR'], "video"),
+                                  segment_frames=camera_state['segment_frames'],
+                                  quality=camera_state['jpeg_quality'],
+                                  subsampling=camera_state['jpeg_subsampling'])
+    if camera_state['save_backend'] == 'pool':
+        return EncoderPool(save_dir, frame_shape,
+                           workers=camera_state['encoder_workers'],
+                           slots=camera_state['encoder_slots'],
+                           policy=camera_state['encoder_policy'],
+                           quality=camera_state['jpeg_quality'],
+                           subsampling=camera_state['jpeg_subsampling'])
+    return QueueSink(save_dir)
 
 # --- Thread 3: Asynchronous Save Worker ---
 def save_worker(stop_event_flag):
@@ -195,10 +403,16 @@ def save_worker(stop_event_flag):
     while not stop_event_flag.is_set() or not save_queue.empty():
         try:
             filename, frame_bgr = save_queue.get(timeout=1)
-            cv2.imwrite(filename, frame_bgr)
-            save_queue.task_done()
         except queue.Empty:
             continue
+        try:
+            if not cv2.imwrite(filename, frame_bgr):
+                print(f"Could not write {filename}")
+        except cv2.error as e:
+            print(f"Could not write {filename}: {e}")
+        finally:
+            # QueueSink.close() joins the queue, so a failed write must still count
+            save_queue.task_done()
     print("Save worker thread finished.")
 
 
@@ -207,6 +421,8 @@ def start_camera_loop():
     """
     Initializes the camera, sets up the ROI, and starts all processing threads.
     """
+    global frame_ring, save_sink
+
     picam2 = Picamera2()
     config = picam2.create_video_configuration(
         main={"size": (1280, 720), "format": "RGB888"},
@@ -216,44 +432,73 @@ def start_camera_loop():
     picam2.start()
     time.sleep(1)
 
-    frame = picam2.capture_array()
-    roi = cv2.selectROI("Select Top of Drum", frame, showCrosshair=True, fromCenter=False)
-    cv2.destroyWindow("Select Top of Drum")
+    roi = camera_state['roi']
+    if roi is None:
+        frame = picam2.capture_array()
+        roi = cv2.selectROI("Select Top of Drum", frame, showCrosshair=True, fromCenter=False)
+        cv2.destroyWindow("Select Top of Drum")
     if not any(roi):
         print("No ROI selected. Exiting.")
         picam2.stop()
         return
 
+    x, y, w, h = roi
+    lores = None
+    if camera_state['hardware_roi']:
+        lores = configure_hardware_roi(picam2, roi)
+        main_w, main_h = lores["main_size"]
+        roi_shape = (lores["size"][1], lores["size"][0])
+    else:
+        main_w, main_h = config["main"]["size"]
+        roi_shape = (h, w, 3)
+
+    # Keep the ROI with the session so offline analysis can re-run the tracker.
+    # Recorded frames are already just the ROI with the hardware crop or an ROI-only spool.
+    frames_are_roi = lores is not None or (camera_state['save_backend'] == 'spool'
+                                           and camera_state['spool_roi_only'])
+    with open(os.path.join(file_state['CURRENT_DIR'], "roi.json"), "w") as f:
+        json.dump({"roi": [int(v) for v in roi], "frames_are_roi": frames_are_roi,
+                   "threshold": camera_state['threshold']}, f)
+
+    frame_ring = FrameRing({
+        "full": ((main_h, main_w, 3), np.uint8),
+        "roi": (roi_shape, np.uint8),
+    }, slots=camera_state['ring_slots'])
+    # Starts the encoder processes (from a forkserver, so the threads already running are not copied)
+    save_sink = make_save_sink(image_save_dir, (main_h, main_w, 3), None if lores else roi)
+
     # --- Create and Start All Threads ---
     tracking_thread = threading.Thread(
-        target=ellipse_tracking_loop, 
-        args=(picam2, roi, stop_event, frame_ready_event)
+        target=ellipse_tracking_loop,
+        args=(picam2, roi, stop_event, frame_ring),
+        kwargs={"save_gate": lambda: running_signal.is_active and location_state['flag'],
+                "lores": lores}
     )
     recording_thread = threading.Thread(
-        target=recording_gui_loop, 
-        args=(image_save_dir, running_signal, stop_event, frame_ready_event)
-    )
-    save_thread = threading.Thread(
-        target=save_worker,
-        args=(stop_event,)
+        target=recording_loop,
+        args=(save_sink, frame_ring.reader("recorder", ["full"]), stop_event,
+              os.path.join(file_state['CURRENT_DIR'], "frame_gaps.csv"))
     )
-    
-    tracking_thread.start()
-    recording_thread.start()
-    save_thread.start()
+    # The GUI pulls the newest ROI frame itself at its own preview rate
+    set_preview_source(frame_ring.reader("preview", ["roi"]))
+    threads = [tracking_thread, recording_thread]
+    if isinstance(save_sink, QueueSink):
+        threads.append(threading.Thread(target=save_worker, args=(stop_event,)))
+
+    for t in threads:
+        t.start()
 
     try:
-        while all(t.is_alive() for t in [tracking_thread, recording_thread, save_thread]):
+        while all(t.is_alive() for t in threads):
             time.sleep(0.5)
     except KeyboardInterrupt:
         print("\nShutdown signal received. Stopping threads...")
     finally:
         # --- Graceful Shutdown ---
         stop_event.set()
-        frame_ready_event.set() 
-        tracking_thread.join()
-        recording_thread.join()
-        save_thread.join()
+        for t in threads:
+            t.join()
+        save_sink.close()
         picam2.stop()
         cv2.destroyAllWindows()
-        print("Application has been shut down cleanly.")
\ No newline at end of file
+        print("Application has been shut down cleanly.")
@@ -0,0 +1,210 @@
+# encoder_pool.py — multi-process JPEG encoding for recorded frames
+#
+# Frames are copied once into a fixed set of shared-memory slots and encoded/written by
+# a pool of worker processes, so encoding runs on all cores instead of one GIL-bound
+# thread, and memory use is capped at `slots` frames whatever the disk does.
+# When every slot is busy the configured policy decides what happens:
+#   'block'        submit() waits for a slot (back-pressure onto the recorder/ring)
+#   'drop_oldest'  the oldest frame not yet picked up by a worker is discarded
+#   'decimate'     the incoming frame is discarded and only every n-th frame is
+#                  accepted from then on; n doubles while full and halves again as
+#                  the queue drains
+import multiprocessing as mp
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from camera.encoder_worker import FREE, QUEUED, encoder_process
+
+POLICIES = ("block", "drop_oldest", "decimate")
+WORKER_CHECK_S = 1.0    # how often a submit() waiting for a slot checks that workers are alive
+SUBSAMPLING = {"444": "IMWRITE_JPEG_SAMPLING_FACTOR_444",
+               "422": "IMWRITE_JPEG_SAMPLING_FACTOR_422",
+               "420": "IMWRITE_JPEG_SAMPLING_FACTOR_420"}
+
+
+def frame_filename(save_dir, index, epoch):
+    """frame_XXXX_<local time with ms>.jpg, the naming used for every saved frame."""
+    now = datetime.fromtimestamp(epoch)
+    formatted_time = now.strftime("%Y-%m-%d_%H-%M-%S") + f"_{now.microsecond // 1000:03d}"
+    return os.path.join(save_dir, f"frame_{index:04d}_{formatted_time}.jpg")
+
+
+FRAME_NAME_RE = re.compile(r"frame_(\d+)_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_(\d{3})\.jpg$")
+
+
+def parse_frame_filename(name):
+    """Inverse of frame_filename: (frame index, epoch seconds), or None if it doesn't match."""
+    m = FRAME_NAME_RE.search(name)
+    if m is None:
+        return None
+    local = time.mktime(time.strptime(m.group(2), "%Y-%m-%d_%H-%M-%S"))
+    return int(m.group(1)), local + int(m.group(3)) / 1000
+
+
+def jpeg_params(quality=90, subsampling="420"):
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    # IMWRITE_JPEG_SAMPLING_FACTOR needs OpenCV >= 4.5.5; older builds use 4:2:0.
+    if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR") and subsampling in SUBSAMPLING:
+        params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, getattr(cv2, SUBSAMPLING[subsampling])]
+    return params
+
+
+class EncoderPool:
+    def __init__(self, save_dir, frame_shape, workers=3, slots=16, policy="block",
+                 quality=90, subsampling="420", max_decimation=8):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown encoder policy '{policy}', expected one of {POLICIES}")
+        self.save_dir = save_dir
+        self.policy = policy
+        self.max_decimation = max_decimation
+        self.slots = slots
+        shape = (slots,) + tuple(frame_shape)
+
+        # Workers come from a forkserver, not a fork of this process: by the time the
+        # recorder starts, the GUI, BLE and picamera2 threads are running and a fork
+        # would copy their locks mid-use. Everything a worker needs is passed by name
+        # or pickled (the shared memory, queues and slot arrays). The children still
+        # import the main script as __mp_main__, so it must not start anything on import.
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["camera.encoder_worker"])
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        self._frames = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._state = ctx.Array("b", slots, lock=False)
+        self._tickets = ctx.Array("l", slots, lock=False)
+        self._lock = ctx.Lock()
+        self._tasks = ctx.Queue()
+        self._done = ctx.Queue()
+
+        self._free = list(range(slots))
+        self._queued = {}           # slot -> ticket, in submission order
+        self._cond = threading.Condition()
+        self.metrics = {"submitted": 0, "encoded": 0, "failed": 0, "dropped": 0,
+                        "decimated": 0, "decimation": 1, "encode_ms": 0.0,
+                        "max_encode_ms": 0.0, "latency_ms": 0.0}
+        self._offered = 0
+
+        self._workers = [
+            ctx.Process(target=encoder_process, daemon=True,
+                        args=(self._shm.name, shape, self._tasks, self._done, self._state,
+                              self._tickets, self._lock, jpeg_params(quality, subsampling)))
+            for _ in range(workers)
+        ]
+        for p in self._workers:
+            p.start()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        print(f"[Encoder] {workers} workers, {slots} slots, policy={policy}, q={quality}, {subsampling}")
+
+    # --- producer side ---
+    def submit(self, index, epoch, frame_rgb):
+        """
+        Queues a frame for encoding. Returns False if the policy discarded it; raises
+        RuntimeError once every worker has exited, instead of waiting for a slot forever.
+        """
+        self._check_workers()
+        with self._cond:
+            self._offered += 1
+            decimation = self.metrics["decimation"]
+            if decimation > 1 and self._offered % decimation:
+                self.metrics["decimated"] += 1
+                return False
+            slot = self._acquire_slot()
+            if slot is None:
+                return False
+        np.copyto(self._frames[slot], frame_rgb)
+        with self._lock:
+            self._tickets[slot] += 1
+            ticket = self._tickets[slot]
+            self._state[slot] = QUEUED
+        with self._cond:
+            self._queued[slot] = ticket
+            self.metrics["submitted"] += 1
+        self._tasks.put((slot, ticket, frame_filename(self.save_dir, index, epoch),
+                         time.perf_counter()))
+        return True
+
+    def _acquire_slot(self):
+        # Called with self._cond held.
+        while not self._free:
+            if self.policy == "block":
+                self._wait_for_worker()
+            elif self.policy == "drop_oldest":
+                if not self._revoke_oldest():
+                    self._wait_for_worker()     # every slot is mid-encode; wait for one
+            else:
+                self.metrics["decimation"] = min(self.max_decimation,
+                                                 self.metrics["decimation"] * 2)
+                self.metrics["decimated"] += 1
+                return None
+        return self._free.pop()
+
+    def _wait_for_worker(self):
+        # Called with self._cond held. Only a worker frees a slot, so don't outwait them all
+        if not self._cond.wait(timeout=WORKER_CHECK_S):
+            self._check_workers()
+
+    def _check_workers(self):
+        if not any(p.is_alive() for p in self._workers):
+            codes = [p.exitcode for p in self._workers]
+            raise RuntimeError(f"all encoder workers have exited (exit codes {codes}); "
+                               f"frames can no longer be saved")
+
+    def _revoke_oldest(self):
+        for slot, ticket in list(self._queued.items()):
+            with self._lock:
+                if self._state[slot] == QUEUED and self._tickets[slot] == ticket:
+                    self._state[slot] = FREE
+                    revoked = True
+                else:
+                    revoked = False
+            if revoked:
+                del self._queued[slot]
+                self._free.append(slot)
+                self.metrics["dropped"] += 1
+                return True
+        return False
+
+    # --- completion side ---
+    def _collect(self, alpha=0.05):
+        while True:
+            item = self._done.get()
+            if item is None:
+                break
+            slot, ok, encode_s, submitted = item
+            with self._lock:
+                self._state[slot] = FREE
+            with self._cond:
+                self._queued.pop(slot, None)
+                self._free.append(slot)
+                m = self.metrics
+                m["encoded" if ok else "failed"] += 1
+                m["encode_ms"] += alpha * (encode_s * 1000 - m["encode_ms"])
+                m["max_encode_ms"] = max(m["max_encode_ms"], encode_s * 1000)
+                m["latency_ms"] += alpha * ((time.perf_counter() - submitted) * 1000 - m["latency_ms"])
+                if m["decimation"] > 1 and len(self._queued) < self.slots // 4:
+                    m["decimation"] //= 2
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            in_flight = self.slots - len(self._free)
+            queued = sum(1 for s in self._queued if self._state[s] == QUEUED)
+            return dict(self.metrics, queue_depth=queued, in_flight=in_flight)
+
+    def close(self):
+        """Lets the workers finish everything already queued, then releases the slots."""
+        for _ in self._workers:
+            self._tasks.put(None)
+        for p in self._workers:
+            p.join()
+        self._done.put(None)
+        self._collector.join()
+        del self._frames
+        self._shm.close()
+        self._shm.unlink()
+        print(f"[Encoder] closed: {self.stats()}")
@@ -0,0 +1,41 @@
+# encoder_worker.py — the process side of encoder_pool.EncoderPool
+#
+# Kept apart from encoder_pool (and from everything else in camera/) so that a worker
+# only ever imports numpy, cv2 and shared_memory: the workers are started from a
+# forkserver, which imports this module once, and must not pull in picamera2, gpiozero
+# or the GUI (their GPIO lines and windows belong to the parent).
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+FREE, QUEUED, ENCODING = 0, 1, 2
+
+
+def encoder_process(shm_name, shape, tasks, done, state, tickets, lock, params):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, ticket, filename, submitted = task
+            with lock:
+                # The parent may have revoked this slot (drop_oldest) before we got to it
+                if state[slot] != QUEUED or tickets[slot] != ticket:
+                    continue
+                state[slot] = ENCODING
+            t0 = time.perf_counter()
+            frame_bgr = cv2.cvtColor(frames[slot], cv2.COLOR_RGB2BGR)
+            ok, buf = cv2.imencode(".jpg", frame_bgr, params)
+            if ok:
+                try:
+                    with open(filename, "wb") as f:
+                        f.write(buf)
+                except OSError:
+                    ok = False
+            done.put((slot, ok, time.perf_counter() - t0, submitted))
+    finally:
+        del frames
+        shm.close()
@@ -0,0 +1,181 @@
+# fake_picamera2.py — replaying stand-in for Picamera2 so the camera pipeline runs off the Pi
+#
+# Select it with CAMERA_BACKEND=fake. Frames come from FAKE_CAMERA_FRAMES (a folder of
+# .jpg/.png/.npy files, e.g. a recorded session's images/ folder); without one a
+# synthetic rotating ellipse is generated. Only the parts of the Picamera2 API used
+# by camera_module are implemented: main (RGB888) and lores (YUV420) streams,
+# ScalerCrop, capture_array/capture_request and MappedArray.
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+DEFAULT_SENSOR_SIZE = (1280, 720)
+
+
+def _load_frames(frames_dir):
+    paths = sorted(glob.glob(os.path.join(frames_dir, "*.jpg")) +
+                   glob.glob(os.path.join(frames_dir, "*.png")) +
+                   glob.glob(os.path.join(frames_dir, "*.npy")))
+    if not paths:
+        raise FileNotFoundError(f"No .jpg/.png/.npy frames in {frames_dir}")
+    return paths
+
+
+def _read_frame(path):
+    if path.endswith(".npy"):
+        return np.load(path)
+    # Saved JPEGs were written as BGR from RGB frames; undo that to get back what
+    # capture_array() originally returned.
+    return cv2.cvtColor(cv2.imread(path, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def _synthetic_frame(index, size):
+    w, h = size
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    angle = (index * 3) % 180
+    cv2.ellipse(frame, ((w / 2, h / 2), (w / 6, w / 12), angle), (220, 220, 220), -1)
+    return frame
+
+
+class FakeRequest:
+    def __init__(self, arrays, metadata):
+        self._arrays = arrays
+        self._metadata = metadata
+
+    def make_array(self, name="main"):
+        return self._arrays[name].copy()
+
+    def get_metadata(self):
+        return dict(self._metadata)
+
+    def release(self):
+        self._arrays = None
+
+
+class MappedArray:
+    """Context manager mirroring picamera2.MappedArray: exposes the stream buffer as .array."""
+    def __init__(self, request, stream):
+        self._request = request
+        self._stream = stream
+        self.array = None
+
+    def __enter__(self):
+        self.array = self._request._arrays[self._stream]
+        return self
+
+    def __exit__(self, *exc):
+        self.array = None
+        return False
+
+
+class Picamera2:
+    def __init__(self, camera_num=0, frames_dir=None, loop=True):
+        frames_dir = frames_dir or os.environ.get("FAKE_CAMERA_FRAMES")
+        self._paths = _load_frames(frames_dir) if frames_dir else None
+        self._loop = loop
+        self._index = 0
+        first = _read_frame(self._paths[0]) if self._paths else None
+        h, w = first.shape[:2] if first is not None else DEFAULT_SENSOR_SIZE[::-1]
+        self.sensor_resolution = (w, h)
+        self.camera_properties = {
+            "PixelArraySize": (w, h),
+            "ScalerCropMaximum": (0, 0, w, h),
+        }
+        self._config = None
+        self._crop = (0, 0, w, h)
+        self._frame_period = 1 / 60
+        self._next_frame_time = 0.0
+        self.started = False
+
+    # --- configuration ---
+    def create_video_configuration(self, main=None, lores=None, controls=None, **_):
+        main = dict(main or {})
+        main.setdefault("size", DEFAULT_SENSOR_SIZE)
+        main.setdefault("format", "RGB888")
+        config = {"main": main, "lores": None, "controls": dict(controls or {})}
+        if lores is not None:
+            lores = dict(lores)
+            lores.setdefault("format", "YUV420")
+            config["lores"] = lores
+        return config
+
+    def align_configuration(self, config):
+        for name in ("main", "lores"):
+            stream = config.get(name)
+            if stream:
+                w, h = stream["size"]
+                stream["size"] = (w - w % 2, h - h % 2)
+
+    def configure(self, config):
+        if config.get("lores"):
+            lw, lh = config["lores"]["size"]
+            mw, mh = config["main"]["size"]
+            if lw > mw or lh > mh:
+                raise RuntimeError("lores stream must not be larger than main")
+        self._config = config
+        self.set_controls(config.get("controls", {}))
+
+    def set_controls(self, controls):
+        if "FrameRate" in controls:
+            self._frame_period = 1 / float(controls["FrameRate"])
+        if "ScalerCrop" in controls:
+            self._crop = tuple(int(v) for v in controls["ScalerCrop"])
+
+    def start(self):
+        self.started = True
+        self._next_frame_time = time.monotonic()
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.stop()
+
+    # --- capture ---
+    def _sensor_frame(self):
+        if self._paths is None:
+            frame = _synthetic_frame(self._index, self.sensor_resolution)
+        else:
+            if self._index >= len(self._paths):
+                if not self._loop:
+                    raise EOFError("Fake camera ran out of frames")
+                self._index = 0
+            frame = _read_frame(self._paths[self._index])
+        self._index += 1
+        return frame
+
+    def _wait_for_frame(self):
+        now = time.monotonic()
+        if self._next_frame_time > now:
+            time.sleep(self._next_frame_time - now)
+        self._next_frame_time = max(now, self._next_frame_time) + self._frame_period
+
+    def _render(self):
+        if not self.started:
+            raise RuntimeError("Camera has not been started")
+        self._wait_for_frame()
+        sensor = self._sensor_frame()
+        x, y, w, h = self._crop
+        cropped = sensor[y:y + h, x:x + w]
+        arrays = {"main": cv2.resize(cropped, tuple(self._config["main"]["size"]),
+                                     interpolation=cv2.INTER_AREA)}
+        lores = self._config.get("lores")
+        if lores:
+            small = cv2.resize(cropped, tuple(lores["size"]), interpolation=cv2.INTER_AREA)
+            arrays["lores"] = cv2.cvtColor(small, cv2.COLOR_RGB2YUV_I420)
+        metadata = {"ScalerCrop": self._crop, "SensorTimestamp": time.monotonic_ns(),
+                    "FrameDuration": int(self._frame_period * 1e6)}
+        return arrays, metadata
+
+    def capture_array(self, name="main"):
+        arrays, _ = self._render()
+        return arrays[name]
+
+    def capture_request(self):
+        return FakeRequest(*self._render())
+
+    def capture_metadata(self):
+        return {"ScalerCrop": self._crop, "SensorTimestamp": time.monotonic_ns(),
+                "FrameDuration": int(self._frame_period * 1e6)}
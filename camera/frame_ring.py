@@ -0,0 +1,136 @@
+# frame_ring.py — lock-free latest-frame ring between the tracker and its consumers
+#
+# One producer (the tracking thread) writes into a fixed set of preallocated slots and
+# never waits for anyone. Each consumer owns a RingReader that copies a slot out into
+# its own preallocated buffers and validates the copy with the slot's sequence number
+# (a seqlock): if the producer lapped the reader, or rewrote the slot mid-copy, the
+# frame is counted as dropped instead of being returned torn. Readers can follow every
+# frame (read_next, e.g. the saver) or jump to the newest one (read_latest, e.g. the
+# GUI preview), and all of them keep exact dropped-frame counters.
+import time
+import numpy as np
+
+_WRITING = -1
+
+
+class FrameRing:
+    def __init__(self, fields, slots=8):
+        """
+        fields: {name: (shape, dtype)} describing the arrays carried per frame.
+        A field that is not written for a frame is simply absent from that frame.
+        """
+        if slots < 3:
+            raise ValueError("FrameRing needs at least 3 slots")
+        self.slots = slots
+        self.fields = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in fields.items()}
+        self._buffers = {name: np.empty((slots,) + shape, dtype=dtype)
+                         for name, (shape, dtype) in self.fields.items()}
+        self._seq = [_WRITING] * slots
+        self._meta = [None] * slots
+        self._present = [()] * slots
+        self.head = -1          # sequence number of the newest published frame
+        self.readers = {}
+
+    # --- producer side ---
+    def begin(self):
+        """Claims the next slot and invalidates it for readers. Returns (seq, slot)."""
+        seq = self.head + 1
+        slot = seq % self.slots
+        self._seq[slot] = _WRITING
+        return seq, slot
+
+    def buffer(self, slot, name):
+        """The preallocated array for field `name` in `slot`, to be written in place."""
+        return self._buffers[name][slot]
+
+    def publish(self, seq, slot, present, meta=None):
+        """Makes a written slot visible. `present` lists the fields that were written."""
+        self._present[slot] = tuple(present)
+        self._meta[slot] = meta or {}
+        self._seq[slot] = seq
+        self.head = seq
+
+    # --- consumer side ---
+    def reader(self, name, fields=None):
+        """Creates (or returns) the named reader, copying out only `fields` (default: all)."""
+        if name not in self.readers:
+            self.readers[name] = RingReader(self, name, fields or list(self.fields))
+        return self.readers[name]
+
+    def stats(self):
+        return {"head": self.head,
+                "readers": {name: r.stats() for name, r in self.readers.items()}}
+
+
+class RingReader:
+    def __init__(self, ring, name, fields):
+        self.ring = ring
+        self.name = name
+        self._buffers = {f: np.empty(*ring.fields[f]) for f in fields}
+        self.next_seq = 0
+        self.read = 0
+        self.dropped = 0
+        self.torn = 0
+
+    def wait(self, timeout=None, poll=0.001):
+        """Polls (without locks) until a frame newer than the last one read exists."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.ring.head < self.next_seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def read_next(self):
+        """
+        Returns the oldest unread frame still held by the ring as (seq, meta, arrays),
+        or None if there is nothing new. Frames the producer overwrote first are
+        added to `dropped`.
+        """
+        head = self.ring.head
+        if head < self.next_seq:
+            return None
+        # The slot after head may already be being rewritten, so the oldest
+        # frame that is safe to start copying is head - slots + 2.
+        oldest = max(0, head - self.ring.slots + 2)
+        if self.next_seq < oldest:
+            self.dropped += oldest - self.next_seq
+            self.next_seq = oldest
+        return self._copy(self.next_seq)
+
+    def read_latest(self):
+        """Returns the newest frame, counting every unread frame it skips as dropped."""
+        head = self.ring.head
+        if head < self.next_seq:
+            return None
+        self.dropped += head - self.next_seq
+        self.next_seq = head
+        return self._copy(head)
+
+    def _copy(self, seq):
+        ring = self.ring
+        slot = seq % ring.slots
+        if ring._seq[slot] != seq:
+            return self._lost(seq)
+        present = ring._present[slot]
+        meta = ring._meta[slot]
+        arrays = {}
+        for name in present:
+            if name in self._buffers:
+                np.copyto(self._buffers[name], ring._buffers[name][slot])
+                arrays[name] = self._buffers[name]
+        if ring._seq[slot] != seq:
+            self.torn += 1
+            return self._lost(seq)
+        self.next_seq = seq + 1
+        self.read += 1
+        return seq, meta, arrays
+
+    def _lost(self, seq):
+        self.dropped += 1
+        self.next_seq = seq + 1
+        return None
+
+    def stats(self):
+        return {"read": self.read, "dropped": self.dropped, "torn": self.torn,
+                "behind": max(0, self.ring.head + 1 - self.next_seq)}
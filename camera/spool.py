@@ -0,0 +1,212 @@
+# spool.py — raw frame spool on the SSD with deferred compression
+#
+# For the highest capture rates nothing is encoded while the disk is spinning: frames are
+# copied raw into a preallocated, memory-mapped spool file (spool_XXXX.raw) and the kernel
+# writes the pages back in the background. When the motor stops (the running signal goes
+# inactive) the current spool is closed and a background thread compresses every closed
+# spool into JPEG files (images/) or a segmented MJPEG recording, then deletes it.
+#
+# Spool file layout:
+#   header (4096 bytes): magic | version | height | width | channels | capacity | count
+#   meta   (capacity x 12 bytes): frame number (u32) | epoch_s (f64)
+#   frames (capacity x h*w*c bytes, starting on a 4096-byte boundary)
+import glob
+import os
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from camera.encoder_pool import frame_filename, jpeg_params
+
+MAGIC = b"DSKSPOOL"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIII")
+HEADER_SIZE = 4096
+META_DTYPE = np.dtype([("frame", "<u4"), ("epoch", "<f8")])
+
+
+def _frames_offset(capacity):
+    meta_end = HEADER_SIZE + capacity * META_DTYPE.itemsize
+    return (meta_end + 4095) // 4096 * 4096
+
+
+class FrameSpool:
+    """One preallocated spool file, written in place through np.memmap."""
+    def __init__(self, path, frame_shape, capacity):
+        h, w, c = frame_shape if len(frame_shape) == 3 else (*frame_shape, 1)
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.capacity = capacity
+        self.count = 0
+        offset = _frames_offset(capacity)
+        size = offset + capacity * h * w * c
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, h, w, c, capacity, 0))
+            f.truncate(size)
+            # Reserve the blocks now so the hot path never waits on allocation
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+        # The header's count field is mapped too and advanced after every frame, so a
+        # crash (the pages are in the page cache either way) loses no spooled frame
+        self._count = np.memmap(path, dtype="<u4", mode="r+", offset=HEADER.size - 4, shape=(1,))
+        self._meta = np.memmap(path, dtype=META_DTYPE, mode="r+", offset=HEADER_SIZE, shape=(capacity,))
+        self._frames = np.memmap(path, dtype=np.uint8, mode="r+", offset=offset,
+                                 shape=(capacity,) + self.frame_shape)
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, index, epoch, frame):
+        np.copyto(self._frames[self.count], frame)
+        self._meta[self.count] = (index, epoch)
+        self.count += 1
+        # Only once the frame and its meta are in place
+        self._count[0] = self.count
+
+    def flush(self):
+        """Writes the pages back to the disk (they survive a process crash without this)."""
+        self._meta.flush()
+        self._frames.flush()
+        self._count.flush()
+
+    def close(self):
+        self.flush()
+        del self._count, self._meta, self._frames
+
+
+def open_spool(path):
+    """Read-only view of a closed spool: (meta, frames) arrays trimmed to the written count."""
+    with open(path, "rb") as f:
+        magic, version, h, w, c, capacity, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} frame spool")
+    shape = (h, w) if c == 1 else (h, w, c)
+    meta = np.memmap(path, dtype=META_DTYPE, mode="r", offset=HEADER_SIZE, shape=(capacity,))
+    frames = np.memmap(path, dtype=np.uint8, mode="r", offset=_frames_offset(capacity),
+                       shape=(capacity,) + shape)
+    return meta[:count], frames[:count]
+
+
+def compress_spool(path, target, save_dir, quality=90, subsampling="420"):
+    """
+    Compresses one spool. target='jpeg' writes frame_XXXX_<time>.jpg files into
+    save_dir; target='video' appends to a SegmentedMjpegSink in save_dir.
+    Returns the number of frames written.
+    """
+    meta, frames = open_spool(path)
+    if target == "video":
+        from camera.video_sink import SegmentedMjpegSink
+        sink = SegmentedMjpegSink(save_dir, quality=quality, subsampling=subsampling)
+        for (index, epoch), frame in zip(meta, frames):
+            sink.submit(int(index), float(epoch), frame)
+        sink.close()
+    else:
+        os.makedirs(save_dir, exist_ok=True)
+        params = jpeg_params(quality, subsampling)
+        for (index, epoch), frame in zip(meta, frames):
+            bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if frame.ndim == 3 else frame
+            cv2.imwrite(frame_filename(save_dir, int(index), float(epoch)), bgr, params)
+    return len(meta)
+
+
+class SpoolSink:
+    """
+    Save sink that spools raw frames and compresses them once the motor stops.
+    is_running: callable returning the running signal's state (GPIO16).
+    roi: optional (x, y, w, h) to spool only the ROI instead of full frames.
+    """
+    def __init__(self, spool_dir, frame_shape, is_running, save_dir, target="jpeg",
+                 capacity=1800, roi=None, flush_every=120, keep_spool=False,
+                 quality=90, subsampling="420"):
+        os.makedirs(spool_dir, exist_ok=True)
+        self.spool_dir = spool_dir
+        self.roi = roi
+        self.frame_shape = (roi[3], roi[2], frame_shape[2]) if roi else tuple(frame_shape)
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.is_running = is_running
+        self.save_dir = save_dir
+        self.target = target
+        self.keep_spool = keep_spool
+        self.quality = quality
+        self.subsampling = subsampling
+
+        # Spools left behind by an interrupted run are compressed at the next stop
+        existing = sorted(glob.glob(os.path.join(spool_dir, "spool_*.raw")))
+        self._next_id = max((int(os.path.basename(p)[6:10]) for p in existing), default=-1) + 1
+        self._spool = None
+        self._lock = threading.Lock()
+        self._pending = existing        # closed spools waiting for compression
+        self._stop = threading.Event()
+        self.metrics = {"spooled": 0, "spools": 0, "compressed": 0, "compress_s": 0.0,
+                        "write_ms": 0.0}
+
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+        print(f"[Spool] spooling raw {self.frame_shape} frames to {spool_dir}")
+
+    def submit(self, index, epoch, frame_rgb, alpha=0.05):
+        if self.roi:
+            x, y, w, h = self.roi
+            frame_rgb = frame_rgb[y:y + h, x:x + w]
+        t0 = time.perf_counter()
+        with self._lock:
+            if self._spool is None or self._spool.full:
+                self._rotate()
+                self._spool = FrameSpool(os.path.join(self.spool_dir, f"spool_{self._next_id:04d}.raw"),
+                                         self.frame_shape, self.capacity)
+                self._next_id += 1
+                self.metrics["spools"] += 1
+            self._spool.append(index, epoch, frame_rgb)
+            if self._spool.count % self.flush_every == 0:
+                self._spool.flush()
+        self.metrics["spooled"] += 1
+        self.metrics["write_ms"] += alpha * ((time.perf_counter() - t0) * 1000 - self.metrics["write_ms"])
+        return True
+
+    def _rotate(self):
+        # Called with self._lock held: close the active spool and queue it for compression
+        if self._spool is not None:
+            self._spool.close()
+            self._pending.append(self._spool.path)
+            self._spool = None
+
+    def _watch(self, period=0.2):
+        was_running = self.is_running()
+        while not self._stop.is_set():
+            running = self.is_running()
+            if was_running and not running:
+                print("[Spool] motor stopped; compressing spooled frames")
+                with self._lock:
+                    self._rotate()
+            if not running:
+                self.compress_pending()
+            was_running = running
+            self._stop.wait(period)
+
+    def compress_pending(self):
+        while self._pending:
+            path = self._pending.pop(0)
+            t0 = time.monotonic()
+            n = compress_spool(path, self.target, self.save_dir, self.quality, self.subsampling)
+            self.metrics["compressed"] += n
+            self.metrics["compress_s"] += time.monotonic() - t0
+            print(f"[Spool] compressed {n} frames from {os.path.basename(path)}")
+            if not self.keep_spool:
+                os.remove(path)
+            if self.is_running() and not self._stop.is_set():
+                break   # motor restarted; leave the rest for the next stop
+
+    def stats(self):
+        return dict(self.metrics, pending_spools=len(self._pending))
+
+    def close(self):
+        """Closes the active spool and compresses everything still pending."""
+        self._stop.set()
+        self._watcher.join()
+        with self._lock:
+            self._rotate()
+        self.compress_pending()
+        print(f"[Spool] closed: {self.stats()}")
@@ -0,0 +1,166 @@
+# video_sink.py — segmented MJPEG recording with a frame index, instead of one file per frame
+#
+# Frames are JPEG-encoded and appended to video/segment_XXXX.mjpeg (a plain MJPEG stream,
+# playable with `ffplay -f mjpeg`). A new segment starts every `segment_frames` frames or
+# `segment_bytes` bytes. video/index.bin holds one fixed-width record per frame:
+#   frame (u32) | epoch_s (f64) | segment (u16) | byte offset (u64) | length (u32)
+# so any frame can be pulled back out with one seek + read, without scanning folders.
+import os
+import queue
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from camera.encoder_pool import frame_filename, jpeg_params
+
+INDEX_RECORD = struct.Struct("<IdHQI")
+INDEX_DTYPE = np.dtype([("frame", "<u4"), ("epoch", "<f8"), ("segment", "<u2"),
+                        ("offset", "<u8"), ("length", "<u4")])
+assert INDEX_DTYPE.itemsize == INDEX_RECORD.size
+
+
+def segment_path(video_dir, segment):
+    return os.path.join(video_dir, f"segment_{segment:04d}.mjpeg")
+
+
+class SegmentedMjpegSink:
+    def __init__(self, video_dir, segment_frames=3600, segment_bytes=1 << 30,
+                 quality=90, subsampling="420", queue_size=32, flush_every=60):
+        os.makedirs(video_dir, exist_ok=True)
+        self.video_dir = video_dir
+        self.segment_frames = segment_frames
+        self.segment_bytes = segment_bytes
+        self.flush_every = flush_every
+        self._params = jpeg_params(quality, subsampling)
+        self._queue = queue.Queue(maxsize=queue_size)
+
+        # Continue after an existing index (e.g. a restarted session) rather than overwrite it
+        index_path = os.path.join(video_dir, "index.bin")
+        existing = read_index(video_dir) if os.path.exists(index_path) else None
+        self._segment = int(existing["segment"][-1]) + 1 if existing is not None and len(existing) else 0
+        self._index = open(index_path, "ab")
+        if existing is not None:
+            # Cut off a partial trailing record, or every record appended after it is misaligned
+            self._index.truncate(len(existing) * INDEX_RECORD.size)
+        self._segment_file = None
+        self._segment_count = 0
+        self._offset = 0
+        self.metrics = {"written": 0, "bytes": 0, "segments": 0, "encode_ms": 0.0}
+
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+        print(f"[Video] recording to {video_dir} (segments of {segment_frames} frames)")
+
+    def submit(self, index, epoch, frame_rgb):
+        # The caller's buffer is reused for the next frame, so queue a copy
+        self._queue.put((index, epoch, frame_rgb.copy()))
+        return True
+
+    def _open_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment += 1
+        self._segment_file = open(segment_path(self.video_dir, self._segment), "ab")
+        self._offset = self._segment_file.tell()
+        self._segment_count = 0
+        self.metrics["segments"] += 1
+
+    def _writer(self, alpha=0.05):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            index, epoch, frame_rgb = item
+            t0 = time.perf_counter()
+            ok, buf = cv2.imencode(".jpg", cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR), self._params)
+            self.metrics["encode_ms"] += alpha * ((time.perf_counter() - t0) * 1000 - self.metrics["encode_ms"])
+            if not ok:
+                print(f"[Video] failed to encode frame {index}")
+                continue
+            if (self._segment_file is None or self._segment_count >= self.segment_frames
+                    or self._offset + len(buf) > self.segment_bytes):
+                self._open_segment()
+            self._segment_file.write(buf)
+            self._index.write(INDEX_RECORD.pack(index, epoch, self._segment, self._offset, len(buf)))
+            self._offset += len(buf)
+            self._segment_count += 1
+            self.metrics["written"] += 1
+            self.metrics["bytes"] += len(buf)
+            if self.metrics["written"] % self.flush_every == 0:
+                self._segment_file.flush()
+                self._index.flush()
+
+    def stats(self):
+        return dict(self.metrics, queue_depth=self._queue.qsize())
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._index.close()
+        print(f"[Video] closed: {self.stats()}")
+
+
+# --- Random access ---
+def read_index(video_dir):
+    """The frame index as a structured NumPy array (fields: frame, epoch, segment, offset, length).
+
+    A record cut short by a crash mid-write is dropped.
+    """
+    path = os.path.join(video_dir, "index.bin")
+    count = os.path.getsize(path) // INDEX_RECORD.size
+    return np.fromfile(path, dtype=INDEX_DTYPE, count=count)
+
+
+class SegmentReader:
+    """Random-access frame extraction from a segmented MJPEG recording."""
+    def __init__(self, video_dir):
+        self.video_dir = video_dir
+        self.index = read_index(video_dir)
+        self._files = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def _file(self, segment):
+        f = self._files.get(segment)
+        if f is None:
+            f = self._files[segment] = open(segment_path(self.video_dir, segment), "rb")
+        return f
+
+    def read_jpeg(self, i):
+        """Encoded JPEG bytes of the i-th recorded frame."""
+        rec = self.index[i]
+        f = self._file(int(rec["segment"]))
+        f.seek(int(rec["offset"]))
+        return f.read(int(rec["length"]))
+
+    def read_frame(self, i, flags=cv2.IMREAD_COLOR):
+        """Decoded i-th frame in OpenCV's BGR order (or gray with IMREAD_GRAYSCALE)."""
+        return cv2.imdecode(np.frombuffer(self.read_jpeg(i), dtype=np.uint8), flags)
+
+    def position_at(self, epoch):
+        """Index position of the last frame captured at or before `epoch`."""
+        return max(0, int(np.searchsorted(self.index["epoch"], epoch, side="right")) - 1)
+
+    def export(self, positions, out_dir):
+        """
+        Writes the given frames out as individual frame_XXXX_<time>.jpg files (the
+        naming images/ uses), e.g. for the HTML report. Returns the file paths.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for i in positions:
+            rec = self.index[i]
+            path = frame_filename(out_dir, int(rec["frame"]), float(rec["epoch"]))
+            with open(path, "wb") as f:
+                f.write(self.read_jpeg(i))
+            paths.append(path)
+        return paths
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
@@ -6,25 +6,57 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 import time
-from queue import Queue
 import cv2
+from states import camera_state
 
-# Import the shared queues and stop_event from the BLE module
-from BLE.client.ble_plotter import data_queue_a0, data_queue_a1, stop_event
+# Import the shared sample rings and stop_event from the BLE module
+from BLE.client.ble_plotter import ring_a0, ring_a1, angle_bins, stop_event
 
 # --- PLOTTING Globals ---
-data_buffer_a0 = []
-data_buffer_a1 = []
-time_buffer = []
-buffer_size = 500  # Number of data points to display
+# 'blit': full redraws only on resize or when the data leaves the y-range; every other
+#         update restores the cached background and blits just the lines.
+# 'full': redraw the whole figure on every update.
+PLOT_MODE = "blit"
+PLOT_PERIOD_MS = 50
+Y_MARGIN = 50
+FRAME_TIME_WINDOW = 40  # updates in the rolling frame-time readout
+buffer_size = 5000  # Number of data points to display (the rings hold 131072)
+# Snapshot buffers, reused every update
+data_buffer_a0 = np.zeros(buffer_size, dtype=np.uint16)
+data_buffer_a1 = np.zeros(buffer_size, dtype=np.uint16)
+time_buffer = np.arange(buffer_size)
+last_head = 0
+background = None       # cached figure without the animated artists
+frame_times = np.zeros(FRAME_TIME_WINDOW)
+frame_count = 0
+
+# --- ANGLE HEATMAP Globals ---
+# Mean of one channel per (revolution, angle bin), straight from the BLE consumer's
+# running AngleBins (analysis/angle_bins.py): set_data() on its mean array, no
+# recomputation. It has its own canvas, so a refresh never invalidates the blit
+# background of the live plot.
+HEATMAP = False
+HEATMAP_PERIOD_MS = 1000
+HEATMAP_REVS = 200      # newest revolutions shown
+HEATMAP_CHANNEL = "a0"
+heat_samples = -1
 
 # --- VIDEO Globals ---
-video_queue = Queue()
+# The camera registers a FrameRing reader with set_preview_source(); update_video pulls
+# only the newest frame from it, at most preview_fps times a second, and converts and
+# scales just that one into a reused buffer shown through a single PhotoImage. Frames
+# are scaled by one factor and centred (letterboxed), so an ROI or lores stream that
+# isn't 4:3 keeps its shape and the ellipse its angle.
+DISPLAY_W, DISPLAY_H = 640, 480
+preview_reader = None
+preview_rgb = np.zeros((DISPLAY_H, DISPLAY_W, 3), dtype=np.uint8)   # scaled frame, reused
+preview_gray = np.zeros((DISPLAY_H, DISPLAY_W), dtype=np.uint8)     # for lores (Y plane) ROIs
+preview_box = None      # (frame shape, views of the two buffers it is scaled into)
 video_label = None
 tk_img = None # A global reference to prevent garbage collection
-DISPLAY_W, DISPLAY_H = 640, 480
 
 # --- Matplotlib and Tkinter Setup ---
+animated = PLOT_MODE == "blit"
 fig, ax = plt.subplots(1, 2, figsize=(10, 5))
 fig.suptitle("Live Data Stream from BLE Device", fontsize=16)
 
@@ -33,68 +65,154 @@ ax[0].set_title("Analog Channel 0")
 ax[0].set_xlabel("Data Point Index")
 ax[0].set_ylabel("Sensor Value")
 ax[0].grid(True)
-line_a0, = ax[0].plot([], [], 'r-')
+line_a0, = ax[0].plot([], [], 'r-', animated=animated)
 
 # Second subplot (A1 data)
 ax[1].set_title("Analog Channel 1")
 ax[1].set_xlabel("Data Point Index")
 ax[1].set_ylabel("Sensor Value")
 ax[1].grid(True)
-line_a1, = ax[1].plot([], [], color='#87CEEB')
+line_a1, = ax[1].plot([], [], color='#87CEEB', animated=animated)
+
+for axis in ax:
+    axis.set_xlim(0, buffer_size)
+frame_text = fig.text(0.01, 0.01, "", fontsize=8, color="gray", animated=animated)
+fig.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+def decimate(y, width_px):
+    """
+    Min/max decimation: with more samples than 2 per pixel column, each column is
+    drawn as its min and max, which looks the same as plotting every sample.
+    Returns (x, y).
+    """
+    n = len(y)
+    if width_px <= 0 or n <= 2 * width_px:
+        return time_buffer[:n], y
+    starts = np.linspace(0, n, width_px, endpoint=False).astype(np.intp)
+    ys = np.empty(2 * width_px, dtype=y.dtype)
+    ys[0::2] = np.minimum.reduceat(y, starts)
+    ys[1::2] = np.maximum.reduceat(y, starts)
+    return np.repeat(starts, 2), ys
+
+def extend_ylim(axis, y):
+    """Rescales the axis only if y left its current range; returns True if it did."""
+    if not len(y):
+        return False
+    lo, hi = axis.get_ylim()
+    y_min, y_max = int(y.min()), int(y.max())
+    if lo <= y_min and y_max <= hi:
+        return False
+    axis.set_ylim(y_min - Y_MARGIN, y_max + Y_MARGIN)
+    return True
+
+def record_frame_time(seconds):
+    """Adds one update's duration and refreshes the frame-time readout."""
+    global frame_count
+    frame_times[frame_count % FRAME_TIME_WINDOW] = seconds * 1000.0
+    frame_count += 1
+    recent = frame_times[:min(frame_count, FRAME_TIME_WINDOW)]
+    frame_text.set_text(f"plot ({PLOT_MODE}): {recent.mean():.1f} ms avg, {recent.max():.1f} ms max "
+                        f"/ {PLOT_PERIOD_MS} ms budget")
+
+def draw_animated():
+    fig.draw_artist(line_a0)
+    fig.draw_artist(line_a1)
+    fig.draw_artist(frame_text)
+
+def on_draw(_event):
+    """After every full draw: cache the background, then put the animated artists back."""
+    global background
+    if PLOT_MODE == "blit":
+        background = canvas.copy_from_bbox(fig.bbox)
+        draw_animated()
+
+def on_resize(_event):
+    fig.tight_layout(rect=[0, 0.03, 1, 0.95])
 
 def update_plot():
     """
-    Checks the queues for new data and updates both Matplotlib plots.
+    Snapshots the newest samples from the BLE rings and updates both Matplotlib plots.
     """
-    new_data_count = 0
-    while not data_queue_a0.empty() and not data_queue_a1.empty():
-        data_point_a0 = data_queue_a0.get()
-        data_point_a1 = data_queue_a1.get()
-        
-        data_buffer_a0.append(data_point_a0)
-        data_buffer_a1.append(data_point_a1)
-        time_buffer.append(len(time_buffer))
-        new_data_count += 1
-
-    if new_data_count > 0:
-        if len(data_buffer_a0) > buffer_size:
-            data_buffer_a0[:] = data_buffer_a0[-buffer_size:]
-            data_buffer_a1[:] = data_buffer_a1[-buffer_size:]
-            time_buffer[:] = list(range(len(data_buffer_a0)))
-
-        line_a0.set_xdata(time_buffer)
-        line_a0.set_ydata(data_buffer_a0)
-        line_a1.set_xdata(time_buffer)
-        line_a1.set_ydata(data_buffer_a1)
-
-        ax[0].set_xlim(0, buffer_size)
-        ax[1].set_xlim(0, buffer_size)
-        if data_buffer_a0:
-            ax[0].set_ylim(min(data_buffer_a0) - 50, max(data_buffer_a0) + 50)
-            ax[1].set_ylim(min(data_buffer_a1) - 50, max(data_buffer_a1) + 50)
-        
-        fig.tight_layout(rect=[0, 0, 1, 0.95])
-        canvas.draw_idle()
-
-    root.after(50, update_plot)
+    global last_head
+    head = ring_a0.head
+    if head != last_head:
+        t0 = time.perf_counter()
+        last_head = head
+        a0 = ring_a0.snapshot(buffer_size, out=data_buffer_a0)
+        a1 = ring_a1.snapshot(buffer_size, out=data_buffer_a1)
+        n = min(len(a0), len(a1))
+
+        rescaled = False
+        for axis, line, y in ((ax[0], line_a0, a0[-n:]), (ax[1], line_a1, a1[-n:])):
+            x, y = decimate(y, int(axis.bbox.width))
+            line.set_data(x, y)
+            rescaled |= extend_ylim(axis, y)
+
+        if PLOT_MODE == "blit" and background is not None and not rescaled:
+            canvas.restore_region(background)
+            draw_animated()
+            canvas.blit(fig.bbox)
+        else:
+            canvas.draw()   # in blit mode on_draw re-caches the background
+        record_frame_time(time.perf_counter() - t0)
+
+    root.after(PLOT_PERIOD_MS, update_plot)
+
+def update_heatmap():
+    """Shows the newest HEATMAP_REVS revolutions of the angle bins, if anything was added."""
+    global heat_samples
+    if angle_bins.samples != heat_samples:
+        heat_samples = angle_bins.samples
+        n = angle_bins.n_revs
+        first = max(0, n - HEATMAP_REVS)
+        data = angle_bins.mean[HEATMAP_CHANNEL][first:n]
+        heat_img.set_data(data)
+        heat_img.set_extent((0, 360, first, max(n, first + 1)))
+        finite = data[np.isfinite(data)]
+        if finite.size:
+            heat_img.set_clim(finite.min(), finite.max())
+        heat_canvas.draw_idle()
+
+    root.after(HEATMAP_PERIOD_MS, update_heatmap)
+
+def set_preview_source(reader):
+    """Called by the camera with the FrameRing reader ('roi' field) the preview shows."""
+    global preview_reader
+    preview_reader = reader
+
+def preview_views(shape):
+    """
+    (gray, rgb) views of the preview buffers a frame of this shape is scaled into: the
+    largest size with the frame's aspect ratio, centred. Recomputed when the shape changes.
+    """
+    global preview_box
+    if preview_box is None or preview_box[0] != shape:
+        h, w = shape[:2]
+        scale = min(DISPLAY_W / w, DISPLAY_H / h)
+        sw, sh = max(1, round(w * scale)), max(1, round(h * scale))
+        x0, y0 = (DISPLAY_W - sw) // 2, (DISPLAY_H - sh) // 2
+        preview_rgb[:] = 0     # the bars
+        preview_box = (shape, preview_gray[y0:y0 + sh, x0:x0 + sw], preview_rgb[y0:y0 + sh, x0:x0 + sw])
+    return preview_box[1], preview_box[2]
 
 def update_video():
-    """Checks the video queue and updates the video label with a new frame (resized)."""
-    global tk_img
-    if not video_queue.empty():
-        pil_img = None
-        # Drain queue so we always show the most recent frame
-        while not video_queue.empty():
-            pil_img = video_queue.get_nowait()
-
-        if pil_img is not None:
-            # Resize to fixed dimensions
-            pil_img = pil_img.resize((DISPLAY_W, DISPLAY_H), Image.Resampling.LANCZOS)
-            tk_img = ImageTk.PhotoImage(pil_img, master=video_label)
-            video_label.configure(image=tk_img)
-            video_label.image = tk_img  # keep ref
-
-    root.after(15, update_video)
+    """Shows the newest ROI frame from the camera ring, scaled to fit the display."""
+    reader = preview_reader
+    item = reader.read_latest() if reader is not None else None
+    if item is not None and "roi" in item[2]:
+        roi = item[2]["roi"]
+        gray, rgb = preview_views(roi.shape)
+        size = (rgb.shape[1], rgb.shape[0])
+        # cv2 writes straight into the views: no new array per frame
+        if roi.ndim == 2:
+            cv2.resize(roi, size, dst=gray, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB, dst=rgb)
+        else:
+            cv2.resize(roi, size, dst=rgb, interpolation=cv2.INTER_AREA)
+        # Same PhotoImage every time; paste() copies the pixels into it in place
+        tk_img.paste(Image.fromarray(preview_rgb))
+
+    root.after(max(1, int(1000 / camera_state['preview_fps'])), update_video)
 
 
 # Main control window
@@ -105,13 +223,32 @@ root.title("Live Data & Camera Feed")
 canvas = FigureCanvasTkAgg(fig, master=root)
 canvas_widget = canvas.get_tk_widget()
 canvas_widget.pack(fill=tk.BOTH, expand=True)
-
-video_label = tk.Label(root)
+canvas.mpl_connect("draw_event", on_draw)
+canvas.mpl_connect("resize_event", on_resize)
+
+if HEATMAP and angle_bins is not None:
+    heat_fig, heat_ax = plt.subplots(figsize=(10, 2.5))
+    heat_img = heat_ax.imshow(np.full((1, angle_bins.bins), np.nan), aspect="auto", origin="lower",
+                              interpolation="nearest", extent=(0, 360, 0, 1))
+    heat_ax.set_title(f"Mean {HEATMAP_CHANNEL} per angle bin")
+    heat_ax.set_xlabel("Disk angle (deg)")
+    heat_ax.set_ylabel("Revolution")
+    heat_fig.colorbar(heat_img, ax=heat_ax)
+    heat_fig.tight_layout()
+    heat_canvas = FigureCanvasTkAgg(heat_fig, master=root)
+    heat_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+else:
+    HEATMAP = False
+
+tk_img = ImageTk.PhotoImage("RGB", (DISPLAY_W, DISPLAY_H), master=root)
+video_label = tk.Label(root, image=tk_img)
 video_label.pack()
 
 def run_gui():
-    root.after(50, update_plot)
-    root.after(15, update_video)
+    root.after(PLOT_PERIOD_MS, update_plot)
+    root.after(0, update_video)
+    if HEATMAP:
+        root.after(HEATMAP_PERIOD_MS, update_heatmap)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -59,6 +59,18 @@ def get_readings(csv_path):
         df["image_path"] = df["Frame"].apply(
             lambda name: f"/images/{name.strip()}" if pd.notna(name) and name.strip() != "" else None
         )
+    elif "epoch_s" in df.columns:
+        # BLE logs have no Frame column: the frame nearest each row's first sample (device
+        # time, receipt time for rows without one), from the session index
+        from analysis.session_index import open_index, record_times
+        index = open_index(os.path.dirname(csv_path))
+        times = df["epoch_s"].to_numpy(dtype=float)
+        if "sample_t0_s" in df.columns:
+            times, _ = record_times(times, df["sample_t0_s"].to_numpy(dtype=float),
+                                    df["sample_dt_s"].to_numpy(dtype=float))
+        pos = index.frames_for_times(times)
+        df["image_path"] = [f"/images/{index.frame_names[p]}" if p >= 0 and index.frame_names[p] else None
+                            for p in pos.tolist()]
     else:
         print("ERROR: 'Frame' column missing")
         df["image_path"] = None
@@ -68,141 +80,11 @@ def get_readings(csv_path):
     return records
 
 def html_generator(dir, i):
-    import os
-
-    csv_path = os.path.join(dir, "readings.csv")
-    records = get_readings(csv_path)
-    html_path = os.path.join(dir, f"session{i}.html")
-
-    with open(html_path, "w") as f:
-        f.write(f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <title>Session {i} Data</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1">
-    <!-- Bootstrap + Styling -->
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-    .image-scroll {{
-        height: 88vh;
-        overflow-y: auto;
-        border: 1px solid #ccc;
-        padding: 10px 10px; /* extra vertical padding */
-        background-color: white;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        position: sticky; 
-        top: 0; 
-        right: 0;
-    }}
-    .image-scroll img {{
-        max-width: 100%;
-        margin: 3px 0;
-        border-radius: 5px;
-    }}
-    .image-wrapper {{
-        position: relative;
-        height: 100%;
-        width: 90%;
-    }}
-    .image-wrapper.highlight::before {{
-        content: "";
-        position: absolute;
-        top: -5px;
-        left: -5px;
-        right: -5px;
-        bottom: -5px;
-        # border: 3px solid #0d6efd;
-        # border-radius: 12px;
-        # box-shadow: 0 0 10px #0d6efd;
-        z-index: 1;
-    }}
-    .image-wrapper:not(.highlight) img {{
-        transform: scale(0.6);
-        opacity: 1;
-    }}
-    .image-wrapper.highlight img {{
-        transform: scale(0.8);
-        opacity: 1;
-        z-index: 2;
-    }}
-</style>
-
-</head>
-<body>
-<div class="container-fluid mt-4">
-    <h1 class="mb-4">Session {i} Data</h1>
-    <div class="row">
-        <!-- Data Table -->
-        <div class="col-md-8">
-            <table class="table table-bordered table-hover align-middle text-center" id="data-table">
-                <thead class="table-dark">
-                    <tr>
-                        <th>Timestamp</th>
-                        <th>Voltage (V)</th>
-                        <th>Angle (deg)</th>
-                    </tr>
-                </thead>
-                <tbody>
-""")
-
-        for idx, row in enumerate(records):
-            f.write(f"""<tr data-index="{idx}">
-    <td>{row['Timestamp']}</td>
-    <td>{row['Voltage (V)']}</td>
-    <td>{row['Angle (deg)']}</td>
-</tr>
-""")
-
-        f.write("""            </tbody>
-            </table>
-        </div>
-
-        <!-- Vertical Image Scroll -->
-        <div class="col-md-4">
-            <div class="image-scroll" id="image-list">
-""")
-
-        for idx, row in enumerate(records):
-            image = row.get("Frame", "").strip()
-            if image:
-                f.write(f"""
-<div class="image-wrapper" data-index="{idx}">
-    <img src="images/{image}" alt="Image {idx}">
-</div>
-""")
-
-        f.write("""            </div>
-        </div>
-    </div>
-</div>
-
-<!-- JS -->
-<script>
-    const rows = document.querySelectorAll("#data-table tbody tr");
-    const imageWrappers = document.querySelectorAll(".image-wrapper");
-    const imageList = document.getElementById("image-list");
-
-    rows.forEach(row => {
-        row.addEventListener("mouseenter", () => {
-            const index = row.getAttribute("data-index");
-
-            // Remove highlight from all
-            imageWrappers.forEach(div => div.classList.remove("highlight"));
-
-            // Add highlight to current image
-            const target = document.querySelector(`.image-wrapper[data-index='${index}']`);
-            if (target) {
-                target.classList.add("highlight");
-                const scrollTop = target.offsetTop - imageList.clientHeight / 2 + target.clientHeight / 2;
-                imageList.scrollTop = scrollTop;  // instant jump, no animation
-            }
-        });
-    });
-</script>
-
-</body>
-</html>""")
-
+    """
+    Writes session{i}.html (and further pages) for a session folder; streamed and
+    paginated by analysis/session_report.py.
+    """
+    from analysis.session_report import build_report
+
+    html_path, _, _ = build_report(dir, i)
+    return html_path
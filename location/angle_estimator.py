@@ -0,0 +1,137 @@
+# angle_estimator.py — disk angle at any timestamp from the step rate and index pulses
+#
+# The stepper is commanded at angles_per_step / (2 * delay) degrees per second
+# (motor_info_state), but integrating that from the start of a run drifts without bound
+# (missed steps, rate changes, timing jitter). The locator's index pulse (the
+# rev-clocking edge, see location_module.EdgeTracker) marks the same disk angle once
+# per revolution, so the estimate restarts from it every revolution:
+#
+#   angle(t) = index_angle + 360 * (t - last_index_time) / rev_period   (mod 360)
+#
+# rev_period is the measured period of the latest revolution; before the first full
+# revolution, or when the pulses have stopped for longer than `stale_revs` periods, the
+# commanded rate is used instead. With no index pulse at all it falls back to the
+# commanded rate from the start of the run, which is what the BLE logger used to do.
+#
+# AngleEstimator is the live, O(1) version (location_state is updated by the locator);
+# angles_at() does the same over a recorded session's epochs, where the next pulse is
+# known too, so each revolution is interpolated between its own two pulses. The live
+# estimator keeps the last few pulses it has seen, so a batch of samples that started
+# before the latest pulse is placed with angles_at() over those, like offline.
+import os
+from collections import deque
+import numpy as np
+from states import location_state, motor_info_state
+
+
+def commanded_rate(motor=motor_info_state):
+    """Commanded disk speed in degrees per second (one step is a high + low of `delay`)."""
+    return motor['angles_per_step'] / (2.0 * motor['delay'])
+
+
+class AngleEstimator:
+    def __init__(self, state=location_state, motor=motor_info_state, index_angle=0.0, stale_revs=2.0,
+                 pulse_history=8):
+        """
+        index_angle: disk angle (degrees) at which the index pulse fires.
+        stale_revs: revolutions without a pulse after which the measured period is
+                    no longer trusted.
+        pulse_history: index pulses kept for placing samples older than the latest one.
+        """
+        self.state = state
+        self.motor = motor
+        self.index_angle = index_angle
+        self.stale_revs = stale_revs
+        self.start_time = None      # fallback origin when no index pulse has been seen
+        self.pulses = deque(maxlen=pulse_history)
+
+    def _observe(self):
+        """Records the latest index pulse from state; returns (last_index_time, rev_period)."""
+        t_index = self.state['last_index_time']
+        if t_index is not None and (not self.pulses or self.pulses[-1] != t_index):
+            self.pulses.append(t_index)
+        return t_index, self.state['rev_period']
+
+    def _reference(self, t):
+        """(origin time, degrees per second) to extrapolate from at time t."""
+        t_index, period = self._observe()
+        if t_index is None:
+            if self.start_time is None:
+                self.start_time = t
+            return self.start_time, commanded_rate(self.motor)
+        if period and t - t_index <= self.stale_revs * period:
+            return t_index, 360.0 / period
+        return t_index, commanded_rate(self.motor)
+
+    def angle(self, t):
+        """Disk angle in [0, 360) at epoch time t."""
+        origin, rate = self._reference(t)
+        return (self.index_angle + (t - origin) * rate) % 360.0
+
+    def angles(self, times):
+        """
+        Vectorized angle(), with the reference chosen per time: times after the latest
+        index pulse extrapolate from it, earlier ones (a batch that spans a pulse) are
+        interpolated between the pulses seen so far with angles_at().
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if len(times) == 0:
+            return times.copy()
+        t_index, period = self._observe()
+        if t_index is None:
+            origin, rate = self._reference(float(times.min()))
+            return (self.index_angle + (times - origin) * rate) % 360.0
+        rate = np.full(len(times), commanded_rate(self.motor))
+        if period:
+            rate[times - t_index <= self.stale_revs * period] = 360.0 / period
+        out = (self.index_angle + (times - t_index) * rate) % 360.0
+        early = times < t_index
+        if early.any():
+            out[early], _ = angles_at(times[early], np.array(self.pulses), commanded_rate(self.motor),
+                                      self.index_angle)
+        return out
+
+    def reset(self):
+        self.start_time = None
+        self.pulses.clear()
+
+
+# --- Offline ---
+def load_index_pulses(session_dir):
+    """Index pulse epochs from a session's index_pulses.csv (empty if there is none)."""
+    path = os.path.join(session_dir, "index_pulses.csv")
+    if not os.path.exists(path):
+        return np.empty(0)
+    data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=(1,), ndmin=1)
+    return np.sort(data)
+
+
+def angles_at(times, pulse_times, rate=None, index_angle=0.0, origin=None):
+    """
+    Disk angle and revolution number for every epoch in `times`.
+    pulse_times: sorted index pulse epochs. Each revolution is interpolated between its
+    two pulses; times outside them are extrapolated with the nearest revolution's
+    period, or with `rate` (°/s, default: the commanded rate) if there is none.
+    origin: epoch of index_angle when there are no pulses at all (default: the first
+    time; pass the session start when converting a session in chunks).
+    Returns (angles in [0, 360), revs), where revs matches tracked_revs at that time.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    pulses = np.asarray(pulse_times, dtype=np.float64)
+    rate = commanded_rate() if rate is None else rate
+    revs = np.searchsorted(pulses, times, side="right")
+    if len(pulses) == 0:
+        t0 = origin if origin is not None else times.min() if len(times) else 0.0
+        return (index_angle + (times - t0) * rate) % 360.0, revs
+
+    if len(pulses) >= 2:
+        periods = np.diff(pulses)
+        # Period used for each time: its own revolution's, or the nearest one at the ends
+        per = periods[np.clip(revs - 1, 0, len(periods) - 1)]
+        deg_per_s = 360.0 / per
+    else:
+        deg_per_s = np.full(len(times), rate)
+    # Before the first pulse, count back from it
+    origin = pulses[np.maximum(revs - 1, 0)]
+    angles = (index_angle + (times - origin) * deg_per_s) % 360.0
+    return angles, revs
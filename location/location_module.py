@@ -1,28 +1,157 @@
-from gpiozero import OutputDevice, DigitalInputDevice
-from states import location_state
+from gpiozero import DigitalInputDevice
+from states import location_state, file_state
+import os
+import threading
 import time
+import numpy as np
 
-location = DigitalInputDevice(11, pull_up=False)
-flag = False
-
-# looks to see if the inductor is over screw on start up
-if location.is_active:
-    location_state['last_reading'] = True
-
-def locator():
-    while True:
-        if location.is_active:
-            if location_state['pin_count'] != 1 and not location_state['last_reading']:
-                location_state['pin_count'] += 1
-                if location_state['flag'] == False:
-                    location_state['flag'] = True
-                print('pin found!')
-            elif not location_state['last_reading']:
-                location_state['tracked_revs'] += 1
-                location_state['pin_count'] = 0
-                print(f"Rev Clocked. Total Revs: {location_state['tracked_revs']}")
-            location_state['last_reading'] = True
+# The inductive sensor is read through edge callbacks instead of a 50 ms poll, so no
+# pass of the pin is missed. Every edge is stamped with the pin factory's ticks for it
+# (taken by the driver with lgpio/pigpio), converted to epoch time in the callback, so
+# the delay before the callback thread runs does not end up in rev_period. The edge
+# logic lives in EdgeTracker, which knows nothing about GPIO: feed it on_edge(t)
+# directly, or wire it to a pin with start_locator() (gpiozero's MockFactory works for
+# testing: GPIOZERO_PIN_FACTORY=mock, then drive_high()/drive_low() the pin).
+#
+# As before, edges alternate: the first one of a pair is "pin found" (pin_count -> 1,
+# sets the flag), the second clocks a revolution (tracked_revs += 1, pin_count -> 0).
+# That second edge is the index pulse; each one is appended to index_pulses.csv in the
+# session directory.
+
+LOCATION_PIN = 11
+MAX_CALLBACK_LAG_S = 1.0    # an edge "older" than this by the factory's ticks is stamped with time.time()
+INDEX_PULSES_HEADER = "edge,epoch_s,rev,rev_period_s\n"
+edge_tracker = None     # the running locator's EdgeTracker, set by locator()
+
+
+class EdgeTracker:
+    def __init__(self, state=location_state, capacity=4096, debounce_s=0.002, log_path=None):
+        """
+        state: the dict updated on every edge (location_state).
+        capacity: edge timestamps kept in the ring (edges()).
+        debounce_s: edges closer than this to the previous one are ignored.
+        log_path: CSV the index pulses are appended to (None: no log).
+        """
+        self.state = state
+        self.capacity = capacity
+        self.debounce_s = debounce_s
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self.count = 0          # edges accepted so far
+        self.ignored = 0        # edges dropped by the debounce
+        self._log = None
+        self.pin_callback = None    # set by start_locator()
+        if log_path is not None:
+            new = not os.path.exists(log_path)
+            self._log = open(log_path, "a", buffering=1)
+            if new:
+                self._log.write(INDEX_PULSES_HEADER)
+
+    def on_edge(self, t):
+        """One rising edge of the sensor at epoch time t."""
+        state = self.state
+        if self.count and t - self._times[(self.count - 1) % self.capacity] < self.debounce_s:
+            self.ignored += 1
+            return
+        self._times[self.count % self.capacity] = t
+        self.count += 1
+
+        # Same-parity edges are one revolution apart, whatever the spacing within a pair
+        if self.count >= 3:
+            period = t - self._times[(self.count - 3) % self.capacity]
+            if period > 0:
+                state['rev_period'] = period
+                state['rpm'] = 60.0 / period
+
+        if state['pin_count'] != 1:
+            state['pin_count'] += 1
+            if state['flag'] == False:
+                state['flag'] = True
+            print('pin found!')
+        else:
+            state['tracked_revs'] += 1
+            state['pin_count'] = 0
+            state['last_index_time'] = t
+            print(f"Rev Clocked. Total Revs: {state['tracked_revs']}")
+            if self._log is not None:
+                period = state['rev_period']
+                self._log.write(f"{self.count - 1},{t:.6f},{state['tracked_revs']},"
+                                f"{'' if period is None else f'{period:.6f}'}\n")
+        state['last_edge_time'] = t
+        state['edge_count'] = self.count
+        state['last_reading'] = True
+
+    def on_release(self):
+        self.state['last_reading'] = False
+
+    def edges(self, n=None):
+        """The newest min(n, available) edge timestamps, oldest first."""
+        n_avail = min(self.count, self.capacity) if n is None else min(n, self.count, self.capacity)
+        idx = (self.count - n_avail + np.arange(n_avail)) % self.capacity
+        return self._times[idx]
+
+    def phase(self, t=None):
+        """
+        Disk angle in degrees since the last index pulse at time t (default: now),
+        extrapolated with the latest revolution period; None until that is known.
+        """
+        t0, period = self.state['last_index_time'], self.state['rev_period']
+        if t0 is None or period is None:
+            return None
+        t = time.time() if t is None else t
+        return (t - t0) / period * 360.0 % 360.0
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def edge_epoch(factory, ticks, now=None):
+    """
+    Epoch time of an edge from the pin factory's ticks for it: the callback's time.time()
+    less how long ago the edge was by the factory's own clock. Falls back to the
+    callback's time if that is negative or implausibly long (a factory whose ticks are
+    on another clock than its ticks()).
+    """
+    now = time.time() if now is None else now
+    lag = factory.ticks_diff(factory.ticks(), ticks)
+    return now - lag if 0.0 <= lag <= MAX_CALLBACK_LAG_S else now
+
+
+def start_locator(pin=LOCATION_PIN, log_path=None, **tracker_kwargs):
+    """Wires an EdgeTracker to the sensor pin; returns (device, tracker)."""
+    tracker = EdgeTracker(log_path=log_path, **tracker_kwargs)
+    device = DigitalInputDevice(pin, pull_up=False)
+    # looks to see if the inductor is over screw on start up
+    if device.is_active:
+        tracker.state['last_reading'] = True
+    # Hooked on the pin rather than when_activated, whose callbacks don't get the ticks;
+    # the device's own handler still runs so its events and is_active stay current.
+    factory = device.pin_factory
+    device_changed = device.pin.when_changed
+
+    def on_change(ticks, state):
+        if state:
+            tracker.on_edge(edge_epoch(factory, ticks))
         else:
-            location_state['last_reading'] = False
-        time.sleep(0.05)
+            tracker.on_release()
+        if device_changed is not None:
+            device_changed(ticks, state)
+
+    # The pin only keeps a weak reference to its callback
+    tracker.pin_callback = on_change
+    device.pin.when_changed = on_change
+    return device, tracker
+
 
+def locator(stop_event=None):
+    """Starts the edge-driven locator and keeps it alive until stop_event is set."""
+    global edge_tracker
+    log_path = os.path.join(file_state['CURRENT_DIR'], "index_pulses.csv") if file_state['CURRENT_DIR'] else None
+    device, tracker = start_locator(log_path=log_path)
+    edge_tracker = tracker
+    try:
+        (stop_event or threading.Event()).wait()
+    finally:
+        device.close()
+        tracker.close()
@@ -1,34 +1,40 @@
 import tkinter as tk
 import threading, time, os, signal, sys, atexit
 from states import file_state
-from gui.gui_module import run_gui, update_plot
-from camera.camera_module import start_camera_loop
-from BLE.client.ble_thread import start_ble_in_thread
-from BLE.client.ble_plotter import stop_event
-from location.location_module import locator
-from location.motor_info_server import run_motor_info_server
-
-today = time.strftime("%Y-%m-%d_%H_%M", time.localtime())
-save_dir = f"{file_state['BASE_DIR']}/{today}"
-os.makedirs(save_dir, exist_ok=True)
-file_state['CURRENT_DIR'] = save_dir
+
+# Worker processes started from a forkserver or by spawn (camera/encoder_pool.py)
+# import this file again as __mp_main__: everything with a side effect (the GUI, GPIO
+# lines, signal handlers, the session folder) happens in main(), not at import.
+
 
 def _shutdown(*_):
+    from BLE.client.ble_plotter import stop_event
     stop_event.set()
     time.sleep(0.2)
     sys.exit(0)
 
-signal.signal(signal.SIGINT, _shutdown)
-signal.signal(signal.SIGTERM, _shutdown)
-atexit.register(_shutdown)
-
-
 
 def handle_ints(ints):
     print("-> received:", ints)   # replace with your logic
 
 
 def main():
+    from gui.gui_module import run_gui
+    from camera.camera_module import start_camera_loop
+    from BLE.client.ble_thread import start_ble_in_thread
+    from BLE.client.ble_plotter import stop_event
+    from location.location_module import locator
+    from location.motor_info_server import run_motor_info_server
+
+    today = time.strftime("%Y-%m-%d_%H_%M", time.localtime())
+    save_dir = f"{file_state['BASE_DIR']}/{today}"
+    os.makedirs(save_dir, exist_ok=True)
+    file_state['CURRENT_DIR'] = save_dir
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+    atexit.register(_shutdown)
+
     print("Starting camera thread...")
     threading.Thread(target=start_camera_loop, daemon=True).start()
 
@@ -37,7 +43,7 @@ def main():
     start_ble_in_thread(csv_path=csv_path)
 
     print("Starting locator thread...")
-    threading.Thread(target=locator, daemon=True).start()
+    threading.Thread(target=locator, args=(stop_event,), daemon=True).start()
     
     threading.Thread(target=run_motor_info_server,
     args=(stop_event,),
@@ -1,4 +1,5 @@
 # state.py
+import os
 from threading import Lock
 
 motor_info_state = {
@@ -14,6 +15,33 @@ file_state = {
     "index": -1
 }
 
+camera_state = {
+    'tracking_mode': 'fast',      # 'fast' (preallocated, ROI-only) or 'legacy'
+    'threshold': 125,
+    'angle_filter': 'moving_average',          # 'moving_average', 'ema' or 'one_euro'
+    'angle_filter_params': {'n': 10},          # e.g. {'alpha': 0.2} / {'min_cutoff': 1.0, 'beta': 0.01}
+    'timing_report_every': 600,   # frames between per-stage timing printouts
+    'hardware_roi': False,        # drive ScalerCrop from the ROI and track on the lores Y plane
+    'lores_max_side': 320,        # longest side of the lores tracking stream (px)
+    'roi': None,                  # preset (x, y, w, h) to skip the interactive ROI selection
+    'ring_slots': 8,              # preallocated frame slots between the tracker and its consumers
+    'preview_fps': 15,            # GUI preview refresh cap, independent of the tracking rate
+    'backend': os.environ.get('CAMERA_BACKEND', 'picamera2'),  # 'picamera2' or 'fake'
+    'save_backend': 'thread',     # 'thread' (single save_worker), 'pool' (multi-process encoder),
+                                  # 'video' (segmented MJPEG + frame index under video/) or
+                                  # 'spool' (raw mmap spool, compressed when the motor stops)
+    'encoder_workers': 3,
+    'encoder_slots': 16,          # shared-memory frames; caps RAM used by pending saves
+    'encoder_policy': 'block',    # when full: 'block', 'drop_oldest' or 'decimate'
+    'jpeg_quality': 90,
+    'jpeg_subsampling': '420',    # '444', '422' or '420'
+    'save_queue_max': 120,        # bound on save_queue for the 'thread' backend
+    'segment_frames': 3600,       # frames per video segment for the 'video' backend
+    'spool_capacity': 1800,       # frames per preallocated spool file
+    'spool_roi_only': False,      # spool just the ROI instead of full frames
+    'spool_target': 'jpeg',       # post-run compression into 'jpeg' (images/) or 'video'
+}
+
 blob_state = {
     "area": None,
     "center": [0,0],
@@ -27,6 +55,11 @@ location_state = {
     'pin_count': 0,
     'tracked_revs': 0,
     'last_reading': False,
+    'edge_count': 0,              # sensor edges seen by the locator
+    'last_edge_time': None,       # epoch_s of the latest edge
+    'last_index_time': None,      # epoch_s of the latest index pulse (rev-clocking edge)
+    'rev_period': None,           # seconds per revolution, from the latest edges
+    'rpm': None,
     'a0_angle': 0,
     'a1_angle': 0,
 }
\ No newline at end of file
@@ -0,0 +1,34 @@
+import os
+import random
+import sys
+import pytest
+
+# The modules import each other from the repository root (from states import ..., from camera.x import ...)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def plotter(monkeypatch):
+    """ble_plotter on the fake backend, one fresh device, the run pin held high."""
+    pytest.importorskip("gpiozero")
+    from gpiozero import Device
+    from gpiozero.pins.mock import MockFactory
+    monkeypatch.setenv("BLE_BACKEND", "fake")
+    if Device.pin_factory is None or not isinstance(Device.pin_factory, MockFactory):
+        Device.pin_factory = MockFactory()
+    from BLE.client import ble_plotter, fake_bleak
+    from states import location_state
+    if ble_plotter.BLE_BACKEND != "fake":
+        pytest.skip("ble_plotter was imported with the real bleak backend")
+    monkeypatch.setattr(fake_bleak, "_boards", {})
+    monkeypatch.setattr(fake_bleak, "SCAN_S", 0.05)
+    monkeypatch.setattr(ble_plotter, "sessions", [ble_plotter.DeviceSession("a")])
+    monkeypatch.setitem(location_state, "flag", True)
+    ble_plotter.running.pin.drive_high()
+    ble_plotter.stop_event.clear()
+    random.seed(3)
+    yield ble_plotter, fake_bleak
+    ble_plotter.stop_event.clear()
+    ble_plotter.running.pin.drive_low()
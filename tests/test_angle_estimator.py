@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from analysis.angle_bins import AngleBins
+from BLE.client.sample_log import BinarySampleLog
+from location.angle_estimator import AngleEstimator, angles_at, commanded_rate
+
+MOTOR = {'angles_per_step': 1.0, 'delay': 1 / 360}     # commanded 180 deg/s
+
+
+def _estimator(pulses, periods):
+    """An estimator that has seen these index pulses, one at a time, as the locator reports them."""
+    state = {'last_index_time': None, 'rev_period': None}
+    estimator = AngleEstimator(state, MOTOR)
+    for t, period in zip(pulses, periods):
+        state['last_index_time'], state['rev_period'] = t, period
+        estimator.angle(t)
+    return estimator
+
+
+def test_batch_spanning_a_pulse_uses_each_samples_own_revolution():
+    # The last revolution took 2 s (180 deg/s), the one before 1 s (360 deg/s)
+    estimator = _estimator([10.0, 11.0, 13.0], [None, 1.0, 2.0])
+    angles = estimator.angles([12.5, 12.9, 13.0, 13.5])
+    np.testing.assert_allclose(angles, [270.0, 342.0, 0.0, 90.0])
+    # Same as offline for the samples before the latest pulse
+    np.testing.assert_allclose(angles[:2], angles_at([12.5, 12.9], [10.0, 11.0, 13.0])[0])
+    # angle() agrees with angles() one time at a time
+    np.testing.assert_allclose([estimator.angle(t) for t in (13.0, 13.5)], angles[2:])
+
+
+def test_stale_period_is_checked_per_sample():
+    estimator = _estimator([10.0, 11.0], [None, 1.0])
+    # Within stale_revs (2) periods of the pulse the measured period holds, after it the commanded rate
+    angles = estimator.angles([11.5, 12.9, 13.5])
+    np.testing.assert_allclose(angles, [180.0, 324.0, (2.5 * 180.0) % 360])
+
+
+def test_without_pulses_angles_count_from_the_first_time():
+    estimator = _estimator([], [])
+    assert estimator.angles([5.0, 5.5])[0] == 0.0
+    assert estimator.angle(6.0) == pytest.approx(180.0)
+
+
+def test_from_session_bins_every_block_from_the_first_sample(tmp_path):
+    rate_hz, rows = 100, 400
+    t0 = 1_700_000_000.0 + np.arange(rows) * 5 / rate_hz
+    times = (t0[:, None] + np.arange(5) / rate_hz).ravel()
+    angles, _ = angles_at(times, [], origin=times[0])
+    bins = AngleBins(36)
+    # a0 is the bin each sample should land in, so any shifted origin shows up in the means
+    expected = bins.bin_of(angles).reshape(rows, 5)
+    log = BinarySampleLog(str(tmp_path / "ble_samples.bin"))
+    log.append_batch(t0 + 0.03, expected, expected, np.nan, np.nan, np.nan, np.nan,
+                     seq=np.arange(rows), sample_t0=t0, sample_dt=1 / rate_hz)
+    log.close()
+
+    binned = AngleBins.from_session(str(tmp_path), bins=36, chunk=7)
+    assert binned.samples == rows * 5
+    reached = np.unique(expected)
+    assert len(reached) == int(commanded_rate() * (times[-1] - times[0]) // 10) + 1
+    assert np.flatnonzero(binned.counts()[0]).tolist() == reached.tolist()
+    np.testing.assert_array_equal(binned.mean_array("a0")[0][reached], reached)
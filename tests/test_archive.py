@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from analysis.archive import build_archive, open_archive, query
+from analysis.session_index import INDEX_FILE
+from BLE.client.sample_log import BinarySampleLog
+from camera.encoder_pool import frame_filename
+from location.angle_estimator import angles_at, commanded_rate
+
+T0 = 1_700_000_000.0
+RATE_HZ = 100
+REVS = 60       # one revolution per second
+ROWS = REVS * RATE_HZ // 5
+
+
+def _session(tmp_path, pulses=True):
+    session = tmp_path / "session"
+    images = session / "images"
+    images.mkdir(parents=True)
+    log = BinarySampleLog(str(session / "ble_samples.bin"), grow_records=256)
+    t0 = T0 + np.arange(ROWS) * 5 / RATE_HZ
+    samples = np.arange(ROWS * 5).reshape(ROWS, 5)
+    log.append_batch(t0 + 0.02, samples % 4096, samples % 4096, np.nan, np.nan, np.nan, np.nan,
+                     seq=np.arange(ROWS), sample_t0=t0, sample_dt=1 / RATE_HZ)
+    log.close()
+    if pulses:
+        with open(session / "index_pulses.csv", "w") as f:
+            f.write("edge,epoch_s,rev,rev_period_s\n")
+            for rev in range(1, REVS + 1):
+                f.write(f"{2 * rev},{T0 + rev - 0.5:.6f},{rev},1.0\n")
+    for k in range(0, REVS, 3):
+        open(frame_filename(str(images), k, T0 + k + 0.25), "wb").close()
+    return str(session)
+
+
+def _times():
+    return T0 + np.arange(ROWS * 5) / RATE_HZ
+
+
+def test_build_archive_in_blocks_without_the_row_index(tmp_path):
+    session = _session(tmp_path)
+    samples, frames = build_archive(session, revs_per_partition=10, chunk=97)
+    assert (samples, frames) == (ROWS * 5, REVS // 3)
+    # Converted block by block: the per-row time index was never built
+    assert not os.path.exists(os.path.join(session, INDEX_FILE))
+    groups = sorted(os.listdir(os.path.join(session, "archive", "samples")))
+    assert groups == [f"rev_group={g}" for g in range(7)]
+    table = open_archive(session).to_table().sort_by("time")
+    np.testing.assert_allclose(table.column("time").to_numpy(), _times())
+    assert table.column("a0").to_numpy().tolist() == (np.arange(ROWS * 5) % 4096).tolist()
+    assert set(table.column("frame").to_numpy().tolist()) >= set(range(0, REVS, 3))
+
+
+def test_query_wraps_the_angle_and_prunes_rev_partitions(tmp_path):
+    session = _session(tmp_path)
+    build_archive(session, revs_per_partition=10, chunk=97)
+    # Partitions outside revs 12-27 must not even be opened
+    samples_dir = os.path.join(session, "archive", "samples")
+    for group in (0, 3, 4, 5, 6):
+        for name in os.listdir(os.path.join(samples_dir, f"rev_group={group}")):
+            with open(os.path.join(samples_dir, f"rev_group={group}", name), "wb") as f:
+                f.write(b"not parquet")
+
+    result = query(session, ("time", "angle", "rev"), angle=(350, 10), revs=(12, 27))
+    angles = result.column("angle").to_numpy()
+    revs = result.column("rev").to_numpy()
+    assert len(angles) > 0
+    assert np.all((angles >= 350) | (angles < 10))
+    assert revs.min() >= 12 and revs.max() <= 27
+
+    pulses = T0 + np.arange(1, REVS + 1) - 0.5
+    exp_angles, exp_revs = angles_at(_times(), pulses)
+    exp_angles = exp_angles.astype(np.float32)
+    expected = ((exp_angles >= 350) | (exp_angles < 10)) & (exp_revs >= 12) & (exp_revs <= 27)
+    assert len(angles) == expected.sum()
+    # Both sides of the wrap are there
+    assert (angles >= 350).any() and (angles < 10).any()
+
+
+def test_angles_without_pulses_share_one_origin_across_blocks(tmp_path):
+    session = _session(tmp_path, pulses=False)
+    build_archive(session, chunk=97)
+    table = open_archive(session).to_table(columns=["time", "angle"]).sort_by("time")
+    times = table.column("time").to_numpy()
+    expected = ((times - T0) * commanded_rate() % 360.0).astype(np.float32)
+    np.testing.assert_allclose(table.column("angle").to_numpy(), expected, atol=1e-3)
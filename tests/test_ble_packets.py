@@ -0,0 +1,96 @@
+import struct
+import numpy as np
+import pytest
+from BLE.client.packets import MAX_PAYLOAD, N_SAMPLES, decode_batch
+from BLE.server import packet
+from BLE.server.simulate import simulate
+
+
+def _block(payloads):
+    lengths = np.array([len(p) for p in payloads], dtype=np.int32)
+    block = np.zeros((len(payloads), MAX_PAYLOAD), dtype=np.uint8)
+    for i, p in enumerate(payloads):
+        block[i, :len(p)] = np.frombuffer(bytes(p), dtype=np.uint8)
+    return block, lengths
+
+
+def _encode(encoding, a, b, seq=7, tick=123456, gap_us=1000):
+    buf = bytearray(MAX_PAYLOAD)
+    n, used = packet.encode_into(buf, encoding, seq, tick, gap_us, list(a) + list(b), len(a))
+    return bytes(buf[:n]), used
+
+
+def _smooth(count, seed):
+    rng = np.random.default_rng(seed)
+    return np.clip(2048 + np.cumsum(rng.integers(-20, 21, count)), 0, 4095)
+
+
+@pytest.mark.parametrize("encoding", [packet.ENC_RAW16, packet.ENC_PACKED12, packet.ENC_DELTA8])
+def test_v2_round_trip(encoding):
+    count = 40
+    a, b = _smooth(count, 1), _smooth(count, 2)
+    payload, used = _encode(encoding, a, b)
+    assert used == encoding
+    assert len(payload) == packet.HEADER_SIZE + packet.body_size(encoding, count)
+    good, packets, frames = decode_batch(*_block([payload]))
+    assert good.all()
+    assert packets["seq"].tolist() == [7]
+    assert packets["tick"].tolist() == [123456]
+    assert packets["gap_us"].tolist() == [1000]
+    assert packets["count"].tolist() == [count]
+    np.testing.assert_array_equal(frames["a0"].ravel(), a)
+    np.testing.assert_array_equal(frames["a1"].ravel(), b)
+    assert frames["first_sample"].tolist() == list(range(0, count, N_SAMPLES))
+
+
+def test_delta8_falls_back_to_packed12():
+    count = 20
+    a = _smooth(count, 3)
+    b = _smooth(count, 4)
+    b[10] = 4095 if b[9] < 2048 else 0          # a step no int8 difference holds
+    payload, used = _encode(packet.ENC_DELTA8, a, b)
+    assert used == packet.ENC_PACKED12
+    assert payload[1] == packet.ENC_PACKED12
+    good, _, frames = decode_batch(*_block([payload]))
+    assert good.all()
+    np.testing.assert_array_equal(frames["a0"].ravel(), a)
+    np.testing.assert_array_equal(frames["a1"].ravel(), b)
+
+
+def test_mixed_batch_with_legacy_and_bad_packets():
+    a, b = _smooth(10, 5), _smooth(10, 6)
+    delta, _ = _encode(packet.ENC_DELTA8, a, b, seq=1)
+    packed, _ = _encode(packet.ENC_PACKED12, a[:5], b[:5], seq=2)
+    legacy = struct.pack(packet.LEGACY_FMT, *range(10))
+    truncated = delta[:-1]
+    good, packets, frames = decode_batch(*_block([delta, legacy, truncated, packed]))
+    assert good.tolist() == [True, True, False, True]
+    assert packets["seq"].tolist() == [1, -1, 2]
+    assert frames["packet"].tolist() == [0, 0, 1, 2]
+    assert frames["a0"][2].tolist() == [0, 1, 2, 3, 4]
+    assert frames["a1"][2].tolist() == [5, 6, 7, 8, 9]
+    np.testing.assert_array_equal(frames["a0"][3], a[:5])
+
+
+def test_packetizer_sends_legacy_until_a_v2_packet_fits():
+    p = packet.Packetizer(packet.ENC_DELTA8, 2000, 50, MAX_PAYLOAD)
+    assert p.count == 0 and p.samples_per_packet == packet.FRAME
+    vals = list(range(100, 105)) + list(range(200, 205))
+    assert len(p.pack(vals, packet.FRAME, 0)) == 20
+    assert p.set_payload(MAX_PAYLOAD) == 50
+    a, b = _smooth(50, 7), _smooth(50, 8)
+    payload = bytes(p.pack(list(a) + list(b), 50, 250))
+    good, packets, frames = decode_batch(*_block([payload]))
+    assert good.all()
+    assert packets["seq"].tolist() == [1]
+    assert packets["tick"].tolist() == [250]        # ticks since the first packet
+    np.testing.assert_array_equal(frames["a0"].ravel(), a)
+
+
+@pytest.mark.parametrize("encoding", ["raw16", "packed12", "delta8"])
+def test_simulated_sampler_and_packetizer(encoding):
+    stats = simulate(rate_hz=1000, seconds=1.0, encoding=encoding, stall_prob=0.0, seed=1)
+    assert stats["bad_packets"] == 0
+    assert stats["overruns"] == 0
+    assert stats["values_match"] == 1.0
+    assert stats["timing_err_us_max"] < 50
@@ -0,0 +1,70 @@
+import asyncio
+import csv
+import threading
+import numpy as np
+
+
+def _run(ble_plotter, csv_path, seconds):
+    timer = threading.Timer(seconds, ble_plotter.stop_event.set)
+    timer.start()
+    try:
+        asyncio.run(ble_plotter.ble_receiver_task(csv_path))
+    finally:
+        timer.cancel()
+
+
+def test_reconnects_after_drops_and_accounts_for_lost_packets(plotter, monkeypatch, tmp_path):
+    ble_plotter, fake_bleak = plotter
+    monkeypatch.setattr(fake_bleak, "DROP_S", 0.8)
+    monkeypatch.setattr(fake_bleak, "OUTAGE_S", 0.4)
+    _run(ble_plotter, str(tmp_path / "ble_samples.csv"), 5.0)
+
+    session = ble_plotter.sessions[0]
+    assert session.state == "stopped"
+    assert session.counts["disconnects"] >= 2
+    # The stop may come in the middle of an outage, before the last reconnect
+    reconnects = session.counts["connects"] - 1
+    assert reconnects in (session.counts["disconnects"] - 1, session.counts["disconnects"])
+    assert session.reconnect_latency.max_ms >= fake_bleak.OUTAGE_S * 1000
+
+    with open(tmp_path / "ble_gaps.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    # A gap is written when the first packet after it arrives, which the stop can also beat
+    assert len(rows) >= 2 and len(rows) in (reconnects - 1, reconnects)
+    per_packet = fake_bleak.MAX_COUNT / fake_bleak.RATE_HZ
+    for row in rows:
+        assert row["disconnected"] == "1"
+        assert float(row["duration_s"]) >= fake_bleak.OUTAGE_S
+        # The board kept sampling during the outage: the seq jump covers the gap
+        assert abs(int(row["packets_lost"]) - float(row["duration_s"]) / per_packet) <= 2
+    assert session.seq_tracker.lost == sum(int(row["packets_lost"]) for row in rows)
+
+    # Every packet the log holds, plus the ones counted lost, covers the seq range once
+    from BLE.client.sample_log import read_sample_log
+    log = read_sample_log(str(tmp_path / "ble_samples.bin"))
+    seq = np.unique(log["seq"])
+    assert len(log) == len(seq) * fake_bleak.MAX_COUNT // 5
+    assert seq[-1] - seq[0] + 1 == len(seq) + session.seq_tracker.lost
+    # And the device-clock times stay in order across the reconnects
+    assert np.all(np.diff(log["sample_t0_s"]) > 0)
+
+
+def test_unexpected_errors_do_not_end_the_device_loop(plotter, monkeypatch, tmp_path):
+    ble_plotter, fake_bleak = plotter
+    monkeypatch.setattr(ble_plotter, "BACKOFF_BASE", 0.05)
+    calls = {"n": 0}
+    start_notify = fake_bleak.BleakClient.start_notify
+
+    async def flaky_start_notify(self, uuid, callback):
+        calls["n"] += 1
+        if calls["n"] <= 2:
+            raise RuntimeError("backend hiccup")
+        await start_notify(self, uuid, callback)
+
+    monkeypatch.setattr(fake_bleak.BleakClient, "start_notify", flaky_start_notify)
+    _run(ble_plotter, None, 1.5)
+
+    session = ble_plotter.sessions[0]
+    assert calls["n"] == 3
+    assert session.counts["connects"] == 1
+    assert session.counts["processed"] > 0
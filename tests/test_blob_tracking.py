@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+import pytest
+from camera.blob_tracking import analyse_gray, make_tracking_buffers, scale_ellipse
+from camera.fake_picamera2 import MappedArray, Picamera2
+
+
+def _angle_diff(a, b):
+    return abs((a - b + 90.0) % 180.0 - 90.0)
+
+
+def _ellipse_points(center, axes, angle, n=200):
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    a, b = axes[0] / 2, axes[1] / 2
+    r = np.radians(angle)
+    x = center[0] + a * np.cos(t) * np.cos(r) - b * np.sin(t) * np.sin(r)
+    y = center[1] + a * np.cos(t) * np.sin(r) + b * np.sin(t) * np.cos(r)
+    return np.stack([x, y], axis=1)
+
+
+@pytest.mark.parametrize("angle", [0.0, 35.0, 90.0, 125.0, 170.0])
+def test_scale_ellipse_undoes_unequal_scaling(angle):
+    center, axes = (300.0, 200.0), (240.0, 100.0)
+    sx, sy = 1.5, 2.5
+    small = _ellipse_points(center, axes, angle) / [sx, sy]
+    fitted = cv2.fitEllipse(small.astype(np.float32))
+    (cx, cy), (w, h), back = scale_ellipse(fitted, sx, sy)
+    assert (cx, cy) == pytest.approx(center, abs=0.5)
+    assert sorted((w, h)) == pytest.approx(sorted(axes), rel=0.01)
+    # The long axis ends up where it was, whichever one OpenCV called "width"
+    long_angle = back if w >= h else back + 90.0
+    assert _angle_diff(long_angle, angle) < 0.5
+    # Equal scales: only a resize
+    (_, _), (w1, h1), same = scale_ellipse(fitted, 2.0, 2.0)
+    assert same == fitted[2] and (w1, h1) == (2.0 * fitted[1][0], 2.0 * fitted[1][1])
+
+
+def test_lores_tracking_matches_full_resolution(tmp_path):
+    # One sensor frame with a known ellipse, replayed by the fake camera
+    sensor = np.zeros((720, 1280, 3), dtype=np.uint8)
+    cv2.ellipse(sensor, ((640, 360), (240, 120), 35), (220, 220, 220), -1)
+    np.save(tmp_path / "frame_0000.npy", sensor)
+    roi = (400, 160, 480, 400)      # 6:5; the lores stream below is 16:9
+    lores_size = (320, 180)
+
+    cam = Picamera2(frames_dir=str(tmp_path))
+    config = cam.create_video_configuration(main={"size": (1280, 720)},
+                                            lores={"size": lores_size, "format": "YUV420"},
+                                            controls={"ScalerCrop": roi})
+    cam.align_configuration(config)
+    cam.configure(config)
+    cam.start()
+    request = cam.capture_request()
+    lw, lh = config["lores"]["size"]
+    with MappedArray(request, "lores") as mapped:
+        y_plane = mapped.array[:lh, :lw].copy()
+    request.release()
+    area, ellipse = analyse_gray(y_plane, make_tracking_buffers(lh, lw))
+
+    # What the tracker does with it (camera_module.lores_tracking_loop / _finish_frame)
+    x, y, w, h = roi
+    sx, sy = w / lw, h / lh
+    assert sx != pytest.approx(sy)
+    (_, _), axes, angle = scale_ellipse(ellipse, sx, sy)
+
+    full = cv2.cvtColor(sensor[y:y + h, x:x + w], cv2.COLOR_RGB2GRAY)
+    ref_area, ref = analyse_gray(full, make_tracking_buffers(h, w))
+    assert area * sx * sy == pytest.approx(ref_area, rel=0.05)
+    assert sorted(axes) == pytest.approx(sorted(ref[1]), rel=0.05)
+    assert _angle_diff(angle, ref[2]) < 2.0
+    # Uncorrected, the angle would be visibly off
+    assert _angle_diff(ellipse[2], ref[2]) > 5.0
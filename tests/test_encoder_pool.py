@@ -0,0 +1,53 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import numpy as np
+import pytest
+from camera.encoder_pool import EncoderPool, parse_frame_filename
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHAPE = (48, 64, 3)
+
+
+def _frame(i):
+    return np.full(SHAPE, i * 10 % 256, dtype=np.uint8)
+
+
+def test_main_imports_nothing_with_side_effects():
+    # What a forkserver/spawn child does with the main script before running a worker
+    code = ("import runpy, sys; runpy.run_path('main.py', run_name='__mp_main__'); "
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in ('gui', 'camera', 'BLE', 'location')))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "[]"
+
+
+def test_pool_writes_every_frame(tmp_path):
+    pool = EncoderPool(str(tmp_path), SHAPE, workers=2, slots=4, policy="block")
+    for i in range(12):
+        assert pool.submit(i, 1_700_000_000 + i / 60, _frame(i))
+    pool.close()
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 12
+    assert sorted(parse_frame_filename(n)[0] for n in names) == list(range(12))
+    assert pool.stats()["encoded"] == 12
+
+
+def test_submit_fails_instead_of_blocking_when_workers_die(tmp_path):
+    pool = EncoderPool(str(tmp_path), SHAPE, workers=1, slots=1, policy="block")
+    worker = pool._workers[0]
+    try:
+        # Worker alive but stuck: the one slot fills and the next submit() has to wait
+        os.kill(worker.pid, signal.SIGSTOP)
+        assert pool.submit(0, 1_700_000_000, _frame(0))
+        threading.Timer(0.3, os.kill, (worker.pid, signal.SIGKILL)).start()
+        with pytest.raises(RuntimeError, match="encoder workers"):
+            pool.submit(1, 1_700_000_001, _frame(1))
+        # And straight away once they are known to be gone
+        with pytest.raises(RuntimeError):
+            pool.submit(2, 1_700_000_002, _frame(2))
+    finally:
+        pool.close()
@@ -0,0 +1,68 @@
+import time
+import pytest
+
+gpiozero = pytest.importorskip("gpiozero")
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+from location.location_module import EdgeTracker, INDEX_PULSES_HEADER, edge_epoch, start_locator
+
+
+def _state():
+    return {"pin_count": 0, "flag": False, "tracked_revs": 0, "last_reading": False,
+            "rev_period": None, "rpm": None, "last_index_time": None, "last_edge_time": None,
+            "edge_count": 0}
+
+
+@pytest.fixture
+def factory():
+    Device.pin_factory = MockFactory()
+    yield Device.pin_factory
+    Device.pin_factory.reset()
+    Device.pin_factory = None
+
+
+def test_edge_epoch_uses_the_edge_ticks(factory):
+    now = time.time()
+    assert edge_epoch(factory, factory.ticks() - 0.25, now) == pytest.approx(now - 0.25, abs=1e-3)
+    # Ticks on another clock than ticks(): the callback's own time
+    assert edge_epoch(factory, factory.ticks() + 100.0, now) == now
+    assert edge_epoch(factory, factory.ticks() - 100.0, now) == now
+
+
+def test_mock_pin_drives_the_tracker(factory, tmp_path):
+    log_path = tmp_path / "index_pulses.csv"
+    state = _state()
+    device, tracker = start_locator(pin=11, log_path=str(log_path), state=state)
+    pin = factory.pin(11)
+    period = 0.08
+    try:
+        # 4 revolutions: a pin-found edge then an index edge every period
+        for _ in range(8):
+            pin.drive_high()
+            time.sleep(0.005)
+            pin.drive_low()
+            time.sleep(period / 2 - 0.005)
+        assert state["edge_count"] == 8
+        assert state["tracked_revs"] == 4
+        assert state["rev_period"] == pytest.approx(period, abs=0.02)
+        assert state["last_index_time"] == pytest.approx(tracker.edges(1)[0])
+        assert not state["last_reading"]
+        assert not device.is_active
+    finally:
+        device.close()
+        tracker.close()
+    lines = log_path.read_text().splitlines()
+    assert lines[0] + "\n" == INDEX_PULSES_HEADER
+    assert [int(line.split(",")[2]) for line in lines[1:]] == [1, 2, 3, 4]
+    # Index pulses are every second edge
+    assert [int(line.split(",")[0]) for line in lines[1:]] == [1, 3, 5, 7]
+
+
+def test_debounce_drops_chatter():
+    state = _state()
+    tracker = EdgeTracker(state=state, debounce_s=0.002)
+    for t in (10.0, 10.0005, 10.5, 11.0, 11.001, 11.5):
+        tracker.on_edge(t)
+    assert tracker.ignored == 2
+    assert state["tracked_revs"] == 2
+    assert state["rev_period"] == pytest.approx(1.0)
@@ -0,0 +1,45 @@
+import numpy as np
+from BLE.client.packets import MAX_PAYLOAD
+from BLE.client.sample_log import RECORD_DTYPE, read_sample_log
+from BLE.server import packet
+
+
+def _packet(seq, tick, a, b, gap_us=1000):
+    buf = bytearray(MAX_PAYLOAD)
+    n, used = packet.encode_into(buf, packet.ENC_PACKED12, seq, tick, gap_us, list(a) + list(b), len(a))
+    assert used == packet.ENC_PACKED12
+    return bytes(buf[:n])
+
+
+def test_record_is_60_bytes():
+    assert RECORD_DTYPE.itemsize == 60
+
+
+def test_v2_packet_gives_one_record_per_five_samples(plotter, tmp_path):
+    ble_plotter, _ = plotter
+    session = ble_plotter.sessions[0]
+    session.open_log(str(tmp_path / "ble_samples.csv"))
+    counts, seqs = (40, 15), (7, 8)
+    payloads, tick, first = [], 1_000_000, 0
+    for seq, count in zip(seqs, counts):
+        a = np.arange(first, first + count) % 4096
+        payloads.append(_packet(seq, tick, a, 4095 - a))
+        tick += count * 1000
+        first += count
+    lengths = np.array([len(p) for p in payloads], dtype=np.int32)
+    block = np.zeros((len(payloads), MAX_PAYLOAD), dtype=np.uint8)
+    for i, p in enumerate(payloads):
+        block[i, :len(p)] = np.frombuffer(p, dtype=np.uint8)
+    now = 1_700_000_000.0
+    session.process_packets(np.array([now + 0.04, now + 0.06]), block, lengths)
+    session.close_log()
+
+    log = read_sample_log(str(tmp_path / "ble_samples.bin"))
+    assert len(log) == sum(counts) // 5
+    # The records of a packet share its seq and cover its samples in order
+    assert log["seq"].tolist() == [7] * 8 + [8] * 3
+    assert log["a0"].ravel().tolist() == list(range(sum(counts)))
+    assert log["a1"].ravel().tolist() == (4095 - np.arange(sum(counts))).tolist()
+    # Each record is timed from its own first sample
+    np.testing.assert_allclose(log["sample_dt_s"], 0.001, rtol=1e-3)
+    np.testing.assert_allclose(np.diff(log["sample_t0_s"]), 0.005, rtol=1e-3)
@@ -0,0 +1,45 @@
+import os
+import queue
+import threading
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def camera_module(monkeypatch):
+    pytest.importorskip("matplotlib")
+    if not os.environ.get("DISPLAY"):
+        pytest.skip("camera_module imports the GUI, which opens a Tk window")
+    pytest.importorskip("gpiozero")
+    from gpiozero import Device
+    from gpiozero.pins.mock import MockFactory
+    from states import camera_state
+    monkeypatch.setenv("BLE_BACKEND", "fake")
+    monkeypatch.setitem(camera_state, "backend", "fake")
+    if Device.pin_factory is None or not isinstance(Device.pin_factory, MockFactory):
+        Device.pin_factory = MockFactory()
+    from camera import camera_module
+    monkeypatch.setattr(camera_module, "save_queue", queue.Queue())
+    return camera_module
+
+
+def test_failed_writes_do_not_hang_close(camera_module, tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=camera_module.save_worker, args=(stop,), daemon=True)
+    worker.start()
+    sink = camera_module.QueueSink(str(tmp_path / "missing_dir"))
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)
+    for i in range(3):
+        sink.submit(i, 1_700_000_000 + i, frame)
+    # imwrite raises (cv2.error) rather than returning False for some failures
+    camera_module.save_queue.put((str(tmp_path / "frame.unknown"), frame))
+    good = camera_module.QueueSink(str(tmp_path))
+    good.submit(3, 1_700_000_003, frame)
+
+    closer = threading.Thread(target=sink.close, daemon=True)
+    closer.start()
+    closer.join(timeout=5)
+    stop.set()
+    worker.join(timeout=5)
+    assert not closer.is_alive()
+    assert len(list(tmp_path.glob("frame_0003_*.jpg"))) == 1
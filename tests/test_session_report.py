@@ -0,0 +1,28 @@
+import numpy as np
+from analysis.session_index import SessionIndex
+from analysis.session_report import _row_frames
+
+T0 = 1_700_000_000.0
+
+
+def _index():
+    numbers = np.arange(10, dtype=np.int64)
+    names = np.array([f"frame_{k:04d}.jpg" for k in numbers])
+    empty = np.empty(0)
+    # Frames every 0.1 s
+    return SessionIndex(numbers, names, T0 + numbers * 0.1, empty, empty.astype(np.float32),
+                        empty.astype(np.int64))
+
+
+def test_rows_are_matched_by_device_time_not_receipt_time():
+    header = ["iso_time", "epoch_s", "sample_t0_s"]
+    # Received 0.23 s after their first sample; the last row has no device time
+    rows = [["", f"{T0 + t + 0.23:.6f}", f"{T0 + t:.6f}"] for t in (0.0, 0.31, 0.52)]
+    rows.append(["", f"{T0 + 0.4:.6f}", ""])
+    names = _row_frames(rows, None, header.index("epoch_s"), header.index("sample_t0_s"), _index())
+    assert names == ["frame_0000.jpg", "frame_0003.jpg", "frame_0005.jpg", "frame_0004.jpg"]
+
+
+def test_rows_without_a_device_time_column_use_epoch_s():
+    rows = [["", f"{T0 + 0.21:.6f}"], ["", f"{T0 + 5.0:.6f}"]]
+    assert _row_frames(rows, None, 1, None, _index()) == ["frame_0002.jpg", ""]
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import numpy as np
+from camera.spool import FrameSpool, compress_spool, open_spool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHAPE = (24, 32, 3)
+
+
+def _frame(i):
+    return np.full(SHAPE, i, dtype=np.uint8)
+
+
+def test_frames_survive_a_crash_before_any_flush(tmp_path):
+    path = str(tmp_path / "spool_0000.raw")
+    # A writer that dies without flush() or close(), 7 frames in (flushes come every 120)
+    code = (f"import os, numpy as np; from camera.spool import FrameSpool; "
+            f"s = FrameSpool({path!r}, {SHAPE}, 16); "
+            f"[s.append(i, 1700000000 + i, np.full({SHAPE}, i, np.uint8)) for i in range(7)]; "
+            f"os._exit(1)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert out.returncode == 1, out.stderr
+    meta, frames = open_spool(path)
+    assert len(meta) == 7
+    assert meta["frame"].tolist() == list(range(7))
+    for i in range(7):
+        np.testing.assert_array_equal(frames[i], _frame(i))
+
+
+def test_spool_round_trip_to_jpeg(tmp_path):
+    path = str(tmp_path / "spool_0000.raw")
+    spool = FrameSpool(path, SHAPE, 8)
+    for i in range(8):
+        spool.append(i, 1_700_000_000 + i / 60, _frame(i * 20))
+    assert spool.full
+    spool.close()
+    out_dir = tmp_path / "images"
+    assert compress_spool(path, "jpeg", str(out_dir)) == 8
+    assert len(os.listdir(out_dir)) == 8
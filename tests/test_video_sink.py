@@ -0,0 +1,35 @@
+import os
+import numpy as np
+from camera.video_sink import INDEX_RECORD, SegmentReader, SegmentedMjpegSink, read_index
+
+SHAPE = (24, 32, 3)
+
+
+def _record(sink_dir, n, start=0):
+    sink = SegmentedMjpegSink(sink_dir, segment_frames=4)
+    for i in range(start, start + n):
+        sink.submit(i, 1_700_000_000 + i / 60, np.full(SHAPE, 10 * i, dtype=np.uint8))
+    sink.close()
+
+
+def test_read_index_drops_a_partial_trailing_record(tmp_path):
+    video_dir = str(tmp_path / "video")
+    _record(video_dir, 5)
+    with open(os.path.join(video_dir, "index.bin"), "ab") as f:
+        f.write(INDEX_RECORD.pack(5, 0.0, 1, 0, 100)[:11])
+    index = read_index(video_dir)
+    assert index["frame"].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_restarted_sink_appends_after_a_partial_record(tmp_path):
+    video_dir = str(tmp_path / "video")
+    _record(video_dir, 5)
+    with open(os.path.join(video_dir, "index.bin"), "ab") as f:
+        f.write(b"\x00" * 7)
+    _record(video_dir, 3, start=5)
+    assert read_index(video_dir)["frame"].tolist() == list(range(8))
+    reader = SegmentReader(video_dir)
+    try:
+        assert reader.read_frame(6).shape == SHAPE
+    finally:
+        reader.close()